@@ -1,407 +1,217 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.lines import Line2D
-from matplotlib.patches import Patch
-import matplotlib.patheffects as pe 
-import textwrap
-import io
-import sys
-import requests
-import json
 from datetime import datetime, timedelta
-import numpy as np
-from github import Github 
-import openpyxl 
+import os
+import threading
+import perfil
+from perfil import Perfilador
+from descarga import AlmacenContenido, DIRECTORIO_CACHE_DEFECTO, transformar_url_onedrive
+from refresco import LibroVersionado, RefrescadorLibro
+from hojas import PORTAFOLIO, AlmacenHojas, hojas_visibles
+from cache import CacheLRU
+from disposicion import calcular_disposicion
+from vistas import OPCIONES_RANGO, datos_grafico, filtros_disponibles, rango_fechas, seleccion_vista, titulo_hoja
+from indice import tokens
+from detalle import agrupar_por_detalle
+from edicion import TAMANOS_PAGINA, SesionEdicion, paginas
+from historico import HistorialLibro, HistorialNoDisponible
+from interactivo import RUTA_COMPONENTE, marca_hoy, serializar
+from cola_guardado import ColaGuardado
+from clientes import ClienteGitHub, DespachadorWebhook, crear_sesion
 
 # ==========================================
 # 0. CONFIGURACIÓN
 # ==========================================
 st.set_page_config(layout="wide", page_title="Línea de Tiempo", page_icon="📊")
 
+# --- DEPURACIÓN (OPT-IN): tiempos por etapa y perfil de un rerun ---
+modo_debug = st.session_state.get("modo_debug", False) or st.query_params.get("debug") == "1"
+traza = perfil.activar_traza(modo_debug)
+interrumpido = st.session_state.pop("perfilador_activo", None)
+if interrumpido is not None:
+    interrumpido.detener()      # el rerun anterior terminó con st.rerun/st.stop
+perfilador = None
+modo_perfil = st.session_state.pop("perfilar_siguiente", None)
+if modo_debug and modo_perfil:
+    try:
+        perfilador = Perfilador(modo_perfil).iniciar()
+        st.session_state["perfilador_activo"] = perfilador
+    except ImportError:
+        st.session_state["informe_perfil"] = f"{modo_perfil} no está instalado (pip install {modo_perfil})."
+
 # --- TUS DATOS ---
 URL_ORIGINAL = "https://colbun-my.sharepoint.com/personal/jmeneses_colbun_cl/_layouts/15/guestaccess.aspx?share=IQAqumyfCDuPQ4a3WUgjrxWwAaXoORiZ8TiCVI8NoNB0YJE&e=rm5rea"
 GITHUB_REPO_NAME = "jmeneses-ctrl/Linea-de-tiempo" 
 NOMBRE_ARCHIVO_EXCEL = "db_decreto10.xlsx" 
 
-def transformar_url_onedrive(url):
-    if "sharepoint.com" in url or "onedrive.live.com" in url:
-        if "guestaccess.aspx" in url:
-            return url.replace("guestaccess.aspx", "download.aspx")
-        if "download=1" not in url:
-            if "?" in url:
-                return url + "&download=1"
-            else:
-                return url + "?download=1"
-    return url
+DPI_PANTALLA = 100
+# Tras cada versión nueva, un hilo importa matplotlib y carga las fuentes
+# (grafico.precalentar_fuentes); con "0" eso queda para el primer gráfico
+PRECALENTAR_RENDER = os.environ.get("LINEA_TIEMPO_PRECALENTAR_RENDER", "1") != "0"
+ALTO_INTERACTIVO = 720      # px del lienzo SVG del modo interactivo
+MODOS_GRAFICO = ("🖼️ Imagen", "🖱️ Interactivo")
+FACETAS_BARRA = ("Normativa", "Agente", "Proceso", "Norma")
+FILTRO_POR_DEFECTO = ("Todo", "", ())    # (filtro de proceso, búsqueda, facetas)
+FORMATOS_DESCARGA = {  # etiqueta -> (formato, mime, dpi)
+    "PNG HD": ("png", "image/png", 400),
+    "SVG": ("svg", "image/svg+xml", 100),
+    "PDF": ("pdf", "application/pdf", 100),
+}
 
 URL_ARCHIVO_NUBE = transformar_url_onedrive(URL_ORIGINAL)
 
+# Componente sin compilación (componentes/linea_tiempo): dibuja la carga de interactivo.py en el navegador
+linea_tiempo_interactiva = components.declare_component("linea_tiempo", path=RUTA_COMPONENTE)
+
 # ==========================================
 # 1. FUNCIONES DE CARGA Y GUARDADO
 # ==========================================
 
-@st.cache_resource(ttl=60)
-def cargar_datos_desde_nube(url):
-    try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        file_content = io.BytesIO(response.content)
-        xl_file = pd.ExcelFile(file_content, engine='openpyxl')
-        return xl_file
-    except Exception as e:
-        return None
+@st.cache_resource
+def obtener_almacen_contenido():
+    return AlmacenContenido()
+
+@st.cache_resource
+def obtener_sesion_http():
+    # Conexiones keep-alive y reintentos compartidos por descargas y webhook
+    return crear_sesion(reintentos=3, backoff=0.5)
+
+@st.cache_resource
+def obtener_almacen_hojas():
+    # Hojas normalizadas por versión del libro: un rerun no vuelve a parsear el xlsx
+    return AlmacenHojas(max_versiones=3, directorio=os.path.join(DIRECTORIO_CACHE_DEFECTO, "hojas"))
+
+@st.cache_resource
+def obtener_historial():
+    # Versiones del libro en el clon local del repositorio (historico.py); se amplía con cada commit nuevo
+    repo = os.environ.get("LINEA_TIEMPO_REPO", os.path.dirname(os.path.abspath(__file__)))
+    return HistorialLibro(repo, NOMBRE_ARCHIVO_EXCEL, directorio=os.path.join(DIRECTORIO_CACHE_DEFECTO, "historial"))
+
+@st.cache_resource
+def obtener_cache_disposiciones():
+    # Clave: (versión del libro, hoja, f_inicio, f_fin, filtro) con filtro = (proceso, búsqueda, facetas)
+    return CacheLRU(max_entradas=64)
+
+@st.cache_resource
+def obtener_cache_cargas():
+    # JSON de la disposición para el modo interactivo; misma clave que la disposición
+    return CacheLRU(max_entradas=64, max_bytes=32 * 1024 * 1024, medir=len)
+
+@st.cache_resource
+def obtener_cache_imagenes():
+    # Bytes renderizados (pantalla y exportaciones), acotados por tamaño total
+    return CacheLRU(max_entradas=256, max_bytes=128 * 1024 * 1024, medir=len)
+
+def disposicion_grafico(disposiciones, sha, hoja, df_plot, f_inicio, f_fin, filtro):
+    """Disposición memoizada; no depende de "Mostrar línea de HOY" y se reutiliza entre reruns."""
+    clave = (sha, hoja, f_inicio, f_fin, filtro)
+    with perfil.tramo("app.disposicion", cache="hit" if clave in disposiciones else "miss", filas=len(df_plot)):
+        disp = disposiciones.obtener_o_calcular(
+            clave,
+            # Con más hitos de los que caben en pantalla, los tramos densos se agrupan (detalle.py)
+            lambda: calcular_disposicion(agrupar_por_detalle(df_plot, f_inicio, f_fin), titulo_hoja(hoja), f_inicio, f_fin)
+        )
+    return clave, disp
+
+def precalentar(libro, almacen_hojas, disposiciones, render=False):
+    """
+    Parsea todas las hojas y calcula la vista por defecto (año en curso, todo
+    el proceso); con ``render``, además deja listo el render de matplotlib.
+    """
+    hoy = datetime.now()
+    f_inicio, f_fin = datetime(hoy.year, 1, 1), datetime(hoy.year, 12, 31)
+    for hoja, df in [*almacen_hojas.hojas(libro).items(), (PORTAFOLIO, almacen_hojas.portafolio(libro))]:
+        df_plot = datos_grafico(df, f_inicio, f_fin)
+        if df_plot is not None and not df_plot.empty:
+            disposicion_grafico(disposiciones, libro.sha, hoja, df_plot, f_inicio, f_fin, FILTRO_POR_DEFECTO)
+    almacen_hojas.indice(libro)
+    if render:
+        from grafico import precalentar_fuentes
+        precalentar_fuentes()
+
+@st.cache_resource
+def obtener_refrescador(url):
+    # Único por proceso: sirve la última versión buena. El TTL largo es sólo una
+    # red de seguridad: guardados y el endpoint /invalidar marcan la versión obsoleta.
+    refrescador = RefrescadorLibro(url, obtener_almacen_contenido(), ttl=15 * 60, timeout=15, sesion=obtener_sesion_http())
+    almacen_hojas, disposiciones, imagenes = obtener_almacen_hojas(), obtener_cache_disposiciones(), obtener_cache_imagenes()
+
+    def al_actualizar(nuevo, anterior):
+        if anterior is not None:
+            disposiciones.descartar(lambda clave: clave[0] == anterior.sha)
+            imagenes.descartar(lambda clave: clave[0][0] == anterior.sha)
+        threading.Thread(target=precalentar, args=(nuevo, almacen_hojas, disposiciones, PRECALENTAR_RENDER),
+                         daemon=True).start()
+
+    refrescador.al_actualizar(al_actualizar)
+    return refrescador
 
-def guardar_en_github_manteniendo_formulas(df_editado, hoja_nombre):
+def cargar_datos_desde_nube(url):
+    return obtener_refrescador(url).obtener()
+
+@st.cache_resource
+def obtener_pool_render():
+    # Pocos hilos compartidos por todas las sesiones: acota CPU y figuras vivas.
+    # matplotlib se importa aquí (o en el precalentado), no al cargar la app.
+    from grafico import PoolRender
+    return PoolRender(hilos=2, max_pendientes=8)
+
+@st.cache_resource
+def obtener_cliente_github(token):
+    return ClienteGitHub(token, GITHUB_REPO_NAME)
+
+@st.cache_resource
+def obtener_despachador_webhook(url):
+    return DespachadorWebhook(url, sesion=obtener_sesion_http(), timeout=5)
+
+@st.cache_resource
+def obtener_cola_guardado(token, webhook_url=None):
+    # Una cola por proceso: los guardados cercanos de todas las sesiones van en un commit
+    despachador = obtener_despachador_webhook(webhook_url) if webhook_url else None
+    refrescador = obtener_refrescador(URL_ARCHIVO_NUBE)
+    almacen_hojas, disposiciones = obtener_almacen_hojas(), obtener_cache_disposiciones()
+
+    def al_confirmar(commit, contenido):
+        if despachador:
+            despachador.enviar({"msg": "update", "commit": commit})
+        # El origen tarda en sincronizarse: se vigila hasta ver la versión nueva y,
+        # mientras tanto, se precalienta con los bytes recién publicados. Todo en
+        # otro hilo: este es el hilo de la cola y los guardados siguientes esperan.
+        def vigilar_y_precalentar():
+            refrescador.vigilar_cambio()
+            precalentar(LibroVersionado.desde_contenido(contenido), almacen_hojas, disposiciones)
+
+        threading.Thread(target=vigilar_y_precalentar, daemon=True).start()
+
+    return ColaGuardado(obtener_cliente_github(token).repo, NOMBRE_ARCHIVO_EXCEL,
+                        ventana=2.0, al_confirmar=al_confirmar)
+
+def guardar_en_github_manteniendo_formulas(cambios, hoja_nombre):
     """
-    Edición quirúrgica segura sin romper el binario xlsx.
+    Edición quirúrgica segura sin romper el binario xlsx: sólo se reescriben
+    las celdas de ``cambios`` ({fila_excel: fecha o None}), agrupadas con las
+    demás ediciones pendientes en un único commit.
     """
     try:
         if "GITHUB_TOKEN" not in st.secrets:
             st.error("❌ Falta GITHUB_TOKEN en Secrets.")
             return False
-        
-        token = st.secrets["GITHUB_TOKEN"]
-        g = Github(token)
-        repo = g.get_repo(GITHUB_REPO_NAME)
-        
-        try:
-            contents = repo.get_contents(NOMBRE_ARCHIVO_EXCEL)
-            file_content = io.BytesIO(contents.decoded_content)
-            existe = True
-        except:
-            st.error("⚠️ El archivo no existe en GitHub.")
-            return False
-
-        wb = openpyxl.load_workbook(file_content, data_only=False) 
-        
-        if hoja_nombre not in wb.sheetnames:
-            st.error(f"La hoja '{hoja_nombre}' no existe.")
-            return False
-            
-        ws = wb[hoja_nombre]
-        
-        col_manual_idx = None
-        header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-        
-        target_cols = ["Fecha_Real_Manual", "Fecha Real Manual", "Fecha_Real"]
-        for idx, col_name in enumerate(header_row, 1):
-            if col_name and str(col_name).strip() in target_cols:
-                col_manual_idx = idx
-                break
-        
-        if col_manual_idx is None:
-            st.error("⚠️ No se encontró la columna 'Fecha_Real_Manual'.")
-            return False
 
-        col_manual_key = [c for c in df_editado.columns if "Fecha_Real_Manual" in c or "Fecha Real Manual" in c]
-        if not col_manual_key: return False
-        col_manual_key = col_manual_key[0]
-        
-        for i, fecha_valor in enumerate(df_editado[col_manual_key]):
-            row_idx = i + 2
-            val_to_write = fecha_valor if pd.notnull(fecha_valor) else None
-            ws.cell(row=row_idx, column=col_manual_idx).value = val_to_write
-
-        output = io.BytesIO()
-        wb.save(output)
-        datos_binarios = output.getvalue()
-        
-        mensaje = f"Update Web {datetime.now().strftime('%H:%M')}"
-        repo.update_file(contents.path, mensaje, datos_binarios, contents.sha)
-
-        if "WEBHOOK_URL" in st.secrets:
-            try: requests.post(st.secrets["WEBHOOK_URL"], json={"msg": "update"}, timeout=5)
-            except: pass
-            
+        cola = obtener_cola_guardado(st.secrets["GITHUB_TOKEN"], st.secrets.get("WEBHOOK_URL"))
+        cola.encolar(hoja_nombre, cambios).result(timeout=120)
         return True
 
+    except FileNotFoundError:
+        st.error("⚠️ El archivo no existe en GitHub.")
+        return False
+    except ValueError as e:
+        st.error(f"⚠️ {e}")
+        return False
     except Exception as e:
         st.error(f"Error técnico al guardar: {e}")
         return False
 
-def normalizar_columnas(df):
-    df.columns = df.columns.str.strip()
-    mapa_cols = {
-        'Fecha_Vigente': ['Fecha_Vigente', 'Fecha Vigente', 'Fecha Real', 'Fecha_Real_Manual', 'Fecha Actual', 'Fecha_Real'],
-        'Fecha_teorica': ['Fecha_teórica', 'Fecha_teorica', 'Fecha Teórica', 'Fecha Teorica', 'Fecha_Proyectada', 'Fecha Proyectada', 'Fecha Planificada'],
-        'Hito / Etapa': ['Hito / Etapa', 'Hito', 'Etapa', 'Nombre Hito', 'Actividad'],
-        'Agente': ['Agente', 'Responsable', 'Actor', 'Encargado']
-    }
-    renombres = {}
-    for estandar, variantes in mapa_cols.items():
-        for variante in variantes:
-            if variante in df.columns:
-                renombres[variante] = estandar
-                break 
-    df = df.rename(columns=renombres)
-    return df
-
-def fecha_es(fecha, formato="corto"):
-    if pd.isnull(fecha): return ""
-    meses = {1:'Ene',2:'Feb',3:'Mar',4:'Abr',5:'May',6:'Jun',7:'Jul',8:'Ago',9:'Sep',10:'Oct',11:'Nov',12:'Dic'}
-    meses_full_es = {1:'Enero',2:'Febrero',3:'Marzo',4:'Abril',5:'Mayo',6:'Junio',7:'Julio',8:'Agosto',9:'Septiembre',10:'Octubre',11:'Noviembre',12:'Diciembre'}
-    if formato == "corto": return f"{fecha.day}-{meses[fecha.month]}"
-    elif formato == "eje": return f"{meses[fecha.month]}-{str(fecha.year)[2:]}"
-    elif formato == "hoy_full": return f"{fecha.day}/{meses_full_es[fecha.month]}/{fecha.year}"
-    return f"{fecha.day}/{fecha.month}/{fecha.year}"
-
-def requiere_formato_arbol(df, col_fecha='Fecha_Vigente'):
-    if df.empty: return False
-    conteo = df[col_fecha].value_counts()
-    return (conteo > 1).any()
-
-# ==========================================
-# 2. MOTORES GRÁFICOS (VERSIÓN ESTÁNDAR)
-# ==========================================
-
-def graficar_modo_arbol(df_plot, titulo, f_inicio, f_fin, mapa_colores, mostrar_hoy, tipo_rango):
-    fig, ax = plt.subplots(figsize=(16, 9), constrained_layout=True)
-    ax.axhline(0, color="#34495e", linewidth=2, zorder=1)
-    plt.figtext(0.015, 0.98, f"Generado: {datetime.now().strftime('%d/%m/%Y')}", fontsize=10, color='#555555')
-
-    # --- CONFIGURACIÓN ORIGINAL ESTABLE ---
-    ANCHO_CAJA_DIAS = max(25, (f_fin - f_inicio).days * 0.08)
-    OFFSET_CONEXION_DIAS = ANCHO_CAJA_DIAS * 0.05
-    NIVEL_MIN_SINGLE = 3.5; STEP_SINGLE = 2.5
-    NIVEL_MIN_ARBOL = 5.0; STEP_ARBOL = 3.0
-
-    cajas_ocupadas = []; elementos_finales = []
-    grupos = df_plot.groupby('Fecha_Vigente')
-    lista_singles = []; lista_arboles = []
-    for fecha, grupo in grupos:
-        if len(grupo) == 1: lista_singles.append((fecha, grupo.iloc[0]))
-        else: lista_arboles.append((fecha, grupo))
-
-    for i, (fecha, row) in enumerate(lista_singles):
-        es_positivo = (i % 2 == 0)
-        nivel_base = NIVEL_MIN_SINGLE if es_positivo else -NIVEL_MIN_SINGLE
-        encontrado = False; intentos = 0; nivel_actual = nivel_base
-        while intentos < 20:
-            y_min, y_max = nivel_actual - 1.0, nivel_actual + 1.0
-            x_min, x_max = fecha - timedelta(days=ANCHO_CAJA_DIAS/2), fecha + timedelta(days=ANCHO_CAJA_DIAS/2)
-            colision = False
-            for (ox1, ox2, oy1, oy2) in cajas_ocupadas:
-                if (x_min < ox2 and x_max > ox1) and (y_min < oy2 and y_max > oy1): colision = True; break
-            if not colision:
-                cajas_ocupadas.append((x_min, x_max, y_min, y_max))
-                elementos_finales.append({'tipo': 'single', 'row': row, 'x': fecha, 'y': nivel_actual})
-                encontrado = True; break
-            if nivel_actual > 0: nivel_actual += STEP_SINGLE
-            else: nivel_actual -= STEP_SINGLE
-            intentos += 1
-        if not encontrado: elementos_finales.append({'tipo': 'single', 'row': row, 'x': fecha, 'y': nivel_actual})
-
-    for i_arbol, (fecha, grupo) in enumerate(lista_arboles):
-        cantidad = len(grupo); trunk_dir = 1 if i_arbol % 2 == 0 else -1
-        altura_base_tronco = NIVEL_MIN_ARBOL; encontrado_tronco = False; intentos_tronco = 0
-        while intentos_tronco < 15:
-            colision_arbol_entero = False; temp_cajas_ramas = []; temp_posiciones = []
-            alto_total = altura_base_tronco + (cantidad - 1) * STEP_ARBOL
-            y_fin_tronco = alto_total * trunk_dir
-            grupo = grupo.reset_index(drop=True)
-            for i_hito, row in grupo.iterrows():
-                y_nivel = (altura_base_tronco + (i_hito * STEP_ARBOL)) * trunk_dir
-                es_derecha = (i_hito % 2 == 0); dir_h = 1 if es_derecha else -1
-                x_caja = fecha + timedelta(days=ANCHO_CAJA_DIAS * dir_h)
-                y_min_box, y_max_box = y_nivel - 1.2, y_nivel + 1.2
-                x_min_box, x_max_box = min(fecha, x_caja) - timedelta(days=5), max(fecha, x_caja) + timedelta(days=5)
-                for (ox1, ox2, oy1, oy2) in cajas_ocupadas:
-                    if (x_min_box < ox2 and x_max_box > ox1) and (y_min_box < oy2 and y_max_box > oy1):
-                        colision_arbol_entero = True; break
-                if colision_arbol_entero: break
-                temp_cajas_ramas.append((x_min_box, x_max_box, y_min_box, y_max_box))
-                temp_posiciones.append({'row': row, 'y_nivel': y_nivel, 'x_caja': x_caja, 'es_derecha': es_derecha})
-            if not colision_arbol_entero:
-                cajas_ocupadas.extend(temp_cajas_ramas)
-                elementos_finales.append({'tipo': 'arbol', 'fecha': fecha, 'y_fin_tronco': y_fin_tronco, 'ramas': temp_posiciones, 'agente_raiz': grupo.iloc[0]['Agente']})
-                encontrado_tronco = True; break
-            altura_base_tronco += STEP_ARBOL; intentos_tronco += 1
-        if not encontrado_tronco:
-             elementos_finales.append({'tipo': 'arbol', 'fecha': fecha, 'y_fin_tronco': y_fin_tronco, 'ramas': temp_posiciones, 'agente_raiz': grupo.iloc[0]['Agente']})
-
-    max_abs_y = 4.0
-    for item in elementos_finales:
-        if item['tipo'] == 'single':
-            row = item['row']; x = item['x']; y = item['y']
-            if abs(y) > max_abs_y: max_abs_y = abs(y)
-            agente = str(row.get('Agente', 'N/A')); color = mapa_colores.get(agente, '#7f8c8d')
-            ax.vlines(x, 0, y, color=color, alpha=0.5, linewidth=1, linestyle='-', zorder=1)
-            ax.scatter(x, 0, s=60, color=color, marker='o', zorder=3)
-            f_teorica = row.get('Fecha_teorica', pd.NaT)
-            if pd.notnull(f_teorica) and abs((x - f_teorica).days) > 5:
-                carril = 1.0 if y > 0 else -1.0
-                ax.annotate("", xy=(x, carril), xytext=(max(f_teorica, f_inicio), carril), arrowprops=dict(arrowstyle="->", color='#555555', lw=0.9), zorder=5)
-                dias = (x - f_teorica).days
-                pos_txt = max(max(f_teorica, f_inicio), x - timedelta(days=6))
-                ax.text(pos_txt, carril-0.25, f"{'+' if dias>0 else ''}{dias}d", ha='center', va='top', fontsize=7, color='#555555', fontweight='bold', zorder=30).set_path_effects([pe.withStroke(linewidth=2.0, foreground='white')])
-            
-            # --- TEXTO NORMAL (SIN NEGRITA) PARA EVITAR COLISIONES ---
-            texto_lbl = f"{textwrap.fill(agente.upper(), 20)}\n{textwrap.fill(str(row.get('Hito / Etapa','')), 25)}\n{fecha_es(x)}"
-            
-            ax.annotate(texto_lbl, xy=(x, y), xytext=(x, y), bbox=dict(boxstyle="round,pad=0.4", fc="white", ec=color, lw=1.5, alpha=0.95), ha='center', va='center', fontsize=8, color='#2c3e50', zorder=10)
-        elif item['tipo'] == 'arbol':
-            fecha = item['fecha']; y_fin = item['y_fin_tronco']; ramas = item['ramas']; agente_raiz = item['agente_raiz']
-            if abs(y_fin) > max_abs_y: max_abs_y = abs(y_fin)
-            color_raiz = mapa_colores.get(agente_raiz, '#34495e')
-            ax.scatter(fecha, 0, s=80, color=color_raiz, marker='o', zorder=4, edgecolor='white', linewidth=1.5)
-            ax.vlines(fecha, 0, y_fin, color='#7f8c8d', alpha=0.5, linewidth=2, zorder=1, linestyle='--')
-            for rama in ramas:
-                row = rama['row']; y_nivel = rama['y_nivel']; x_caja = rama['x_caja']; es_derecha = rama['es_derecha']
-                if abs(y_nivel) > max_abs_y: max_abs_y = abs(y_nivel)
-                agente = str(row.get('Agente', 'N/A')); color = mapa_colores.get(agente, '#7f8c8d')
-                offset_gap = timedelta(days=OFFSET_CONEXION_DIAS)
-                x_linea_fin = x_caja - offset_gap if es_derecha else x_caja + offset_gap
-                ax.plot([fecha, x_linea_fin], [y_nivel, y_nivel], color=color, linewidth=1.5, zorder=2)
-                ax.scatter(fecha, y_nivel, s=30, color=color, zorder=3)
-                
-                # --- TEXTO NORMAL (SIN NEGRITA) ---
-                texto_lbl = f"{textwrap.fill(agente.upper(), 20)}\n{textwrap.fill(str(row.get('Hito / Etapa','')), 25)}\n{fecha_es(fecha)}"
-
-                ax.annotate(texto_lbl, xy=(x_caja, y_nivel), xytext=(x_caja, y_nivel), bbox=dict(boxstyle="round,pad=0.4", fc="white", ec=color, lw=1.5, alpha=1.0), ha='center', va='center', fontsize=7.5, color='#2c3e50', zorder=10)
-                f_teorica = row.get('Fecha_teorica', pd.NaT)
-                if pd.notnull(f_teorica) and abs((fecha - f_teorica).days) > 3:
-                    offset_flecha = 1.2 if y_nivel > 0 else -1.2
-                    y_flecha = y_nivel + offset_flecha
-                    if abs(y_flecha) > max_abs_y: max_abs_y = abs(y_flecha)
-                    f_ini_vis = max(f_teorica, f_inicio)
-                    if f_teorica >= f_inicio: ax.vlines(f_teorica, 0, y_flecha, color='#bdc3c7', alpha=0.6, linestyles=':', zorder=1); ax.scatter(f_teorica, 0, s=20, color='#bdc3c7', marker='|', zorder=1)
-                    ax.annotate("", xy=(x_caja, y_flecha), xytext=(f_ini_vis, y_flecha), arrowprops=dict(arrowstyle="->", color='#555555', lw=0.9), zorder=5)
-                    dias = (fecha - f_teorica).days
-                    pos_txt = max(f_ini_vis, x_caja - timedelta(days=6)) if x_caja > f_ini_vis else min(f_ini_vis, x_caja + timedelta(days=6))
-                    va_txt = 'top' if y_nivel > 0 else 'bottom'; offset_txt_y = -0.25 if y_nivel > 0 else 0.25
-                    ax.text(pos_txt, y_flecha + offset_txt_y, f"{'+' if dias>0 else ''}{dias}d", ha='center', va=va_txt, fontsize=7, color='#555555', fontweight='bold', zorder=30).set_path_effects([pe.withStroke(linewidth=2.0, foreground='white')])
-
-    ax.spines['left'].set_visible(False); ax.spines['right'].set_visible(False); ax.spines['top'].set_visible(False); ax.yaxis.set_visible(False)
-    ax.set_xlim(f_inicio, f_fin)
-    margen_y_final = max_abs_y + 3.0
-    ax.set_ylim(-margen_y_final, margen_y_final)
-
-    if mostrar_hoy and (f_inicio <= datetime.now() <= f_fin):
-        hoy = datetime.now()
-        ax.axvline(hoy, color='#e74c3c', linestyle='--', alpha=0.8, linewidth=1.5, zorder=0)
-        offset_dias_hoy = (f_fin - f_inicio).days * 0.008
-        ax.text(hoy - timedelta(days=offset_dias_hoy), margen_y_final - 0.5, f"HOY\n{fecha_es(hoy, 'hoy_full')}", color='#e74c3c', fontsize=9, fontweight='bold', ha='right', va='top')
-
-    ax.xaxis.set_major_locator(mdates.MonthLocator())
-    ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: fecha_es(mdates.num2date(x), "eje")))
-    
-    titulo_limpio = titulo.replace('_', ' ')
-    plt.title(f"Línea de Tiempo: {titulo_limpio}", fontsize=18, fontweight='bold', color='#2c3e50', pad=25)
-    
-    leyenda = [Patch(facecolor=mapa_colores.get(a, '#7f8c8d'), label=a) for a in df_plot['Agente'].unique()]
-    leyenda.append(Line2D([0],[0], color='#555555', lw=1, marker='>', label='Días Retraso'))
-    ax.legend(handles=leyenda, title="Agentes Responsables", loc='upper center', bbox_to_anchor=(0.5, -0.14), ncol=4, fancybox=True, shadow=True)
-
-    if tipo_rango == 3:
-        txt_rango = f"Periodo Personalizado:\n{f_inicio.strftime('%d/%m/%Y')} - {f_fin.strftime('%d/%m/%Y')}"
-        ax.text(0.0, -0.14, txt_rango, transform=ax.transAxes, fontsize=9, color='#555555', va='top', ha='left', bbox=dict(boxstyle="round,pad=0.4", fc="#ecf0f1", ec="#bdc3c7", lw=1))
-
-    return fig
-
-def graficar_modo_estandar(df_plot, titulo, f_inicio, f_fin, mapa_colores, mostrar_hoy, tipo_rango):
-    col_vigente, col_teorica = 'Fecha_Vigente', 'Fecha_teorica'
-    ocupacion_niveles, niveles_asignados = {}, []
-    BASE_NIVEL_POS = 5.0; BASE_NIVEL_NEG = -5.0; STEP_NIVEL = 2.5; MARGEN_DIAS = 75
-    niveles_flechas_pos, niveles_flechas_neg = [0.8, 1.6, 2.4], [-0.8, -1.6, -2.4]
-    ocupacion_flechas = {lvl: [] for lvl in niveles_flechas_pos + niveles_flechas_neg}
-
-    for index, row in df_plot.iterrows():
-        fecha = row[col_vigente]; es_positivo = (index % 2 == 0)
-        nivel_actual = BASE_NIVEL_POS if es_positivo else BASE_NIVEL_NEG
-        encontrado, intentos = False, 0
-        while intentos < 20:
-            colision = False
-            if nivel_actual in ocupacion_niveles:
-                for f_ocupada in ocupacion_niveles[nivel_actual]:
-                    if abs((fecha - f_ocupada).days) < MARGEN_DIAS: colision = True; break
-            if not colision:
-                if nivel_actual not in ocupacion_niveles: ocupacion_niveles[nivel_actual] = []
-                ocupacion_niveles[nivel_actual].append(fecha)
-                niveles_asignados.append(nivel_actual); encontrado = True; break
-            if es_positivo: nivel_actual += STEP_NIVEL
-            else: nivel_actual -= STEP_NIVEL
-            intentos += 1
-        if not encontrado:
-            niveles_asignados.append(nivel_actual)
-            if nivel_actual not in ocupacion_niveles: ocupacion_niveles[nivel_actual] = []
-            ocupacion_niveles[nivel_actual].append(fecha)
-    
-    df_plot['nivel'] = niveles_asignados
-
-    def obtener_carril_flecha(f_inicio, f_fin, es_arriba):
-        carriles = niveles_flechas_pos if es_arriba else niveles_flechas_neg
-        start, end = min(f_inicio, f_fin), max(f_inicio, f_fin)
-        for carril in carriles:
-            libre = True
-            for (o_start, o_end) in ocupacion_flechas[carril]:
-                if (start <= o_end + timedelta(days=5)) and (end >= o_start - timedelta(days=5)): libre = False; break
-            if libre: ocupacion_flechas[carril].append((start, end)); return carril
-        return carriles[len(carriles) // 2]
-
-    fig, ax = plt.subplots(figsize=(16, 9), constrained_layout=True)
-    ax.axhline(0, color="#34495e", linewidth=2, zorder=1)
-    plt.figtext(0.015, 0.98, f"Generado: {datetime.now().strftime('%d/%m/%Y')}", fontsize=10, color='#555555')
-
-    # Corrección de limite_superior definida antes de uso
-    max_y = df_plot['nivel'].max() if not df_plot['nivel'].empty else 4
-    min_y = df_plot['nivel'].min() if not df_plot['nivel'].empty else -4
-    limite_superior = max(8, max_y + 3.0)
-    limite_inferior = min(-8, min_y - 3.0)
-    ax.set_ylim(limite_inferior, limite_superior)
-
-    for i, row in df_plot.iterrows():
-        f_vigente = row[col_vigente]; f_teorica = row[col_teorica]; nivel = row['nivel']
-        agente = str(row['Agente']); color = mapa_colores.get(agente, '#7f8c8d')
-        
-        ax.vlines(f_vigente, 0, nivel, color=color, alpha=0.5, linewidth=1, linestyle='-', zorder=1)
-        ax.scatter(f_vigente, 0, s=60, color=color, marker='o', zorder=3)
-
-        if pd.notnull(f_teorica):
-            dias = (f_vigente - f_teorica).days
-            if abs(dias) > 5:
-                es_arriba = (nivel > 0)
-                altura_cota = obtener_carril_flecha(f_teorica, f_vigente, es_arriba)
-                f_ini_vis = max(f_teorica, f_inicio)
-                if f_teorica >= f_inicio:
-                    ax.vlines(f_teorica, 0, altura_cota, color='#bdc3c7', alpha=0.8, linestyles=':', zorder=1)
-                    ax.scatter(f_teorica, 0, s=20, color='#bdc3c7', marker='|', zorder=2)
-                ax.annotate("", xy=(f_vigente, altura_cota), xytext=(f_ini_vis, altura_cota), arrowprops=dict(arrowstyle="->", color='#555555', lw=0.9), zorder=20)
-                pos_txt = max(f_ini_vis, f_vigente - timedelta(days=6))
-                signo = "+" if dias > 0 else ""
-                ax.text(pos_txt, altura_cota - 0.25, f"{signo}{dias}d", ha='center', va='top', fontsize=7, color='#555555', fontweight='bold', zorder=30).set_path_effects([pe.withStroke(linewidth=2.0, foreground='white')])
-
-        # --- TEXTO NORMAL ---
-        texto_lbl = f"{textwrap.fill(agente.upper(), 20)}\n{textwrap.fill(str(row['Hito / Etapa']), 25)}\n{fecha_es(f_vigente)}"
-        
-        ax.annotate(texto_lbl, xy=(f_vigente, nivel), xytext=(f_vigente, nivel), bbox=dict(boxstyle="round,pad=0.4", fc="white", ec=color, lw=1.5, alpha=0.95), ha='center', va='center', fontsize=8, color='#2c3e50', zorder=10)
-
-    ax.spines['left'].set_visible(False); ax.spines['right'].set_visible(False); ax.spines['top'].set_visible(False); ax.yaxis.set_visible(False)
-    ax.set_xlim(f_inicio, f_fin)
-    
-    if mostrar_hoy and (f_inicio <= datetime.now() <= f_fin):
-        hoy = datetime.now()
-        ax.axvline(hoy, color='#e74c3c', linestyle='--', alpha=0.8, linewidth=1.5, zorder=0)
-        offset_dias_hoy = (f_fin - f_inicio).days * 0.008
-        ax.text(hoy - timedelta(days=offset_dias_hoy), limite_superior * 0.95, f"HOY\n{fecha_es(hoy, 'hoy_full')}", color='#e74c3c', fontsize=9, fontweight='bold', ha='right', va='top')
-
-    ax.xaxis.set_major_locator(mdates.MonthLocator())
-    ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: fecha_es(mdates.num2date(x), "eje")))
-    
-    titulo_limpio = titulo.replace('_', ' ')
-    plt.title(f"Línea de Tiempo: {titulo_limpio}", fontsize=18, fontweight='bold', color='#2c3e50', pad=25)
-    
-    leyenda = [Patch(facecolor=mapa_colores.get(a, '#7f8c8d'), label=a) for a in df_plot['Agente'].unique()]
-    leyenda.append(Line2D([0],[0], color='#555555', lw=1, marker='>', label='Días Retraso'))
-    ax.legend(handles=leyenda, title="Agentes Responsables", loc='upper center', bbox_to_anchor=(0.5, -0.14), ncol=4, fancybox=True, shadow=True)
-
-    if tipo_rango == 3:
-        txt_rango = f"Periodo Personalizado:\n{f_inicio.strftime('%d/%m/%Y')} - {f_fin.strftime('%d/%m/%Y')}"
-        ax.text(0.0, -0.14, txt_rango, transform=ax.transAxes, fontsize=9, color='#555555', va='top', ha='left', bbox=dict(boxstyle="round,pad=0.4", fc="#ecf0f1", ec="#bdc3c7", lw=1))
-
-    return fig
-
 # ==========================================
 # 3. INTERFAZ STREAMLIT (FINAL)
 # ==========================================
@@ -414,20 +224,33 @@ with st.sidebar:
     
     # 2. BOTÓN RECARGAR
     if st.button("🔄 Forzar Recarga"):
-        st.cache_resource.clear()
+        obtener_refrescador(URL_ARCHIVO_NUBE).forzar(esperar=True)
         st.rerun()
 
+    with st.expander("📡 Estado de la caché"):
+        st.json(obtener_refrescador(URL_ARCHIVO_NUBE).estado())
+        try:
+            token, webhook = st.secrets.get("GITHUB_TOKEN"), st.secrets.get("WEBHOOK_URL")
+        except Exception:
+            token = webhook = None
+        if token:
+            st.caption("Cola de guardado")
+            st.json(obtener_cola_guardado(token, webhook).estado())
+        if webhook:
+            st.caption("Webhook")
+            st.json(obtener_despachador_webhook(webhook).estado())
+
 st.title("📊 Línea de Tiempo")
 
 try:
-    xl_file = cargar_datos_desde_nube(URL_ARCHIVO_NUBE)
+    libro = cargar_datos_desde_nube(URL_ARCHIVO_NUBE)
     
-    if xl_file is None:
+    if libro is None:
         st.error("❌ No se pudo conectar con el archivo de OneDrive. Verifica el enlace público.")
     else:
-        hojas = [h for h in xl_file.sheet_names if not h.startswith('_')]
+        hojas = hojas_visibles(libro.hojas)
         
-        tab1, tab2 = st.tabs(["📈 Visualización", "📝 Gestión de Fechas"])
+        tab1, tab2, tab3 = st.tabs(["📈 Visualización", "📝 Gestión de Fechas", "🕰️ Historial"])
 
         # ==========================
         # PESTAÑA 1: VISUALIZACIÓN
@@ -436,91 +259,121 @@ try:
             st.sidebar.header("⚙️ Configuración")
             hoja_seleccionada = st.sidebar.selectbox(
                 "Seleccione Normativa:", 
-                hojas,
-                format_func=lambda x: x.replace('_', ' ')
+                hojas + [PORTAFOLIO],
+                format_func=lambda x: "🗂️ Portafolio (todas las normativas)" if x == PORTAFOLIO else x.replace('_', ' ')
             )
             
-            opcion_fecha = st.sidebar.radio("Rango de Fechas:", ("Año Calendario Actual", "Ventana Móvil (-12/+12 meses)", "Personalizado"))
+            opcion_fecha = st.sidebar.radio("Rango de Fechas:", tuple(OPCIONES_RANGO))
             
             hoy = datetime.now()
-            tipo_rango = 0
-            
-            if opcion_fecha == "Año Calendario Actual":
-                f_inicio = datetime(hoy.year, 1, 1)
-                f_fin = datetime(hoy.year, 12, 31)
-                tipo_rango = 1
-            elif opcion_fecha == "Ventana Móvil (-12/+12 meses)":
-                f_inicio = hoy - timedelta(days=365)
-                f_fin = hoy + timedelta(days=365)
-                tipo_rango = 2
-            else: 
+            d_inicio = d_fin = None
+            if opcion_fecha == "Personalizado":
                 col1, col2 = st.sidebar.columns(2)
                 d_inicio = col1.date_input("Inicio", hoy - timedelta(days=30), format="DD/MM/YYYY")
                 d_fin = col2.date_input("Fin", hoy + timedelta(days=30), format="DD/MM/YYYY")
-                f_inicio = pd.to_datetime(d_inicio)
-                f_fin = pd.to_datetime(d_fin)
-                tipo_rango = 3
+            f_inicio, f_fin, tipo_rango = rango_fechas(opcion_fecha, hoy, d_inicio, d_fin)
                 
             mostrar_hoy = st.sidebar.checkbox("Mostrar línea de HOY", value=True)
+            # Interactivo: el navegador dibuja la disposición y hace zoom sin volver a renderizar aquí
+            modo_grafico = st.sidebar.radio("Modo del gráfico:", MODOS_GRAFICO, horizontal=True)
             
-            df = pd.read_excel(xl_file, sheet_name=hoja_seleccionada)
-            df = normalizar_columnas(df)
+            with perfil.tramo("app.hoja", hoja=hoja_seleccionada) as t:
+                df = obtener_almacen_hojas().obtener(libro, hoja_seleccionada)
+                t["filas"] = len(df)
             
+            indice = obtener_almacen_hojas().indice(libro)
             filtro_proceso = "Todo"
-            if 'Hito / Etapa' in df.columns:
-                df['Hito_Upper'] = df['Hito / Etapa'].astype(str).str.upper()
-                tiene_zonal = df['Hito_Upper'].str.contains('ZONAL').any()
-                tiene_nacional = df['Hito_Upper'].str.contains('NACIONAL').any()
-                if tiene_zonal and tiene_nacional:
-                    filtro_proceso = st.sidebar.radio("Filtro Proceso:", ("Todo", "Zonal", "Nacional"))
+            filtros = filtros_disponibles(indice, hoja_seleccionada)
+            if len(filtros) > 1:
+                filtro_proceso = st.sidebar.radio("Filtro Proceso:", filtros)
+
+            # --- BÚSQUEDA Y FACETAS (índice por versión del libro, ver indice.py) ---
+            texto_busqueda = st.sidebar.text_input("🔎 Buscar hitos:", placeholder="Hito, agente, proceso, descripción…")
+            facetas = {}
+            with st.sidebar.expander("🧩 Filtrar por faceta"):
+                for faceta in FACETAS_BARRA:
+                    conteos = indice.conteos(faceta, hoja_seleccionada)
+                    if len(conteos) > 1:
+                        elegidos = st.multiselect(faceta, list(conteos), key=f"faceta_{hoja_seleccionada}_{faceta}",
+                                                  format_func=lambda v, c=conteos: f"{v} ({c[v]})")
+                        if elegidos:
+                            facetas[faceta] = tuple(elegidos)
+            with perfil.tramo("app.buscar", facetas=len(facetas)) as t:
+                seleccion = seleccion_vista(indice, filtro_proceso, texto_busqueda, facetas)
+                t["coincidencias"] = "todas" if seleccion is None else len(seleccion)
+            if texto_busqueda.strip() or facetas:
+                # La búsqueda abarca todas las normativas; el gráfico muestra sólo la elegida
+                por_normativa = indice.conteos("Normativa", seleccion=seleccion)
+                st.sidebar.caption(f"{sum(por_normativa.values())} hitos coinciden en todas las normativas"
+                                   + "".join(f"  \n{normativa}: {n}" for normativa, n in por_normativa.items()))
+            filtro = (filtro_proceso, " ".join(tokens(texto_busqueda)), tuple(sorted(facetas.items())))
             
+            # Se recuerda qué gráfico se generó: preparar o descargar una exportación
+            # provoca un rerun y el gráfico debe seguir visible mientras no cambien los parámetros.
+            parametros_grafico = (libro.sha, hoja_seleccionada, f_inicio, f_fin, filtro, mostrar_hoy, tipo_rango)
             if st.sidebar.button("Generar Gráfico"):
+                st.session_state['grafico_activo'] = parametros_grafico
+
+            if st.session_state.get('grafico_activo') == parametros_grafico:
                 with st.spinner('Generando visualización...'):
-                    if filtro_proceso == "Zonal":
-                        df = df[df['Hito_Upper'].str.contains('ZONAL') | df['Hito_Upper'].str.contains('COMÚN')].copy()
-                    elif filtro_proceso == "Nacional":
-                        df = df[df['Hito_Upper'].str.contains('NACIONAL') | df['Hito_Upper'].str.contains('COMÚN')].copy()
+                    with perfil.tramo("app.filtrar", filtro=filtro_proceso) as t:
+                        df_plot = datos_grafico(df, f_inicio, f_fin, indice.mascara(df, hoja_seleccionada, seleccion))
+                        t["filas"] = 0 if df_plot is None else len(df_plot)
                     
-                    if 'Fecha_Vigente' not in df.columns:
+                    if df_plot is None:
                         st.error("❌ El archivo no tiene la columna 'Fecha Vigente'.")
                     else:
-                        df['Fecha_Vigente'] = pd.to_datetime(df['Fecha_Vigente'], errors='coerce')
-                        df['Fecha_teorica'] = pd.to_datetime(df.get('Fecha_teorica', pd.NaT), errors='coerce')
-                        df = df.dropna(subset=['Fecha_Vigente'])
-                        
-                        df_plot = df[(df['Fecha_Vigente'] >= f_inicio) & (df['Fecha_Vigente'] <= f_fin)].copy()
-                        
                         if df_plot.empty:
-                            st.warning("⚠️ No hay datos en el rango de fechas seleccionado.")
+                            st.warning("⚠️ No hay datos en el rango de fechas seleccionado." if seleccion is None else
+                                       "⚠️ Ningún hito coincide con la búsqueda y los filtros en el rango de fechas seleccionado.")
                         else:
-                            mapa_colores = {
-                                'Comisión': "#0400ff", 'CNE': "#0400ff", 'Participantes': '#27ae60', 
-                                'Participantes e interesados': '#27ae60', 'Interesados': '#27ae60', 
-                                'Empresas': '#27ae60', 'Coordinador': '#e67e22', 'CEN': '#e67e22'
-                            }
-                            colores_extra = ["#ff0000", "#8e44ad", "#16a085", "#34495e", "#d35400"]
-                            idx_extra = 0
-                            for ag in df_plot['Agente'].unique():
-                                if ag and ag not in mapa_colores:
-                                    mapa_colores[ag] = colores_extra[idx_extra % len(colores_extra)]
-                                    idx_extra += 1
+                            titulo_limpio = titulo_hoja(hoja_seleccionada)
+                            clave_disposicion, disp = disposicion_grafico(
+                                obtener_cache_disposiciones(), libro.sha, hoja_seleccionada,
+                                df_plot, f_inicio, f_fin, filtro
+                            )
                             
-                            titulo_limpio = hoja_seleccionada.replace('_', ' ')
+                            # La fecha entra en la clave por el rótulo "Generado" y la línea de HOY
+                            fecha_hoy_str = datetime.now().strftime("%d-%m-%Y")
+                            clave_imagen = (clave_disposicion, mostrar_hoy, tipo_rango, fecha_hoy_str)
+                            imagenes = obtener_cache_imagenes()
                             
-                            if requiere_formato_arbol(df_plot):
-                                fig = graficar_modo_arbol(df_plot, titulo_limpio, f_inicio, f_fin, mapa_colores, mostrar_hoy, tipo_rango)
+                            if modo_grafico == "🖱️ Interactivo":
+                                cargas = obtener_cache_cargas()
+                                with perfil.tramo("app.carga", cache="hit" if clave_disposicion in cargas else "miss"):
+                                    carga = cargas.obtener_o_calcular(clave_disposicion, lambda: serializar(disp))
+                                with perfil.tramo("ui.componente", bytes=len(carga)):
+                                    linea_tiempo_interactiva(carga=carga, hoy=marca_hoy(disp, datetime.now()) if mostrar_hoy else None,
+                                                             alto=ALTO_INTERACTIVO, key="linea_tiempo", default=None)
                             else:
-                                fig = graficar_modo_estandar(df_plot, titulo_limpio, f_inicio, f_fin, mapa_colores, mostrar_hoy, tipo_rango)
+                                clave_pantalla = clave_imagen + ("png", DPI_PANTALLA)
+                                with perfil.tramo("app.imagen", cache="hit" if clave_pantalla in imagenes else "miss"):
+                                    png_pantalla = imagenes.obtener_o_calcular(
+                                        clave_pantalla,
+                                        lambda: obtener_pool_render().exportar(disp, mostrar_hoy, tipo_rango, "png", DPI_PANTALLA)
+                                    )
+                                with perfil.tramo("ui.st_image", bytes=len(png_pantalla)):
+                                    st.image(png_pantalla)
+                            if disp.n_hitos < len(df_plot):
+                                st.caption(f"🔎 {len(df_plot)} hitos agrupados en {disp.n_hitos} marcadores (◆ = grupo). "
+                                           "Acote el rango de fechas para ver el detalle.")
                             
-                            st.pyplot(fig)
+                            # --- EXPORTACIÓN BAJO DEMANDA ---
+                            col_fmt, col_btn = st.columns([3, 1])
+                            etiqueta_fmt = col_fmt.radio("Formato de descarga:", list(FORMATOS_DESCARGA), horizontal=True)
+                            formato, mime, dpi = FORMATOS_DESCARGA[etiqueta_fmt]
+                            clave_export = clave_imagen + (formato, dpi)
                             
-                            fecha_hoy_str = datetime.now().strftime("%d-%m-%Y")
-                            fn = f"timeline_{titulo_limpio}_{fecha_hoy_str}.png"
-                            
-                            img = io.BytesIO()
-                            plt.savefig(img, format='png', dpi=400, bbox_inches='tight', pad_inches=0.2)
-                            img.seek(0)
-                            st.download_button(label="💾 Descargar Imagen HD", data=img, file_name=fn, mime="image/png")
+                            if clave_export in imagenes or col_btn.button("⚙️ Preparar descarga"):
+                                with st.spinner(f"Preparando {etiqueta_fmt}..."), \
+                                        perfil.tramo("app.exportacion", formato=formato, dpi=dpi,
+                                                     cache="hit" if clave_export in imagenes else "miss"):
+                                    datos = imagenes.obtener_o_calcular(
+                                        clave_export,
+                                        lambda: obtener_pool_render().exportar(disp, mostrar_hoy, tipo_rango, formato, dpi)
+                                    )
+                                fn = f"timeline_{titulo_limpio}_{fecha_hoy_str}.{formato}"
+                                st.download_button(label=f"💾 Descargar {etiqueta_fmt}", data=datos, file_name=fn, mime=mime)
 
         # ==========================
         # PESTAÑA 2: GESTIÓN (EDICIÓN)
@@ -531,46 +384,31 @@ try:
             
             hoja_edit = st.selectbox("Seleccionar Normativa a Editar:", hojas, key="sel_edit", format_func=lambda x: x.replace('_', ' '))
             
-            # --- 1. CARGA INICIAL ---
-            df_edit = pd.read_excel(xl_file, sheet_name=hoja_edit)
-            df_edit = normalizar_columnas(df_edit) 
-
-            # --- 2. CONVERSIÓN DE TIPOS ---
-            cols_fechas_clave = ['Fecha_Real_Manual', 'Fecha_Proyectada', 'Fecha_teorica', 'Fecha_Vigente']
-            for col in cols_fechas_clave:
-                if col in df_edit.columns:
-                    df_edit[col] = pd.to_datetime(df_edit[col], errors='coerce')
-
-            # --- 3. 🧠 LÓGICA DE NEGOCIO: CÁLCULO ESPEJO (PARCHE VISUAL) ---
-            # Si hay fecha manual -> manual. Si no -> Proyectada.
-            if 'Fecha_Proyectada' in df_edit.columns and 'Fecha_Real_Manual' in df_edit.columns:
-                df_edit['Fecha_Vigente'] = df_edit['Fecha_Real_Manual'].fillna(df_edit['Fecha_Proyectada'])
-            
-            # --- 4. SEMÁFORO (ESTADO) ---
-            if "Fecha_Vigente" in df_edit.columns:
-                hoy = pd.Timestamp.now().normalize()
-                
-                def obtener_estado(fecha):
-                    if pd.isnull(fecha): return "⚪ Pendiente"
-                    if fecha < hoy: return "🔴 Vencido"
-                    return "🟢 Vigente"
-                
-                df_edit.insert(0, "Estado", df_edit["Fecha_Vigente"].apply(obtener_estado))
-
-            # --- 5. COLUMNAS A MOSTRAR ---
-            cols_deseadas = [
-                "Estado", 
-                "Norma", "Proceso", "Hito / Etapa", "Agente",
-                # "Fecha_teorica" (ELIMINADA de la vista)
-                "Fecha_Real_Manual", 
-                "Fecha_Vigente", 
-                "Respuesta/Interactua", "Descripción"
-            ]
-            
-            # Filtro de seguridad
-            cols_finales = [c for c in cols_deseadas if c in df_edit.columns]
-            
-            # --- 6. CONFIGURACIÓN DEL EDITOR ---
+            # --- 1. SESIÓN DE EDICIÓN (SÓLO LAS CELDAS MODIFICADAS, VER edicion.py) ---
+            # La hoja viene normalizada y tipada del almacén; no se copia ni se modifica
+            df_edit = obtener_almacen_hojas().obtener(libro, hoja_edit)
+            sesiones = st.session_state.setdefault("sesiones_edicion", {})
+            sesion = sesiones[hoja_edit] = SesionEdicion.continuar(sesiones.get(hoja_edit), df_edit, hoja_edit, libro.sha)
+            if not sesion.editable:
+                st.warning("⚠️ Esta hoja no tiene la columna 'Fecha_Real_Manual'; se muestra sólo para consulta.")
+
+            # --- 2. FILTRO Y PÁGINA: AL NAVEGADOR VA SÓLO LA PORCIÓN VISIBLE ---
+            col_buscar, col_mod, col_tam = st.columns([3, 1, 1])
+            texto_edit = col_buscar.text_input("🔎 Buscar hitos:", key=f"buscar_edit_{hoja_edit}")
+            solo_modificadas = col_mod.checkbox("Sólo modificadas", key=f"solo_mod_{hoja_edit}")
+            tamano = col_tam.selectbox("Filas por página:", TAMANOS_PAGINA, index=1, key="tamano_pagina_edit")
+            indice = obtener_almacen_hojas().indice(libro)
+            mascara = indice.mascara(df_edit, hoja_edit, indice.seleccionar(texto_edit))
+            posiciones = sesion.posiciones(mascara, solo_modificadas)
+            n_paginas = paginas(len(posiciones), tamano)
+            pagina = st.number_input(f"Página (de {n_paginas}):", min_value=1, max_value=n_paginas, value=1,
+                                     key=f"pagina_edit_{hoja_edit}_{len(posiciones)}") if n_paginas > 1 else 1
+            visibles = posiciones[(pagina - 1) * tamano:pagina * tamano]
+            # Espejo y semáforo (depende del día) sólo de las filas visibles, con las ediciones aplicadas
+            vista_edit = sesion.pagina(visibles)
+            st.caption(f"{len(posiciones)} de {sesion.filas} hitos · mostrando {len(visibles)} · {len(sesion.cambios)} sin guardar")
+
+            # --- 3. CONFIGURACIÓN DEL EDITOR ---
             column_cfg = {
                 "Estado": st.column_config.TextColumn("Estado", width="small", disabled=True),
                 "Norma": st.column_config.TextColumn(disabled=True),
@@ -587,31 +425,134 @@ try:
                     "✏️ Fecha Real Manual", 
                     help="Modifica esta fecha",
                     format="DD/MM/YYYY",
-                    disabled=False 
+                    disabled=not sesion.editable
                 )
             }
 
+            # La clave cambia con las filas visibles: lo editado en una página no se aplica a otra
+            generacion = st.session_state.setdefault("generacion_editor", 0)
+            clave_editor = f"editor_{hoja_edit}_{generacion}_{hash(vista_edit.index.to_numpy().tobytes())}"
             df_modificado = st.data_editor(
-                df_edit[cols_finales],
+                vista_edit,
                 column_config=column_cfg,
                 use_container_width=True,
                 num_rows="fixed", 
-                hide_index=True
+                hide_index=True,
+                key=clave_editor
             )
+            sesion.leer_editor(vista_edit, df_modificado)
             
-            if st.button("💾 Guardar Cambios en la Nube", type="primary"):
-                with st.spinner("Guardando cambios..."):
-                    exito = guardar_en_github_manteniendo_formulas(df_modificado, hoja_edit)
-                    if exito:
-                        st.success("✅ ¡Guardado! Espera unos segundos y usa el botón 'Forzar Recarga'.")
-                        st.cache_resource.clear()
+            col_guardar, col_descartar = st.columns([3, 1])
+            if col_descartar.button("↩️ Descartar cambios", disabled=not sesion.cambios):
+                sesion.descartar()
+                st.session_state["generacion_editor"] += 1
+                st.rerun()
+            if col_guardar.button(f"💾 Guardar Cambios en la Nube ({len(sesion.cambios)})", type="primary"):
+                if not sesion.cambios:
+                    st.info("ℹ️ No hay cambios que guardar.")
+                else:
+                    with st.spinner(f"Guardando {len(sesion.cambios)} cambio(s)..."):
+                        exito = guardar_en_github_manteniendo_formulas(dict(sesion.cambios), hoja_edit)
+                        if exito:
+                            sesion.confirmar()
+                            st.session_state["generacion_editor"] += 1
+                            st.success("✅ ¡Guardado! Los gráficos se actualizarán solos cuando el archivo se sincronice.")
+                        else:
+                            st.error("❌ Error al guardar. Verifica tus Secrets.")
+
+        # ==========================
+        # PESTAÑA 3: HISTORIAL DE FECHAS
+        # ==========================
+        with tab3:
+            st.header("🕰️ Historial de Fechas")
+            try:
+                historial = obtener_historial()
+                with st.spinner("Leyendo las versiones nuevas del libro..."):
+                    historial.actualizar()
+            except HistorialNoDisponible as e:
+                historial = None
+                st.info(f"ℹ️ El historial se arma desde un clon local de git del repositorio ({e}).")
+
+            if historial is not None and not historial.versiones:
+                st.info(f"ℹ️ El clon local no tiene commits de {NOMBRE_ARCHIVO_EXCEL}.")
+            elif historial is not None:
+                col_hoja, col_desde = st.columns(2)
+                hoja_hist = col_hoja.selectbox("Normativa:", [None] + historial.hojas(), key="sel_hist",
+                                               format_func=lambda x: "Todas" if x is None else x.replace('_', ' '))
+                desde_hist = col_desde.date_input("Desde:", value=(datetime.now() - timedelta(days=182)).date(), key="desde_hist")
+                st.caption(f"{len(historial.versiones)} versiones del libro · último commit "
+                           f"{datetime.fromtimestamp(historial.versiones[-1]['fecha']):%d/%m/%Y %H:%M}")
+
+                # --- TENDENCIA DE CORRIMIENTOS ---
+                tendencia = historial.tendencia(desde_hist, hoja=hoja_hist)
+                st.subheader("📉 Cambios de fecha por mes")
+                if tendencia.empty:
+                    st.info("ℹ️ Sin cambios de fecha en el periodo.")
+                else:
+                    st.bar_chart(tendencia[["Atrasos", "Adelantos"]])
+                    st.caption(f"{int(tendencia['Cambios'].sum())} cambios · "
+                               f"{int(tendencia['Dias_Netos'].sum()):+d} días corridos en neto")
+
+                # --- HITOS QUE MÁS SE MOVIERON ---
+                st.subheader("↔️ Deriva por hito")
+                deriva = historial.deriva(desde_hist, hoja=hoja_hist)
+                st.dataframe(deriva.head(100), use_container_width=True, hide_index=True, column_config={
+                    "Fecha_Inicial": st.column_config.DateColumn("Fecha al inicio", format="DD/MM/YYYY"),
+                    "Fecha_Final": st.column_config.DateColumn("Fecha actual", format="DD/MM/YYYY"),
+                    "Dias": st.column_config.NumberColumn("Días corridos"),
+                })
+
+                # --- LÍNEA DE TIEMPO A UNA FECHA ---
+                st.subheader("🗓️ Línea de tiempo a una fecha")
+                if hoja_hist is None:
+                    st.info("ℹ️ Elige una normativa para ver su línea de tiempo en una fecha pasada.")
+                else:
+                    al_hist = st.date_input("Fechas vigentes al:", value=datetime.now().date(), key="al_hist")
+                    momento = datetime.combine(al_hist, datetime.max.time())
+                    n_version = historial.version_al(momento)
+                    version = historial.versiones[n_version]['commit'] if n_version >= 0 else None
+                    f_inicio_h, f_fin_h, tipo_rango_h = rango_fechas("Ventana Móvil (-12/+12 meses)", hoy=momento)
+                    clave_hist = ("historial", version, hoja_hist, f_inicio_h, f_fin_h)
+                    imagenes = obtener_cache_imagenes()
+                    with perfil.tramo("app.historial", cache="hit" if clave_hist in imagenes else "miss"):
+                        def dibujar_historial():
+                            df_plot = datos_grafico(historial.estado_al(momento, hoja_hist), f_inicio_h, f_fin_h)
+                            if df_plot.empty:
+                                return b""
+                            disp = calcular_disposicion(agrupar_por_detalle(df_plot, f_inicio_h, f_fin_h),
+                                                        f"{titulo_hoja(hoja_hist)} al {momento:%d/%m/%Y}", f_inicio_h, f_fin_h)
+                            return obtener_pool_render().exportar(disp, False, tipo_rango_h, "png", DPI_PANTALLA)
+                        png_hist = imagenes.obtener_o_calcular(clave_hist, dibujar_historial)
+                    if not png_hist:
+                        st.warning("⚠️ No había hitos con fecha en esa ventana.")
                     else:
-                        st.error("❌ Error al guardar. Verifica tus Secrets.")
+                        st.image(png_hist)
 
 except Exception as e:
     st.error(f"Error al procesar el archivo: {e}")
 
+# ==========================================
+# 4. PANEL DE DEPURACIÓN (OPT-IN)
+# ==========================================
+if perfilador is not None:
+    st.session_state["informe_perfil"] = perfilador.detener()
+    st.session_state.pop("perfilador_activo", None)
 
-
-
-
+with st.sidebar:
+    st.divider()
+    st.checkbox("🛠️ Modo depuración", key="modo_debug")
+    if traza is not None:
+        with st.expander("⏱️ Tiempos de este rerun", expanded=True):
+            st.caption(f"Total: {traza.duracion_ms():.0f} ms")
+            filas_traza = traza.filas()
+            if filas_traza:
+                st.dataframe(pd.DataFrame(filas_traza), hide_index=True)
+            col_json, col_prom = st.columns(2)
+            col_json.download_button("JSON lines", traza.a_json_lines(), "traza.jsonl", "application/x-ndjson")
+            col_prom.download_button("Prometheus", perfil.REGISTRO.a_prometheus(), "metricas.prom", "text/plain")
+            modo_siguiente = st.selectbox("Perfilar el próximo rerun con:", Perfilador.MODOS)
+            if st.button("▶️ Perfilar"):
+                st.session_state["perfilar_siguiente"] = modo_siguiente
+                st.rerun()
+            if "informe_perfil" in st.session_state:
+                st.code(st.session_state["informe_perfil"], language=None)
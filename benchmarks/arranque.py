@@ -0,0 +1,242 @@
+"""
+Benchmark de arranque en frío: costo de importación y tiempo al primer render.
+
+Uso:
+    python benchmarks/arranque.py                 # mide y compara con linea_base_arranque.json
+    python benchmarks/arranque.py --guardar       # mide y reescribe la línea base
+    python benchmarks/arranque.py --casos importar_modulos paint_frio --repeticiones 3
+
+Cada repetición corre en un intérprete nuevo (nada importado, nada en caché
+de módulos) y se reporta la mediana:
+
+    importar_modulos       los módulos propios que importa app.py; además
+                           falla si alguno trae una de ``PESADAS`` (esas se
+                           cargan recién al guardar o al renderizar)
+    importar_streamlit     streamlit, que la app paga siempre (referencia)
+    importar_grafico       grafico.py (matplotlib): lo que paga el primer render
+    paint_frio             desde que arranca el intérprete hasta terminar la
+                           primera ejecución de app.py (``AppTest``), con el
+                           caché en disco vacío
+    paint_tibio            lo mismo con el caché en disco de una corrida anterior
+    primer_grafico         tras el primer paint, "Generar Gráfico" en modo
+                           imagen sin precalentado (importa matplotlib y carga
+                           fuentes en ese momento)
+    primer_grafico_precalentado
+                           lo mismo, esperando antes a que el hilo de
+                           precalentado termine (``grafico.precalentar_fuentes``)
+
+La descarga del libro se reemplaza por ``--libro`` o, por defecto, por un
+``libro_sintetico`` de ``--hojas`` x ``--hitos`` con fechas alrededor de hoy
+(ver sintetico.py), así que no se mide la red. Un caso es regresión si supera su valor
+base en más del umbral y además por más de ``--piso-ms``; con alguna
+regresión, o con un módulo pesado importado al arrancar, el proceso termina
+con código 1.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+INICIO = time.perf_counter()        # referencia de "desde que arranca el intérprete"
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base_arranque.json")
+UMBRAL_DEFECTO = 0.25
+# Módulos propios que app.py importa al cargar (en su orden)
+MODULOS_APP = ("perfil", "descarga", "refresco", "hojas", "cache", "disposicion", "vistas", "indice", "detalle",
+               "edicion", "historico", "interactivo", "cola_guardado", "clientes")
+# Dependencias que no deben cargarse antes del primer guardado o render
+PESADAS = ("matplotlib", "github", "openpyxl")
+CASOS = ("importar_modulos", "importar_streamlit", "importar_grafico", "paint_frio", "paint_tibio",
+         "primer_grafico", "primer_grafico_precalentado")
+
+
+# --- CASOS (en el intérprete hijo) ---
+def _importar(modulos):
+    t0 = time.perf_counter()
+    for modulo in modulos:
+        __import__(modulo)
+    return time.perf_counter() - t0
+
+
+def _app(libro, inicio, grafico=False, esperar_precalentado=False):
+    import refresco
+    from descarga import ResultadoDescarga
+    with open(libro, "rb") as f:
+        contenido = f.read()
+    sha = hashlib.sha256(contenido).hexdigest()
+    refresco.descargar_condicional = lambda *a, **k: ResultadoDescarga(contenido, sha, "red", time.time())
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=300)
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"app.py falló: {at.exception}")
+    paint = time.perf_counter() - inicio
+    if not grafico:
+        return paint
+    if esperar_precalentado:
+        limite = time.monotonic() + 120
+        # grafico puede estar a medio importar en el hilo de precalentado
+        while not getattr(getattr(sys.modules.get("grafico"), "_precalentado", None), "is_set", lambda: False)():
+            if time.monotonic() > limite:
+                raise RuntimeError("El precalentado no terminó.")
+            time.sleep(0.05)
+    boton = next(b for b in at.sidebar.button if b.label == "Generar Gráfico")
+    t0 = time.perf_counter()
+    boton.click().run()
+    if at.exception or not at.get("image"):
+        raise RuntimeError(f"No se generó el gráfico: {at.exception}")
+    return time.perf_counter() - t0
+
+
+def hijo(caso, libro, inicio):
+    sys.path.insert(0, RAIZ)
+    if caso == "importar_modulos":
+        import numpy, pandas  # noqa: F401,E401  (los paga cualquier arranque; se mide lo propio)
+        segundos = _importar(MODULOS_APP)
+    elif caso == "importar_streamlit":
+        segundos = _importar(("streamlit",))
+    elif caso == "importar_grafico":
+        import numpy, pandas  # noqa: F401,E401
+        segundos = _importar(("grafico",))
+    elif caso.startswith("paint"):
+        segundos = _app(libro, inicio)
+    else:
+        segundos = _app(libro, inicio, grafico=True, esperar_precalentado=caso == "primer_grafico_precalentado")
+    return {"segundos": segundos, "pesadas": [m for m in PESADAS if m in sys.modules]}
+
+
+# --- ORQUESTACIÓN ---
+def _correr_hijo(caso, libro, directorio, precalentar):
+    entorno = {**os.environ, "LINEA_TIEMPO_CACHE_DIR": directorio,
+               "LINEA_TIEMPO_PRECALENTAR_RENDER": "1" if precalentar else "0"}
+    proceso = subprocess.run([sys.executable, os.path.abspath(__file__), "--hijo", caso, "--libro", libro],
+                             env=entorno, cwd=RAIZ, capture_output=True, text=True)
+    if proceso.returncode:
+        raise RuntimeError(f"{caso}: {proceso.stderr.strip().splitlines()[-1:]}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def medir(caso, libro, repeticiones):
+    """Mediana de ``repeticiones`` intérpretes nuevos y las pesadas importadas en la última."""
+    tiempos, pesadas = [], []
+    tibio = tempfile.mkdtemp(prefix="arranque_")
+    try:
+        if caso == "paint_tibio":
+            _correr_hijo("paint_frio", libro, tibio, precalentar=True)      # llena el caché en disco
+        for _ in range(repeticiones):
+            directorio = tibio if caso == "paint_tibio" else tempfile.mkdtemp(prefix="arranque_")
+            try:
+                resultado = _correr_hijo(caso, libro, directorio, precalentar=caso != "primer_grafico")
+            finally:
+                if directorio != tibio:
+                    shutil.rmtree(directorio, ignore_errors=True)
+            tiempos.append(resultado["segundos"])
+            pesadas = resultado["pesadas"]
+    finally:
+        shutil.rmtree(tibio, ignore_errors=True)
+    return statistics.median(tiempos), pesadas
+
+
+def comparar(resultados, base, piso_s):
+    umbrales = base.get("umbrales", {})
+    regresiones = 0
+    print(f"\n{'caso':<28} {'base_ms':>10} {'actual_ms':>10} {'razón':>7}  estado")
+    for caso, actual in resultados.items():
+        umbral = umbrales.get(caso, base.get("umbral", UMBRAL_DEFECTO))
+        previo = base["resultados"].get(caso)
+        if previo is None:
+            print(f"{caso:<28} {'-':>10} {actual * 1000:>10.1f} {'-':>7}  sin base")
+            continue
+        razon = actual / previo if previo else math.inf
+        regresion = razon > 1 + umbral and actual - previo > piso_s
+        mejora = razon < 1 - umbral and previo - actual > piso_s
+        regresiones += regresion
+        estado = f"REGRESIÓN (> +{umbral:.0%})" if regresion else "mejora" if mejora else "ok"
+        print(f"{caso:<28} {previo * 1000:>10.1f} {actual * 1000:>10.1f} {razon:>6.2f}x  {estado}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--casos", nargs="+", choices=CASOS, default=list(CASOS))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--libro", help="xlsx a servir en lugar de la descarga (por defecto, uno sintético)")
+    parser.add_argument("--hojas", type=int, default=2)
+    parser.add_argument("--hitos", type=int, default=200)
+    parser.add_argument("--guardar", action="store_true", help="reescribe la línea base con esta corrida")
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--piso-ms", type=float, default=50.0)
+    parser.add_argument("--hijo", choices=CASOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        print(json.dumps(hijo(args.hijo, args.libro, INICIO)))
+        return 0
+
+    if args.libro:
+        libro, descripcion = os.path.abspath(args.libro), os.path.basename(args.libro)
+    else:
+        from sintetico import libro_sintetico
+        descripcion = f"sintético {args.hojas}x{args.hitos}"
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as f:
+            f.write(libro_sintetico(args.hojas, args.hitos, agrupamiento=0.3))
+        libro = f.name
+    resultados, cargadas = {}, 0
+    try:
+        for caso in args.casos:
+            segundos, pesadas = medir(caso, libro, args.repeticiones)
+            resultados[caso] = round(segundos, 6)
+            aviso = ""
+            if caso == "importar_modulos" and pesadas:
+                cargadas += 1
+                aviso = f"  ¡importa {', '.join(pesadas)}!"
+            elif pesadas:
+                aviso = f"  (cargadas: {', '.join(pesadas)})"
+            print(f"  {caso:<28} {segundos * 1000:>10.1f} ms{aviso}", flush=True)
+    finally:
+        if not args.libro:
+            os.remove(libro)
+
+    if args.guardar:
+        previa = {}
+        if os.path.exists(args.linea_base):
+            with open(args.linea_base, encoding="utf-8") as f:
+                previa = json.load(f)
+        base = {
+            "entorno": {"python": platform.python_version(), "plataforma": platform.platform(),
+                        "procesador": platform.machine(), "fecha": datetime.now().isoformat(timespec="seconds")},
+            "libro": descripcion,
+            "umbral": previa.get("umbral", UMBRAL_DEFECTO),
+            "umbrales": previa.get("umbrales", {}),
+            "resultados": {**previa.get("resultados", {}), **resultados},
+        }
+        with open(args.linea_base, "w", encoding="utf-8") as f:
+            json.dump(base, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nLínea base guardada en {args.linea_base}")
+        return 1 if cargadas else 0
+
+    if not os.path.exists(args.linea_base):
+        print(f"\nNo hay línea base en {args.linea_base}; córrelo con --guardar para crearla.")
+        return 1 if cargadas else 0
+    with open(args.linea_base, encoding="utf-8") as f:
+        base = json.load(f)
+    if base.get("libro") != descripcion:
+        print(f"\nAviso: la línea base se midió con {base.get('libro')}, esta corrida con {descripcion}.")
+    regresiones = comparar(resultados, base, args.piso_ms / 1000)
+    print(f"\n{regresiones} regresiones." + (" Hay dependencias pesadas en el arranque." if cargadas else ""))
+    return 1 if regresiones or cargadas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Compara el tiempo de dibujo de los backends 'clasico' y 'lotes' de grafico.py.
+
+Uso:
+    python benchmarks/bench_render.py [--hitos 100 300 600] [--repeticiones 3]
+
+Para cada tamaño se calcula una sola disposición y se mide, por backend, la
+creación de artistas + ``canvas.draw()`` y el ``savefig`` a PNG (150 dpi).
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disposicion import calcular_disposicion
+from grafico import renderizar_disposicion
+from sintetico import hoja_sintetica
+
+
+def medir(disp, backend, repeticiones):
+    dibujo, exportacion = [], []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fig = renderizar_disposicion(disp, True, 2, backend=backend)
+        fig.canvas.draw()
+        t1 = time.perf_counter()
+        fig.savefig(io.BytesIO(), format="png", dpi=150)
+        t2 = time.perf_counter()
+        artistas = len(fig.axes[0].get_children())
+        fig.clear()
+        dibujo.append(t1 - t0); exportacion.append(t2 - t1)
+    return statistics.median(dibujo), statistics.median(exportacion), artistas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hitos", type=int, nargs="+", default=[100, 300, 600])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'hitos':>6} {'modo':>9} {'backend':>8} {'artistas':>9} {'dibujo_s':>9} {'png_s':>7}")
+    for n in args.hitos:
+        for arbol in (False, True):
+            df = hoja_sintetica(n, arbol=arbol)
+            disp = calcular_disposicion(df, "Benchmark", datetime(2025, 1, 1), datetime(2026, 12, 31))
+            resultados = {}
+            for backend in ("clasico", "lotes"):
+                resultados[backend] = medir(disp, backend, args.repeticiones)
+                dib, png, artistas = resultados[backend]
+                print(f"{n:>6} {disp.modo:>9} {backend:>8} {artistas:>9} {dib:>9.3f} {png:>7.3f}")
+            base, lote = resultados["clasico"], resultados["lotes"]
+            print(f"{'':>6} {'':>9} {'mejora':>8} {'':>9} {base[0] / lote[0]:>8.1f}x {base[1] / lote[1]:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Doble en memoria de la API de datos de Git que usa ``ColaGuardado``.
+
+Guarda blobs, árboles y commits direccionados por hash y una sola rama. La
+actualización de la ref sólo avanza por fast-forward (422 si no), igual que
+``ref.edit(force=False)`` contra GitHub. ``latencia`` simula el viaje de red
+de cada llamada para que el benchmark de guardado refleje cuántas se hacen.
+"""
+import base64
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+
+from github import GithubException
+
+
+class RepoLocal:
+    default_branch = "main"
+
+    def __init__(self, ruta, contenido, latencia=0.0):
+        self.ruta = ruta
+        self.latencia = latencia
+        self.llamadas = 0
+        self._objetos = {}
+        self._lock = threading.Lock()
+        arbol = self._guardar(("tree", {ruta: self._guardar(contenido)}))
+        self.head = self._guardar(("commit", arbol, None, "inicial"))
+
+    def _guardar(self, objeto):
+        datos = objeto if isinstance(objeto, bytes) else repr(objeto).encode()
+        sha = hashlib.sha1(datos).hexdigest()
+        self._objetos[sha] = objeto
+        return sha
+
+    def _llamada(self):
+        self.llamadas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def contenido(self):
+        """El archivo en la punta de la rama."""
+        arbol = self._objetos[self._objetos[self.head][1]][1]
+        return self._objetos[arbol[self.ruta]]
+
+    # --- INTERFAZ DE github.Repository USADA POR ColaGuardado ---
+    def get_git_ref(self, nombre):
+        self._llamada()
+        repo = self
+
+        def edit(sha, force=False):
+            repo._llamada()
+            with repo._lock:
+                if not force and repo._objetos[sha][2] != repo.head:
+                    raise GithubException(422, {"message": "Update is not a fast forward"}, None)
+                repo.head = sha
+
+        return SimpleNamespace(object=SimpleNamespace(sha=self.head), edit=edit)
+
+    def get_git_commit(self, sha):
+        self._llamada()
+        return SimpleNamespace(sha=sha, tree=SimpleNamespace(sha=self._objetos[sha][1]))
+
+    def get_git_tree(self, sha, recursive=False):
+        self._llamada()
+        return SimpleNamespace(tree=[SimpleNamespace(path=p, sha=s) for p, s in self._objetos[sha][1].items()])
+
+    def get_git_blob(self, sha):
+        self._llamada()
+        return SimpleNamespace(content=base64.b64encode(self._objetos[sha]).decode("ascii"))
+
+    def create_git_blob(self, contenido, codificacion):
+        self._llamada()
+        return SimpleNamespace(sha=self._guardar(base64.b64decode(contenido)))
+
+    def create_git_tree(self, elementos, base_tree):
+        self._llamada()
+        arbol = dict(self._objetos[base_tree.sha][1])
+        for elemento in elementos:
+            arbol[elemento._identity["path"]] = elemento._identity["sha"]
+        return SimpleNamespace(sha=self._guardar(("tree", arbol)))
+
+    def create_git_commit(self, mensaje, arbol, padres):
+        self._llamada()
+        return SimpleNamespace(sha=self._guardar(("commit", arbol.sha, padres[0].sha, mensaje)))
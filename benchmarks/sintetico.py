@@ -0,0 +1,111 @@
+"""
+Datos sintéticos para los benchmarks.
+
+- ``hoja_sintetica``: DataFrame ya normalizado, listo para ``calcular_disposicion``.
+- ``libro_sintetico``: un .xlsx completo con la misma estructura que
+  ``db_decreto10.xlsx`` (columnas, formatos de fecha y fórmulas con su valor
+  en caché), para medir desde la lectura hasta el guardado.
+
+Parámetros del libro:
+
+    hojas              número de hojas visibles
+    hitos              filas por hoja
+    agrupamiento       fracción de hitos que repiten la fecha del anterior;
+                       con cualquier valor > 0 ``requiere_formato_arbol`` es
+                       verdadero y la hoja se dibuja en modo árbol
+    agentes            agentes distintos (colores) por hoja
+    densidad_formulas  fracción de filas cuyas fechas teórica/proyectada son
+                       fórmulas encadenadas a la fila anterior (el resto son
+                       fechas literales); Fecha_Vigente y Dias_Restantes son
+                       siempre fórmulas, como en el libro real
+"""
+import io
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+AGENTES = ["CNE", "Coordinador", "Participantes", "Consultor", "Ministerio", "SEC", "Panel de Expertos",
+           "Empresas", "Transmisoras", "Generadoras", "Distribuidoras", "Clientes Libres"]
+
+COLUMNAS = ["ID", "Norma", "Periodo", "Proceso", "Hito / Etapa", "Responsable", "Agente", "Plazo", "Tipo_Dia",
+            "ID_Gatillador", "Fecha_teórica", "Fecha_Proyectada", "Fecha_Real_Manual", "Fecha_Vigente",
+            "Dias_Restantes", "Descripción"]
+
+INICIO = pd.Timestamp("2025-01-01")
+EPOCA_EXCEL = datetime(1899, 12, 30)
+
+
+def _agentes(n):
+    return AGENTES[:n] if n <= len(AGENTES) else AGENTES + [f"Agente {i}" for i in range(len(AGENTES), n)]
+
+
+def hoja_sintetica(n, semilla=0, arbol=False):
+    rng = np.random.default_rng(semilla)
+    dias = rng.integers(0, 700, n) if arbol else rng.permutation(700)[:n] if n <= 700 else rng.integers(0, 700, n)
+    vigente = INICIO + pd.to_timedelta(dias, "D")
+    teorica = (vigente + pd.to_timedelta(rng.integers(-90, 90, n), "D")).where(rng.random(n) > 0.3)
+    return pd.DataFrame({
+        "Fecha_Vigente": vigente, "Fecha_teorica": teorica,
+        "Agente": rng.choice(_agentes(5), n),
+        "Hito / Etapa": [f"Hito sintético número {i} del proceso" for i in range(n)],
+    })
+
+
+def _serial(fecha):
+    # El valor en caché de una fórmula se guarda como número de serie de Excel
+    return (fecha - EPOCA_EXCEL).days
+
+
+def _plazos(n, agrupamiento, rng):
+    # Días entre un hito y el siguiente: 0 repite la fecha (fuerza el modo árbol)
+    plazos = rng.integers(1, 15, n)
+    plazos[rng.random(n) < agrupamiento] = 0
+    plazos[0] = 0
+    return plazos
+
+
+def libro_sintetico(hojas=2, hitos=100, agrupamiento=0.0, agentes=5, densidad_formulas=0.5, semilla=0):
+    """Devuelve los bytes de un .xlsx sintético; ver el docstring del módulo."""
+    salida = io.BytesIO()
+    libro = xlsxwriter.Workbook(salida, {"in_memory": True})
+    fmt_fecha = libro.add_format({"num_format": "d-mmm-yy"})
+    fmt_cabecera = libro.add_format({"bold": True})
+    hoy = datetime.now()
+    nombres_agentes = _agentes(agentes)
+
+    for h in range(hojas):
+        rng = np.random.default_rng(semilla + h)
+        hoja = libro.add_worksheet(f"Proceso_Sintetico_{h + 1}")
+        hoja.write_row(0, 0, COLUMNAS, fmt_cabecera)
+        plazos = _plazos(hitos, agrupamiento, rng)
+        proyectada = INICIO + pd.to_timedelta(np.cumsum(plazos), "D")
+        # Hitos ya cumplidos: la fecha manual coincide con la proyectada, así
+        # el agrupamiento queda controlado sólo por ``agrupamiento``
+        con_manual = rng.random(hitos) < 0.4
+        con_formula = rng.random(hitos) < densidad_formulas
+        agentes_fila = rng.choice(nombres_agentes, hitos)
+
+        for i in range(hitos):
+            f = i + 1                      # fila 0-based de xlsxwriter
+            r = f + 1                      # fila de Excel (para las fórmulas)
+            fecha = proyectada[i].to_pydatetime()
+            manual = fecha if con_manual[i] else None
+            vigente = manual or fecha
+            hoja.write_row(f, 0, [i, "Norma Sintética", 2025, f"Proceso {h + 1}",
+                                  f"Hito sintético {i} de la hoja {h + 1}", "equipo@ejemplo.cl",
+                                  agentes_fila[i], int(plazos[i]), "Corridos" if i else "Inicio"])
+            if i and con_formula[i]:
+                hoja.write_formula(f, 10, f'=IF(I{r}="Corridos",H{r}+K{r - 1},K{r - 1})', fmt_fecha, _serial(fecha))
+                hoja.write_formula(f, 11, f'=IF(I{r}="Corridos",H{r}+N{r - 1},N{r - 1})', fmt_fecha, _serial(fecha))
+            else:
+                hoja.write_datetime(f, 10, fecha, fmt_fecha)
+                hoja.write_datetime(f, 11, fecha, fmt_fecha)
+            if manual:
+                hoja.write_datetime(f, 12, manual, fmt_fecha)
+            hoja.write_formula(f, 13, f"=IF(ISBLANK(M{r}),L{r},M{r})", fmt_fecha, _serial(vigente))
+            hoja.write_formula(f, 14, f"=N{r}-TODAY()", None, (vigente - hoy).days)
+            hoja.write_string(f, 15, f"Descripción del hito {i}, con texto suficiente para parecerse al real.")
+    libro.close()
+    return salida.getvalue()
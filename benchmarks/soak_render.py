@@ -0,0 +1,114 @@
+"""
+Prueba de resistencia del render: cientos de líneas de tiempo seguidas a
+través de ``PoolRender`` con varios hilos cliente, midiendo la memoria
+residente (RSS) del proceso.
+
+Uso:
+    python benchmarks/soak_render.py [--renders 300] [--hilos 3] [--clientes 6]
+                                     [--hitos 80] [--tolerancia-mb 40]
+
+Las primeras ``--calentamiento`` imágenes cargan fuentes y cachés de
+matplotlib; a partir de ahí el RSS debe mantenerse plano. Termina con código
+1 si crece más de ``--tolerancia-mb`` entre el fin del calentamiento y el
+final, o si algún render falla.
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disposicion import calcular_disposicion
+from grafico import PoolRender
+from sintetico import hoja_sintetica
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Sin /proc sólo queda el máximo histórico (KB en Linux, bytes en macOS)
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo / 2**20 if sys.platform == "darwin" else maximo / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=300)
+    parser.add_argument("--hilos", type=int, default=3, help="hilos del pool de render")
+    parser.add_argument("--clientes", type=int, default=6, help="hilos que piden renders a la vez")
+    parser.add_argument("--hitos", type=int, default=80)
+    parser.add_argument("--calentamiento", type=int, default=40)
+    parser.add_argument("--tolerancia-mb", type=float, default=40.0)
+    args = parser.parse_args()
+
+    disposiciones = [
+        calcular_disposicion(hoja_sintetica(args.hitos, semilla=i, arbol=i % 2 == 1), f"Soak {i}",
+                             datetime(2025, 1, 1), datetime(2026, 12, 31))
+        for i in range(8)
+    ]
+    pool = PoolRender(hilos=args.hilos, max_pendientes=args.clientes)
+    siguiente = iter(range(args.renders))
+    lock = threading.Lock()
+    muestras, fallos = [], []
+    rss_base = None
+
+    def cliente():
+        nonlocal rss_base
+        while True:
+            with lock:
+                i = next(siguiente, None)
+            if i is None:
+                return
+            disp = disposiciones[i % len(disposiciones)]
+            formato = ("png", "svg", "pdf")[i % 3]
+            try:
+                pool.exportar(disp, i % 2 == 0, 2, formato=formato, dpi=100)
+            except Exception as e:
+                fallos.append(repr(e))
+            hechos = i + 1
+            if hechos == args.calentamiento or hechos % 50 == 0 or hechos == args.renders:
+                gc.collect()
+                with lock:
+                    rss = rss_mb()
+                    if hechos == args.calentamiento:
+                        rss_base = rss
+                    muestras.append((hechos, rss))
+
+    t0 = time.perf_counter()
+    clientes = [threading.Thread(target=cliente) for _ in range(args.clientes)]
+    for t in clientes: t.start()
+    for t in clientes: t.join()
+    duracion = time.perf_counter() - t0
+    pool.cerrar()
+    gc.collect()
+    rss_final = rss_mb()
+
+    print(f"{'renders':>8} {'rss_mb':>8}")
+    for hechos, rss in sorted(muestras):
+        print(f"{hechos:>8} {rss:>8.1f}")
+    print(f"\n{args.renders} renders en {duracion:.1f}s ({args.renders / duracion:.1f}/s), "
+          f"pool: {pool.estadisticas()}")
+    if rss_base is None:
+        print("Sin muestra de calentamiento: aumenta --renders.")
+        return 1
+    crecimiento = rss_final - rss_base
+    print(f"RSS tras calentamiento {rss_base:.1f} MB, final {rss_final:.1f} MB, crecimiento {crecimiento:+.1f} MB")
+    if fallos:
+        print(f"{len(fallos)} renders fallaron, p. ej. {fallos[0]}")
+        return 1
+    if crecimiento > args.tolerancia_mb:
+        print(f"FALLO: el RSS creció más de {args.tolerancia_mb} MB")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Suite de benchmarks con línea base y umbrales de regresión.
+
+Uso:
+    python benchmarks/suite.py                    # mide y compara con linea_base.json
+    python benchmarks/suite.py --guardar          # mide y reescribe la línea base
+    python benchmarks/suite.py --escalado         # informe de 10 a 10.000 hitos
+    python benchmarks/suite.py --casos render png --hitos 100 1000
+
+Cada caso se mide sobre un libro de ``libro_sintetico`` (ver sintetico.py;
+``--hojas``, ``--agentes``, ``--agrupamiento`` y ``--densidad-formulas``
+controlan su forma) y reporta la mediana de ``--repeticiones`` corridas:
+
+    carga                 pd.read_excel de todas las hojas
+    carga_proyectada      lector.leer_hojas con hojas.COLUMNAS_LEIDAS (motor por
+                          defecto; ``--motor`` elige otro)
+    normalizar_columnas   sobre la hoja recién leída
+    preparar_hoja         normalización + tipado + columnas derivadas
+    indice                IndiceHitos (búsqueda y facetas) de la hoja preparada
+    disposicion_estandar  calcular_disposicion sin fechas repetidas
+    disposicion_arbol     calcular_disposicion con fechas agrupadas
+    render                artistas + canvas.draw()
+    png                   exportar_disposicion a PNG (100 dpi)
+    carga_interactiva     interactivo.serializar: la disposición como JSON para
+                          el modo interactivo (la alternativa al PNG en pantalla)
+    editor                SesionEdicion: una página de 100 filas, una edición
+                          leída del editor y la página recalculada
+    guardar               cambios_columna + ColaGuardado contra RepoLocal, el
+                          mismo camino que usa guardar_en_github_manteniendo_formulas
+
+Un caso es regresión si supera su valor base en más del umbral (25 % por
+defecto; ``umbrales`` en el JSON lo ajusta por caso) y además por más de
+``--piso-ms``, para no saltar por ruido en los tiempos muy chicos. Con alguna
+regresión el proceso termina con código 1.
+
+``--memoria`` corre además cada caso una vez bajo ``tracemalloc`` y muestra
+el pico de memoria asignada desde Python (lo que asigna código nativo, p. ej.
+calamine, no se cuenta).
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from cola_guardado import ColaGuardado
+from disposicion import calcular_disposicion
+from edicion import SesionEdicion
+from grafico import exportar_disposicion, renderizar_disposicion
+from hojas import COLUMNAS_LEIDAS, normalizar_columnas, preparar_hoja
+from indice import IndiceHitos
+from interactivo import serializar
+from lector import MOTOR_RAPIDO, MOTORES, leer_hojas, nombres_hojas
+from parche_xlsx import cambios_columna
+from repo_local import RepoLocal
+from sintetico import libro_sintetico
+
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base.json")
+RUTA_LIBRO = "db_decreto10.xlsx"
+UMBRAL_DEFECTO = 0.25
+TAMANOS_BASE = [10, 100, 1000]
+TAMANOS_ESCALADO = [10, 100, 1000, 10000]
+
+# Con 10.000 hitos el eje abarca décadas y el localizador avisa en cada dibujo
+logging.getLogger("matplotlib.ticker").setLevel(logging.ERROR)
+
+
+class Escenario:
+    """Libro sintético de ``n`` hitos y todo lo que los casos necesitan precalculado."""
+
+    def __init__(self, n, hojas, agentes, agrupamiento, densidad_formulas):
+        self.n = n
+        self.libro = libro_sintetico(hojas, n, 0.0, agentes, densidad_formulas)
+        self.libro_arbol = libro_sintetico(1, n, max(agrupamiento, 0.01), agentes, densidad_formulas)
+        self.nombres = nombres_hojas(self.libro)
+        self.motor = MOTOR_RAPIDO
+        crudas = pd.read_excel(io.BytesIO(self.libro), sheet_name=None)
+        self.hoja, self.cruda = next(iter(crudas.items()))
+        self.df = preparar_hoja(self.cruda.copy())
+        self.df_arbol = preparar_hoja(next(iter(pd.read_excel(io.BytesIO(self.libro_arbol), sheet_name=None).values())))
+        self.f_inicio, self.f_fin = self.df["Fecha_Vigente"].min(), self.df["Fecha_Vigente"].max()
+        self.disp = self.disposicion(self.df)
+        self.repo = RepoLocal(RUTA_LIBRO, self.libro)
+        self.cola = ColaGuardado(lambda: self.repo, RUTA_LIBRO, ventana=0)
+        self._guardados = 0
+
+    def disposicion(self, df):
+        return calcular_disposicion(df, "Benchmark", df["Fecha_Vigente"].min(), df["Fecha_Vigente"].max())
+
+    def editor(self):
+        sesion = SesionEdicion(self.df, self.hoja, "benchmark")
+        visibles = sesion.posiciones()[:100]
+        vista = sesion.pagina(visibles)
+        editada = vista.copy()
+        editada.iloc[0, editada.columns.get_loc("Fecha_Real_Manual")] = self.f_fin + pd.Timedelta(days=1)
+        assert sesion.leer_editor(vista, editada) == 1, "la edición no se registró"
+        sesion.pagina(visibles)
+
+    def guardar(self):
+        # Cada corrida escribe fechas distintas para que siempre haya commit
+        self._guardados += 1
+        editado = self.df.copy()
+        filas = editado.index[:min(self.n, 20)]
+        editado.loc[filas, "Fecha_Real_Manual"] = self.f_inicio + pd.Timedelta(days=self._guardados)
+        cambios = cambios_columna(self.df, editado, "Fecha_Real_Manual")
+        resultado = self.cola.encolar(self.hoja, cambios).result(timeout=300)
+        assert resultado.commit, "el guardado no generó commit"
+
+
+def _render(disp):
+    fig = renderizar_disposicion(disp, True, 2)
+    fig.canvas.draw()
+    fig.clear()
+
+
+CASOS = {
+    "carga": lambda e: pd.read_excel(io.BytesIO(e.libro), sheet_name=None),
+    "carga_proyectada": lambda e: leer_hojas(e.libro, e.nombres, COLUMNAS_LEIDAS, e.motor),
+    "normalizar_columnas": lambda e: normalizar_columnas(e.cruda.copy()),
+    "preparar_hoja": lambda e: preparar_hoja(e.cruda.copy()),
+    "indice": lambda e: IndiceHitos({e.hoja: e.df}),
+    "disposicion_estandar": lambda e: e.disposicion(e.df),
+    "disposicion_arbol": lambda e: e.disposicion(e.df_arbol),
+    "render": lambda e: _render(e.disp),
+    "png": lambda e: exportar_disposicion(e.disp, True, 2, "png", 100),
+    "carga_interactiva": lambda e: serializar(e.disp),
+    "editor": lambda e: e.editor(),
+    "guardar": lambda e: e.guardar(),
+}
+
+
+def medir(funcion, repeticiones, presupuesto_s=20.0):
+    """Mediana de ``repeticiones`` corridas; corta antes si se pasa del presupuesto."""
+    tiempos = []
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+        if time.perf_counter() - inicio > presupuesto_s:
+            break
+    return statistics.median(tiempos)
+
+
+def pico_memoria(funcion):
+    """Pico de memoria asignada (bytes) durante una corrida."""
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def correr(casos, tamanos, repeticiones, forma, motor=None, memoria=False):
+    resultados = {caso: {} for caso in casos}
+    for n in tamanos:
+        escenario = Escenario(n, **forma)
+        escenario.motor = motor or escenario.motor
+        for caso in casos:
+            segundos = medir(lambda: CASOS[caso](escenario), repeticiones)
+            resultados[caso][str(n)] = round(segundos, 6)
+            pico = f"  pico {pico_memoria(lambda: CASOS[caso](escenario)) / 2**20:>8.1f} MiB" if memoria else ""
+            print(f"  {caso:<22} {n:>6} hitos  {segundos * 1000:>10.1f} ms{pico}", flush=True)
+    return resultados
+
+
+def comparar(resultados, base, piso_s):
+    umbrales = base.get("umbrales", {})
+    regresiones = 0
+    print(f"\n{'caso':<22} {'hitos':>6} {'base_ms':>10} {'actual_ms':>10} {'razón':>7}  estado")
+    for caso, por_tamano in resultados.items():
+        umbral = umbrales.get(caso, base.get("umbral", UMBRAL_DEFECTO))
+        for n, actual in por_tamano.items():
+            previo = base["resultados"].get(caso, {}).get(n)
+            if previo is None:
+                print(f"{caso:<22} {n:>6} {'-':>10} {actual * 1000:>10.1f} {'-':>7}  sin base")
+                continue
+            razon = actual / previo if previo else math.inf
+            regresion = razon > 1 + umbral and actual - previo > piso_s
+            mejora = razon < 1 - umbral and previo - actual > piso_s
+            regresiones += regresion
+            estado = f"REGRESIÓN (> +{umbral:.0%})" if regresion else "mejora" if mejora else "ok"
+            print(f"{caso:<22} {n:>6} {previo * 1000:>10.1f} {actual * 1000:>10.1f} {razon:>6.2f}x  {estado}")
+    return regresiones
+
+
+def informe_escalado(resultados):
+    """Tiempo por tamaño y exponente empírico entre tamaños consecutivos (1 = lineal)."""
+    tamanos = sorted({int(n) for por_tamano in resultados.values() for n in por_tamano})
+    print(f"\n{'caso':<22}" + "".join(f"{n:>12}" for n in tamanos) + "   exponentes")
+    for caso, por_tamano in resultados.items():
+        tiempos = [por_tamano.get(str(n)) for n in tamanos]
+        exponentes = [
+            f"{math.log(t2 / t1) / math.log(n2 / n1):.2f}"
+            for (n1, t1), (n2, t2) in zip(zip(tamanos, tiempos), zip(tamanos[1:], tiempos[1:]))
+            if t1 and t2
+        ]
+        celdas = "".join(f"{t * 1000:>10.1f}ms" if t is not None else f"{'-':>12}" for t in tiempos)
+        print(f"{caso:<22}{celdas}   {' '.join(exponentes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), default=list(CASOS))
+    parser.add_argument("--hitos", type=int, nargs="+")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--hojas", type=int, default=2)
+    parser.add_argument("--agentes", type=int, default=5)
+    parser.add_argument("--agrupamiento", type=float, default=0.3,
+                        help="fracción de fechas repetidas en el libro del caso disposicion_arbol")
+    parser.add_argument("--densidad-formulas", type=float, default=0.5)
+    parser.add_argument("--motor", choices=MOTORES, help="motor de carga_proyectada (por defecto el más rápido instalado)")
+    parser.add_argument("--memoria", action="store_true", help="muestra también el pico de memoria de cada caso")
+    parser.add_argument("--escalado", action="store_true", help="informe de escalado de 10 a 10.000 hitos")
+    parser.add_argument("--guardar", action="store_true", help="reescribe la línea base con esta corrida")
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--piso-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    tamanos = args.hitos or (TAMANOS_ESCALADO if args.escalado else TAMANOS_BASE)
+    forma = dict(hojas=args.hojas, agentes=args.agentes, agrupamiento=args.agrupamiento,
+                 densidad_formulas=args.densidad_formulas)
+    resultados = correr(args.casos, tamanos, args.repeticiones, forma, args.motor, args.memoria)
+
+    if args.escalado:
+        informe_escalado(resultados)
+
+    if args.guardar:
+        previa = {}
+        if os.path.exists(args.linea_base):
+            with open(args.linea_base, encoding="utf-8") as f:
+                previa = json.load(f)
+        base = {
+            "entorno": {"python": platform.python_version(), "plataforma": platform.platform(),
+                        "procesador": platform.machine(), "fecha": datetime.now().isoformat(timespec="seconds")},
+            "forma": forma,
+            "umbral": previa.get("umbral", UMBRAL_DEFECTO),
+            "umbrales": previa.get("umbrales", {}),
+            "resultados": {**previa.get("resultados", {}),
+                           **{caso: {**previa.get("resultados", {}).get(caso, {}), **por_tamano}
+                              for caso, por_tamano in resultados.items()}},
+        }
+        with open(args.linea_base, "w", encoding="utf-8") as f:
+            json.dump(base, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nLínea base guardada en {args.linea_base}")
+        return 0
+
+    if not os.path.exists(args.linea_base):
+        print(f"\nNo hay línea base en {args.linea_base}; córrelo con --guardar para crearla.")
+        return 0
+    with open(args.linea_base, encoding="utf-8") as f:
+        base = json.load(f)
+    if base.get("forma") != forma:
+        print(f"\nAviso: la línea base se midió con {base.get('forma')}, esta corrida con {forma}.")
+    regresiones = comparar(resultados, base, args.piso_ms / 1000)
+    print(f"\n{regresiones} regresiones.")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Caché LRU en memoria, segura entre hilos, con límite por entradas y/o bytes.
+
+``obtener_o_calcular`` deduplica cálculos concurrentes de una misma clave:
+las sesiones que llegan mientras otra está calculando esperan ese resultado
+en vez de repetirlo.
+"""
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+
+    def __init__(self, max_entradas=32, max_bytes=None, medir=None):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.medir = medir or (lambda valor: 0)
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._datos = OrderedDict()     # clave -> (valor, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._calculando = {}           # clave -> threading.Lock
+
+    def __contains__(self, clave):
+        with self._lock:
+            return clave in self._datos
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datos)
+
+    def obtener(self, clave, defecto=None):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave][0]
+            self.fallos += 1
+            return defecto
+
+    def guardar(self, clave, valor):
+        tamano = self.medir(valor)
+        with self._lock:
+            if clave in self._datos:
+                self._bytes -= self._datos.pop(clave)[1]
+            self._datos[clave] = (valor, tamano)
+            self._bytes += tamano
+            while len(self._datos) > 1 and (
+                len(self._datos) > self.max_entradas
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, liberados) = self._datos.popitem(last=False)
+                self._bytes -= liberados
+                self.desalojos += 1
+        return valor
+
+    def obtener_o_calcular(self, clave, calcular):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave][0]
+            candado = self._calculando.setdefault(clave, threading.Lock())
+        with candado:
+            with self._lock:
+                if clave in self._datos:
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return self._datos[clave][0]
+                self.fallos += 1
+            try:
+                return self.guardar(clave, calcular())
+            finally:
+                with self._lock:
+                    self._calculando.pop(clave, None)
+
+    def descartar(self, predicado=None):
+        """Elimina las entradas cuya clave cumple ``predicado`` (todas si es None)."""
+        with self._lock:
+            for clave in [c for c in self._datos if predicado is None or predicado(c)]:
+                self._bytes -= self._datos.pop(clave)[1]
+
+    def estadisticas(self):
+        with self._lock:
+            return {"entradas": len(self._datos), "bytes": self._bytes, "aciertos": self.aciertos,
+                    "fallos": self.fallos, "desalojos": self.desalojos}
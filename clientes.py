@@ -0,0 +1,114 @@
+"""
+Clientes de red compartidos por todo el proceso.
+
+- ``crear_sesion``: ``requests.Session`` con pool de conexiones keep-alive y
+  reintentos con backoff exponencial para errores transitorios.
+- ``ClienteGitHub``: un único cliente PyGithub (con su propio pool) y el
+  handle del repositorio resuelto una sola vez, en el primer guardado (recién
+  ahí se importa PyGithub).
+- ``DespachadorWebhook``: envía las notificaciones en un hilo aparte; quien
+  guarda no espera la respuesta del webhook.
+"""
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+
+def crear_sesion(reintentos=3, backoff=0.5, conexiones=10):
+    reintento = Retry(total=reintentos, backoff_factor=backoff, status_forcelist=ESTADOS_REINTENTABLES,
+                      allowed_methods=frozenset({"HEAD", "GET", "POST"}), raise_on_status=False)
+    adaptador = HTTPAdapter(max_retries=reintento, pool_connections=conexiones, pool_maxsize=conexiones)
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return sesion
+
+
+class ClienteGitHub:
+
+    def __init__(self, token, nombre_repo, timeout=15, conexiones=4):
+        self.nombre_repo = nombre_repo
+        self._token, self._timeout, self._conexiones = token, timeout, conexiones
+        self.github = None
+        self._repo = None
+        self._lock = threading.Lock()
+
+    def repo(self):
+        with self._lock:
+            if self._repo is None:
+                from github import Auth, Github
+                # Un commit por la API de datos son 4 escrituras (blob, tree, commit, ref):
+                # con la pausa por defecto de PyGithub (1 s entre escrituras) el guardado
+                # se iría a varios segundos sin motivo.
+                self.github = Github(auth=Auth.Token(self._token), timeout=self._timeout,
+                                     pool_size=self._conexiones, seconds_between_writes=0.25)
+                self._repo = self.github.get_repo(self.nombre_repo, lazy=True)
+            return self._repo
+
+
+@dataclass
+class MetricasWebhook:
+    encolados: int = 0
+    enviados: int = 0
+    fallidos: int = 0
+    descartados: int = 0
+    ultima_latencia: float = 0.0
+    ultimo_error: str = ""
+
+
+class DespachadorWebhook:
+
+    def __init__(self, url, sesion=None, timeout=5, max_cola=100):
+        self.url = url
+        self.sesion = sesion or crear_sesion()
+        self.timeout = timeout
+        self.metricas = MetricasWebhook()
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._lock = threading.Lock()
+        threading.Thread(target=self._trabajar, name="webhook", daemon=True).start()
+
+    def enviar(self, carga):
+        """Encola ``carga`` (JSON) y vuelve de inmediato; si la cola está llena se descarta."""
+        try:
+            self._cola.put_nowait(carga)
+            with self._lock: self.metricas.encolados += 1
+            return True
+        except queue.Full:
+            with self._lock: self.metricas.descartados += 1
+            return False
+
+    def _trabajar(self):
+        while True:
+            carga = self._cola.get()
+            inicio = time.perf_counter()
+            try:
+                respuesta = self.sesion.post(self.url, json=carga, timeout=self.timeout)
+                respuesta.raise_for_status()
+                with self._lock:
+                    self.metricas.enviados += 1
+                    self.metricas.ultima_latencia = time.perf_counter() - inicio
+            except Exception as e:
+                with self._lock:
+                    self.metricas.fallidos += 1
+                    self.metricas.ultimo_error = str(e)
+            finally:
+                self._cola.task_done()
+
+    def estado(self):
+        with self._lock:
+            return {
+                "en_cola": self._cola.qsize(),
+                "encolados": self.metricas.encolados,
+                "enviados": self.metricas.enviados,
+                "fallidos": self.metricas.fallidos,
+                "descartados": self.metricas.descartados,
+                "ultima_latencia_s": round(self.metricas.ultima_latencia, 3),
+                "ultimo_error": self.metricas.ultimo_error,
+            }
@@ -0,0 +1,192 @@
+"""
+Cola de guardado: agrupa ediciones y las publica en un único commit.
+
+Cada "Guardar" encola ``(hoja, cambios)`` y recibe un ``Future``. Un hilo de
+fondo espera ``ventana`` segundos para juntar las ediciones que lleguen (de
+cualquier hoja o sesión), las aplica sobre la última versión del libro en la
+rama y publica un solo commit con la API de datos de Git (blob → tree →
+commit → ref). Si la rama avanzó entretanto, la actualización de la ref no es
+fast-forward: se relee el libro, se vuelven a aplicar los cambios y se
+reintenta.
+
+El repositorio se obtiene con ``obtener_repo()``; cualquier objeto con la
+misma interfaz que ``github.Repository`` sirve (``default_branch``,
+``get_git_ref``, ``get_git_commit``, ``get_git_tree``, ``get_git_blob``,
+``create_git_blob``, ``create_git_tree``, ``create_git_commit``), lo que
+permite probar la cola contra un doble local de la API. PyGithub se importa
+en el hilo de fondo, con el primer lote: crear la cola no lo carga.
+"""
+import base64
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from parche_xlsx import aplicar_cambios
+
+# 422: la ref no avanza por fast-forward; 409: la rama cambió durante la operación
+ESTADOS_CONFLICTO = (409, 422)
+
+
+@dataclass
+class ResultadoGuardado:
+    commit: str | None          # None si el libro ya tenía esos valores
+    celdas: int
+    intentos: int
+    ediciones_en_lote: int
+
+
+@dataclass
+class _Edicion:
+    hoja: str
+    cambios: dict
+    futuro: Future = field(default_factory=Future)
+
+
+@dataclass
+class MetricasCola:
+    encoladas: int = 0
+    lotes: int = 0
+    commits: int = 0
+    sin_cambios: int = 0
+    conflictos: int = 0
+    errores: int = 0
+    ultimo_error: str = ""
+
+
+class ColaGuardado:
+
+    def __init__(self, obtener_repo, ruta, ventana=2.0, max_intentos=4, al_confirmar=None):
+        self.obtener_repo = obtener_repo
+        self.ruta = ruta
+        self.ventana = ventana
+        self.max_intentos = max_intentos
+        self.al_confirmar = al_confirmar     # callback(sha_commit, contenido) tras cada commit
+        self.metricas = MetricasCola()
+        self._pendientes = []
+        self._cond = threading.Condition()
+        self._hilo = None
+
+    # --- API PÚBLICA ---
+    def encolar(self, hoja, cambios):
+        """Agrega ``{fila_excel: valor}`` de ``hoja`` al próximo lote; devuelve un ``Future``."""
+        edicion = _Edicion(hoja, dict(cambios))
+        with self._cond:
+            self._pendientes.append(edicion)
+            self.metricas.encoladas += 1
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._trabajar, name="cola-guardado", daemon=True)
+                self._hilo.start()
+            self._cond.notify()
+        return edicion.futuro
+
+    def estado(self):
+        with self._cond:
+            return {
+                "pendientes": len(self._pendientes),
+                "encoladas": self.metricas.encoladas,
+                "lotes": self.metricas.lotes,
+                "commits": self.metricas.commits,
+                "sin_cambios": self.metricas.sin_cambios,
+                "conflictos": self.metricas.conflictos,
+                "errores": self.metricas.errores,
+                "ultimo_error": self.metricas.ultimo_error,
+            }
+
+    # --- HILO DE FONDO ---
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                if not self._pendientes:
+                    self._cond.wait(30)
+                if not self._pendientes:
+                    self._hilo = None
+                    return
+            # Ventana de agrupación: lo que llegue mientras tanto va al mismo commit
+            time.sleep(self.ventana)
+            with self._cond:
+                lote, self._pendientes = self._pendientes, []
+                self.metricas.lotes += 1
+            # Un error fuera de los reintentos (p. ej. al importar PyGithub) falla
+            # este lote, pero el hilo sigue atendiendo los siguientes
+            try:
+                self._procesar(lote)
+            except Exception as e:
+                self._fallar(lote, e)
+
+    def _leer(self, repo, base):
+        arbol = repo.get_git_tree(base.tree.sha, recursive=True)
+        sha = next((el.sha for el in arbol.tree if el.path == self.ruta), None)
+        if sha is None:
+            raise FileNotFoundError(f"{self.ruta} no existe en la rama.")
+        return base64.b64decode(repo.get_git_blob(sha).content)
+
+    def _publicar(self, repo, ref, base, contenido, mensaje):
+        from github import InputGitTreeElement
+        blob = repo.create_git_blob(base64.b64encode(contenido).decode("ascii"), "base64")
+        arbol = repo.create_git_tree([InputGitTreeElement(self.ruta, "100644", "blob", sha=blob.sha)],
+                                     base_tree=base.tree)
+        commit = repo.create_git_commit(mensaje, arbol, [base])
+        ref.edit(commit.sha, force=False)
+        return commit.sha
+
+    def _procesar(self, lote):
+        from github import GithubException
+        # Por hoja, en orden de llegada: la última edición de una celda gana
+        por_hoja = {}
+        for edicion in lote:
+            cambios, ediciones = por_hoja.setdefault(edicion.hoja, ({}, []))
+            cambios.update(edicion.cambios)
+            ediciones.append(edicion)
+        celdas = sum(len(cambios) for cambios, _ in por_hoja.values())
+
+        for intento in range(1, self.max_intentos + 1):
+            try:
+                repo = self.obtener_repo()
+                ref = repo.get_git_ref(f"heads/{repo.default_branch}")
+                base = repo.get_git_commit(ref.object.sha)
+                original = self._leer(repo, base)
+                contenido, fallidas = original, {}
+                for hoja, (cambios, _) in por_hoja.items():
+                    try:
+                        contenido, _ = aplicar_cambios(contenido, hoja, cambios)
+                    except ValueError as e:
+                        fallidas[hoja] = e
+                commit = None
+                if contenido != original:
+                    mensaje = f"Update Web {datetime.now().strftime('%H:%M')} ({celdas} celdas, {len(lote)} ediciones)"
+                    commit = self._publicar(repo, ref, base, contenido, mensaje)
+                break
+            except GithubException as e:
+                if e.status in ESTADOS_CONFLICTO and intento < self.max_intentos:
+                    with self._cond:
+                        self.metricas.conflictos += 1
+                    time.sleep(0.5 * intento)
+                    continue
+                self._fallar(lote, e)
+                return
+            except Exception as e:
+                self._fallar(lote, e)
+                return
+
+        with self._cond:
+            if commit: self.metricas.commits += 1
+            else: self.metricas.sin_cambios += 1
+        for hoja, (cambios, ediciones) in por_hoja.items():
+            for edicion in ediciones:
+                if hoja in fallidas:
+                    edicion.futuro.set_exception(fallidas[hoja])
+                else:
+                    edicion.futuro.set_result(ResultadoGuardado(commit, len(edicion.cambios), intento, len(lote)))
+        if commit and self.al_confirmar:
+            try: self.al_confirmar(commit, contenido)
+            except Exception: pass
+
+    def _fallar(self, lote, error):
+        with self._cond:
+            self.metricas.errores += 1
+            self.metricas.ultimo_error = str(error)
+        for edicion in lote:
+            if not edicion.futuro.done():
+                edicion.futuro.set_exception(error)
@@ -0,0 +1,166 @@
+"""
+Descarga condicional del libro Excel con almacén en disco direccionado por contenido.
+
+La primera descarga guarda los bytes como ``objetos/<sha256>.xlsx`` junto a los
+validadores que entregó el servidor (ETag, Last-Modified, Content-Length).
+Las siguientes consultas envían una petición condicional: si el servidor
+responde 304 (o la sonda HEAD indica el mismo tamaño cuando no hay
+validadores) solo se paga el viaje de cabeceras y se reutiliza la copia local.
+Al reiniciar el proceso, una copia validada hace menos de ``edad_maxima``
+segundos se sirve directamente desde disco.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+
+DIRECTORIO_CACHE_DEFECTO = os.environ.get(
+    "LINEA_TIEMPO_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "linea_de_tiempo_cache"),
+)
+
+
+@dataclass
+class ResultadoDescarga:
+    contenido: bytes
+    sha: str
+    origen: str          # 'red' | 'no_modificado' | 'sonda' | 'disco'
+    validado_en: float
+
+
+class AlmacenContenido:
+    """Guarda versiones del libro en disco, indexadas por su hash SHA-256."""
+
+    def __init__(self, directorio=DIRECTORIO_CACHE_DEFECTO, max_objetos=5):
+        self.directorio = directorio
+        self.max_objetos = max_objetos
+        self._dir_objetos = os.path.join(directorio, "objetos")
+        self._ruta_meta = os.path.join(directorio, "metadatos.json")
+        self._lock = threading.Lock()
+        os.makedirs(self._dir_objetos, exist_ok=True)
+
+    # --- METADATOS POR URL ---
+    def _leer_meta(self):
+        try:
+            with open(self._ruta_meta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _escribir_atomico(self, ruta, datos):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(datos)
+            os.replace(tmp, ruta)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def metadatos(self, url):
+        with self._lock:
+            meta = self._leer_meta().get(url)
+        if meta and os.path.exists(self.ruta_objeto(meta["sha"])):
+            return meta
+        return None
+
+    def actualizar_metadatos(self, url, **campos):
+        with self._lock:
+            todo = self._leer_meta()
+            todo.setdefault(url, {}).update(campos)
+            self._escribir_atomico(self._ruta_meta, json.dumps(todo, indent=1).encode("utf-8"))
+            return dict(todo[url])
+
+    # --- OBJETOS POR HASH ---
+    def ruta_objeto(self, sha):
+        return os.path.join(self._dir_objetos, f"{sha}.xlsx")
+
+    def leer(self, sha):
+        with open(self.ruta_objeto(sha), "rb") as f:
+            return f.read()
+
+    def guardar(self, contenido):
+        sha = hashlib.sha256(contenido).hexdigest()
+        ruta = self.ruta_objeto(sha)
+        if os.path.exists(ruta):
+            os.utime(ruta)
+        else:
+            self._escribir_atomico(ruta, contenido)
+            self._podar()
+        return sha
+
+    def _podar(self):
+        """Conserva solo las ``max_objetos`` versiones usadas más recientemente."""
+        with self._lock:
+            en_uso = {m.get("sha") for m in self._leer_meta().values()}
+        objetos = [os.path.join(self._dir_objetos, n) for n in os.listdir(self._dir_objetos) if n.endswith(".xlsx")]
+        objetos.sort(key=os.path.getmtime, reverse=True)
+        for ruta in objetos[self.max_objetos:]:
+            if os.path.basename(ruta)[:-5] not in en_uso:
+                try: os.remove(ruta)
+                except OSError: pass
+
+
+def transformar_url_onedrive(url):
+    if "sharepoint.com" in url or "onedrive.live.com" in url:
+        if "guestaccess.aspx" in url:
+            return url.replace("guestaccess.aspx", "download.aspx")
+        if "download=1" not in url:
+            if "?" in url:
+                return url + "&download=1"
+            else:
+                return url + "?download=1"
+    return url
+
+
+def descargar_condicional(url, almacen, sesion=None, timeout=15, edad_maxima=0):
+    """
+    Devuelve la versión vigente del archivo en ``url`` usando el almacén local.
+
+    Si la red falla y existe una copia previa, se sirve esa copia (origen
+    'disco') en vez de propagar el error.
+    """
+    sesion = sesion or requests
+    meta = almacen.metadatos(url)
+    ahora = time.time()
+
+    if meta and ahora - meta.get("validado_en", 0) < edad_maxima:
+        return ResultadoDescarga(almacen.leer(meta["sha"]), meta["sha"], "disco", meta["validado_en"])
+
+    try:
+        if meta and not (meta.get("etag") or meta.get("last_modified")) and meta.get("content_length"):
+            # Sin validadores: sonda HEAD y comparación del tamaño declarado.
+            cabeza = sesion.head(url, timeout=timeout, allow_redirects=True)
+            if cabeza.ok and cabeza.headers.get("Content-Length") == meta["content_length"]:
+                meta = almacen.actualizar_metadatos(url, validado_en=ahora)
+                return ResultadoDescarga(almacen.leer(meta["sha"]), meta["sha"], "sonda", ahora)
+
+        cabeceras = {}
+        if meta and meta.get("etag"): cabeceras["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"): cabeceras["If-Modified-Since"] = meta["last_modified"]
+
+        response = sesion.get(url, headers=cabeceras, timeout=timeout)
+        if response.status_code == 304 and meta:
+            meta = almacen.actualizar_metadatos(url, validado_en=ahora)
+            return ResultadoDescarga(almacen.leer(meta["sha"]), meta["sha"], "no_modificado", ahora)
+        response.raise_for_status()
+
+        contenido = response.content
+        sha = almacen.guardar(contenido)
+        almacen.actualizar_metadatos(
+            url, sha=sha, validado_en=ahora,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            content_length=response.headers.get("Content-Length") or str(len(contenido)),
+        )
+        return ResultadoDescarga(contenido, sha, "red", ahora)
+    except requests.RequestException:
+        if meta:
+            return ResultadoDescarga(almacen.leer(meta["sha"]), meta["sha"], "disco", meta.get("validado_en", 0))
+        raise
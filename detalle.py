@@ -0,0 +1,97 @@
+"""
+Nivel de detalle según el espacio disponible en la figura.
+
+El rango visible se divide en columnas del ancho de una caja de etiqueta
+(según el ancho de la figura en píxeles) y en cada columna caben a lo sumo
+``NIVELES_LEGIBLES`` marcadores. Si la vista tiene más hitos de los que caben,
+cada columna sobrecargada se parte en ``NIVELES_LEGIBLES`` tramos de tiempo y
+los tramos con más de un hito se colapsan en un marcador agregado (cantidad,
+agente dominante y máximo retraso). Al acotar el rango cada tramo abarca
+menos días y los grupos se abren solos.
+
+La vista resultante nunca supera ``presupuesto(ancho_px)`` filas, así que el
+costo de disposición y dibujo depende de la resolución y no del total de
+hitos.
+"""
+import numpy as np
+import pandas as pd
+
+from disposicion import colores_agentes, envolver, etiquetas_hitos, fecha_es
+
+ANCHO_FIGURA_PX = 1600      # 16 pulgadas a 100 dpi, como la vista en pantalla
+PX_POR_CAJA = 130           # ancho típico de una caja de etiqueta a 8 pt
+NIVELES_LEGIBLES = 8
+
+
+def presupuesto(ancho_px=ANCHO_FIGURA_PX):
+    """Máximo de marcadores que se dibujan en una figura de ``ancho_px``."""
+    return max(1, ancho_px // PX_POR_CAJA) * NIVELES_LEGIBLES
+
+
+def _etiqueta_grupo(grupo, agente, cantidad_agente, retraso):
+    lineas = [f"{len(grupo)} HITOS", f"{envolver(str(agente), 25)} ({cantidad_agente})"]
+    if 'Normativa' in grupo.columns and grupo['Normativa'].nunique() > 1:
+        lineas.append(f"en {grupo['Normativa'].nunique()} normativas")
+    if pd.notna(retraso) and retraso > 0:
+        lineas.append(f"Máx. retraso: +{int(retraso)}d")
+    f_min, f_max = grupo['Fecha_Vigente'].min(), grupo['Fecha_Vigente'].max()
+    if f_min == f_max:
+        lineas.append(fecha_es(f_min))
+    elif f_min.year == f_max.year:
+        lineas.append(f"{fecha_es(f_min)} – {fecha_es(f_max)}")
+    else:
+        lineas.append(f"{fecha_es(f_min, 'eje')} – {fecha_es(f_max, 'eje')}")
+    return "\n".join(lineas)
+
+
+def _agregar(grupo):
+    conteo = grupo['Agente'].value_counts()
+    agente = conteo.index[0] if len(conteo) else ""
+    color = grupo.loc[grupo['Agente'] == agente, 'Color'].iloc[0] if len(conteo) else grupo['Color'].iloc[0]
+    retraso = (grupo['Fecha_Vigente'] - grupo['Fecha_teorica']).dt.days.max()
+    f_min, f_max = grupo['Fecha_Vigente'].min(), grupo['Fecha_Vigente'].max()
+    return {
+        'Fecha_Vigente': (f_min + (f_max - f_min) / 2).normalize(),
+        'Fecha_teorica': pd.NaT,        # el retraso va en la etiqueta, sin flecha
+        'Agente': agente,
+        'Hito / Etapa': f"{len(grupo)} hitos",
+        'Color': color,
+        'Etiqueta': _etiqueta_grupo(grupo, agente, int(conteo.iloc[0]) if len(conteo) else 0, retraso),
+        'Cantidad': len(grupo),
+        'Retraso_Max': retraso,
+    }
+
+
+def agrupar_por_detalle(df_plot, f_inicio, f_fin, ancho_px=ANCHO_FIGURA_PX):
+    """
+    ``df_plot`` tal cual si cabe en la figura; si no, con los tramos densos
+    colapsados. Las filas agregadas llevan 'Cantidad' > 1 y su propia
+    'Etiqueta' y 'Color'.
+    """
+    if len(df_plot) <= presupuesto(ancho_px):
+        return df_plot
+    df = df_plot.copy()
+    if 'Color' not in df.columns:
+        df['Color'] = colores_agentes(df['Agente'])
+    if 'Etiqueta' not in df.columns:
+        df['Etiqueta'] = etiquetas_hitos(df)
+    df['Color'] = df['Color'].astype(object)
+
+    columnas = max(1, ancho_px // PX_POR_CAJA)
+    inicio = pd.Timestamp(f_inicio).value
+    ancho_rango = max(1, pd.Timestamp(f_fin).value - inicio)
+    x = df['Fecha_Vigente'].to_numpy(dtype='datetime64[ns]').astype('int64')
+    posicion = np.clip((x - inicio) / ancho_rango, 0.0, np.nextafter(1.0, 0.0))
+    columna = (posicion * columnas).astype(int)
+    densa = np.bincount(columna, minlength=columnas)[columna] > NIVELES_LEGIBLES
+    tramo = (posicion * columnas * NIVELES_LEGIBLES).astype(int)
+    # Filas de columnas holgadas: un grupo propio cada una (ids negativos)
+    grupo = np.where(densa, tramo, -1 - np.arange(len(df)))
+    tamano = pd.Series(grupo).map(pd.Series(grupo).value_counts()).to_numpy()
+    sueltas = tamano == 1
+
+    individuales = df[sueltas].assign(Cantidad=1, Retraso_Max=np.nan)
+    agregados = pd.DataFrame([_agregar(g) for _, g in df[~sueltas].groupby(grupo[~sueltas], sort=True)])
+    resultado = pd.concat([individuales, agregados], ignore_index=True)
+    # Orden cronológico estable: el modo estándar alterna arriba/abajo según la posición
+    return resultado.sort_values('Fecha_Vigente', kind='stable').reset_index(drop=True)
@@ -0,0 +1,501 @@
+"""
+Etapa de disposición (layout) de las líneas de tiempo, sin dependencias gráficas.
+
+A partir de la hoja filtrada se calcula una ``Disposicion``: tablas columnares
+con las primitivas a dibujar (tallos, ramas, puntos, flechas, textos de
+retraso y etiquetas) ya posicionadas y coloreadas. El renderizador de
+``grafico.py`` solo las consume, por lo que una misma disposición sirve para
+la figura en pantalla, el PNG HD y cualquier otra exportación.
+
+Las posiciones en X se manejan como enteros en nanosegundos desde la época
+(la misma resolución que ``pd.Timestamp``), de modo que las comparaciones son
+exactas y equivalentes a las que antes se hacían con ``timedelta``.
+"""
+import math
+import textwrap
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from perfil import tramo
+
+NS_POR_DIA = 86_400 * 10**9
+COLOR_SIN_AGENTE = '#7f8c8d'
+
+
+def a_ns(delta):
+    """``timedelta`` -> nanosegundos, con el mismo redondeo a microsegundos de ``timedelta``."""
+    return (delta // timedelta(microseconds=1)) * 1000
+
+
+# Índice = número de mes (posición 0 sin uso), para formatear por búsqueda en arreglo
+MESES_CORTOS = np.array(['', 'Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic'], dtype=object)
+MESES_LARGOS = np.array(['', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto',
+                         'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'], dtype=object)
+
+
+def fecha_es(fecha, formato="corto"):
+    if pd.isnull(fecha): return ""
+    if formato == "corto": return f"{fecha.day}-{MESES_CORTOS[fecha.month]}"
+    elif formato == "eje": return f"{MESES_CORTOS[fecha.month]}-{str(fecha.year)[2:]}"
+    elif formato == "hoy_full": return f"{fecha.day}/{MESES_LARGOS[fecha.month]}/{fecha.year}"
+    return f"{fecha.day}/{fecha.month}/{fecha.year}"
+
+
+def fechas_es(fechas):
+    """``fecha_es(f, "corto")`` para toda una serie: arreglo de textos ('' donde no hay fecha)."""
+    fechas = pd.to_datetime(pd.Series(fechas))
+    validas = fechas.notna().to_numpy()
+    dias = fechas.dt.day.fillna(0).astype(int).to_numpy().astype(str).astype(object)
+    meses = MESES_CORTOS[fechas.dt.month.fillna(0).astype(int).to_numpy()]
+    return np.where(validas, dias + "-" + meses, "")
+
+
+def requiere_formato_arbol(df, col_fecha='Fecha_Vigente'):
+    if df.empty: return False
+    conteo = df[col_fecha].value_counts()
+    return (conteo > 1).any()
+
+
+@lru_cache(maxsize=4096)
+def envolver(texto, ancho):
+    return textwrap.fill(texto, ancho)
+
+
+def texto_etiqueta(agente, hito, fecha):
+    return f"{envolver(agente.upper(), 20)}\n{envolver(str(hito), 25)}\n{fecha_es(fecha)}"
+
+
+def envolver_columna(valores, ancho, a_texto=str):
+    """``envolver`` para una columna: textwrap una sola vez por valor distinto."""
+    codigos, unicos = pd.factorize(valores, use_na_sentinel=False)
+    return np.array([envolver(a_texto(v), ancho) for v in unicos], dtype=object)[codigos]
+
+
+def etiquetas_hitos(df, col_fecha='Fecha_Vigente'):
+    """Texto de la caja de cada hito (agente, hito y fecha), igual a ``texto_etiqueta`` fila a fila."""
+    agentes = envolver_columna(df['Agente'], 20, lambda a: str(a).upper())
+    if 'Hito / Etapa' in df.columns:
+        hitos = envolver_columna(df['Hito / Etapa'], 25, str)
+    else:
+        hitos = np.full(len(df), '', dtype=object)
+    return pd.Series(agentes + "\n" + hitos + "\n" + fechas_es(df[col_fecha]).astype(object),
+                     index=df.index, dtype=object)
+
+
+def asignar_colores(agentes):
+    mapa_colores = {
+        'Comisión': "#0400ff", 'CNE': "#0400ff", 'Participantes': '#27ae60',
+        'Participantes e interesados': '#27ae60', 'Interesados': '#27ae60',
+        'Empresas': '#27ae60', 'Coordinador': '#e67e22', 'CEN': '#e67e22'
+    }
+    colores_extra = ["#ff0000", "#8e44ad", "#16a085", "#34495e", "#d35400"]
+    idx_extra = 0
+    for ag in agentes:
+        if ag and ag not in mapa_colores:
+            mapa_colores[ag] = colores_extra[idx_extra % len(colores_extra)]
+            idx_extra += 1
+    return mapa_colores
+
+
+def colores_agentes(agentes, mapa_colores=None):
+    """
+    Color de cada fila según su agente, como categórico. Sin ``mapa_colores``
+    los colores extra se reparten en orden de aparición dentro de ``agentes``
+    (toda la hoja), así un mismo agente conserva su color en cualquier filtro.
+    """
+    codigos, unicos = pd.factorize(agentes, use_na_sentinel=True)
+    if mapa_colores is None:
+        mapa_colores = asignar_colores(unicos)
+    paleta = np.array([mapa_colores.get(a, COLOR_SIN_AGENTE) for a in unicos] + [COLOR_SIN_AGENTE], dtype=object)
+    return pd.Categorical(paleta[codigos], categories=pd.unique(paleta))
+
+
+def enriquecer_hoja(df):
+    """Columnas derivadas para dibujar: 'Etiqueta' y 'Color'. Se calculan una vez por versión del libro."""
+    if 'Agente' not in df.columns:
+        return df
+    df['Color'] = colores_agentes(df['Agente'])
+    if 'Fecha_Vigente' in df.columns:
+        df['Etiqueta'] = etiquetas_hitos(df)
+    return df
+
+
+# ==========================================
+# DESCRIPCIÓN DE LA DISPOSICIÓN
+# ==========================================
+
+COLUMNAS_CAPAS = {
+    'tallos':      ['x', 'y0', 'y1', 'color', 'alpha', 'lw', 'estilo', 'zorder'],
+    'ramas':       ['x0', 'x1', 'y', 'color', 'lw', 'zorder'],
+    'puntos':      ['x', 'y', 's', 'color', 'marcador', 'zorder', 'borde', 'lw_borde'],
+    'flechas':     ['x0', 'x1', 'y', 'zorder'],
+    'textos_dias': ['x', 'y', 'texto', 'va'],
+    'etiquetas':   ['x', 'y', 'texto', 'color', 'fontsize', 'alpha'],
+}
+
+
+class _Capas:
+    """Acumula primitivas fila a fila y las entrega como DataFrames columnares."""
+
+    def __init__(self):
+        self._filas = {nombre: [] for nombre in COLUMNAS_CAPAS}
+
+    def agregar(self, capa, *valores):
+        self._filas[capa].append(valores)
+
+    def tablas(self):
+        tablas = {}
+        for nombre, columnas in COLUMNAS_CAPAS.items():
+            df = pd.DataFrame(self._filas[nombre], columns=columnas)
+            for col in ('x', 'x0', 'x1'):
+                if col in df.columns: df[col] = pd.to_datetime(df[col])
+            tablas[nombre] = df
+        return tablas
+
+
+@dataclass
+class Disposicion:
+    titulo: str
+    modo: str                   # 'arbol' | 'estandar'
+    f_inicio: object
+    f_fin: object
+    y_lim: tuple
+    y_hoy: float                # altura del rótulo "HOY"
+    leyenda: list               # [(agente, color), ...]
+    n_hitos: int
+    tallos: pd.DataFrame = field(repr=False)
+    ramas: pd.DataFrame = field(repr=False)
+    puntos: pd.DataFrame = field(repr=False)
+    flechas: pd.DataFrame = field(repr=False)
+    textos_dias: pd.DataFrame = field(repr=False)
+    etiquetas: pd.DataFrame = field(repr=False)
+
+    def capas(self):
+        return {nombre: getattr(self, nombre) for nombre in COLUMNAS_CAPAS}
+
+
+# ==========================================
+# ÍNDICE ESPACIAL DE CAJAS
+# ==========================================
+
+class IndiceCajas:
+    """
+    Cajas alineadas a los ejes, repartidas en bandas horizontales de alto fijo.
+
+    Dentro de cada banda las cajas se mantienen ordenadas por su borde izquierdo;
+    conociendo el ancho máximo de la banda, una consulta solo revisa las cajas
+    cuyo borde izquierdo cae en ``(x_min - ancho_max, x_max)``.
+    """
+
+    def __init__(self, alto_banda=2.0):
+        self.alto_banda = alto_banda
+        self._bandas = defaultdict(lambda: ([], [], [0]))   # banda -> (x1 ordenados, cajas, [ancho_max])
+
+    def _rango_bandas(self, y_min, y_max):
+        return range(math.floor(y_min / self.alto_banda), math.floor(y_max / self.alto_banda) + 1)
+
+    def colisiona(self, x_min, x_max, y_min, y_max):
+        for banda in self._rango_bandas(y_min, y_max):
+            if banda not in self._bandas: continue
+            xs, cajas, ancho_max = self._bandas[banda]
+            desde = bisect_right(xs, x_min - ancho_max[0])
+            hasta = bisect_left(xs, x_max)
+            for ox1, ox2, oy1, oy2 in cajas[desde:hasta]:
+                if (x_min < ox2 and x_max > ox1) and (y_min < oy2 and y_max > oy1): return True
+        return False
+
+    def agregar(self, x_min, x_max, y_min, y_max):
+        caja = (x_min, x_max, y_min, y_max)
+        for banda in self._rango_bandas(y_min, y_max):
+            xs, cajas, ancho_max = self._bandas[banda]
+            pos = bisect_right(xs, x_min)
+            xs.insert(pos, x_min); cajas.insert(pos, caja)
+            if x_max - x_min > ancho_max[0]: ancho_max[0] = x_max - x_min
+
+
+# ==========================================
+# MODO ÁRBOL
+# ==========================================
+
+NIVEL_MIN_SINGLE = 3.5; STEP_SINGLE = 2.5
+NIVEL_MIN_ARBOL = 5.0; STEP_ARBOL = 3.0
+
+
+def ancho_caja_dias(f_inicio, f_fin):
+    return max(25, (f_fin - f_inicio).days * 0.08)
+
+
+def ubicar_elementos_arbol(df_plot, f_inicio, f_fin):
+    """
+    Coloca hitos sueltos y árboles (varios hitos en la misma fecha) sin que sus
+    cajas se superpongan. Cada elemento referencia sus hitos por posición
+    (``fila``) dentro de ``df_plot``.
+    """
+    ANCHO_CAJA_DIAS = ancho_caja_dias(f_inicio, f_fin)
+    medio_ancho = a_ns(timedelta(days=ANCHO_CAJA_DIAS/2))
+    ancho = a_ns(timedelta(days=ANCHO_CAJA_DIAS))
+    margen_rama = a_ns(timedelta(days=5))
+
+    indice = IndiceCajas(alto_banda=2.5); elementos_finales = []
+    lista_singles = []; lista_arboles = []
+    grupos = df_plot.groupby('Fecha_Vigente').indices
+    for fecha in sorted(grupos):
+        filas = grupos[fecha].tolist(); fecha = pd.Timestamp(fecha)
+        if len(filas) == 1: lista_singles.append((fecha, filas[0]))
+        else: lista_arboles.append((fecha, filas))
+
+    for i, (fecha, fila) in enumerate(lista_singles):
+        x = fecha.value
+        x_min, x_max = x - medio_ancho, x + medio_ancho
+        paso = STEP_SINGLE if i % 2 == 0 else -STEP_SINGLE
+        nivel_actual = NIVEL_MIN_SINGLE if i % 2 == 0 else -NIVEL_MIN_SINGLE
+        for _ in range(20):
+            y_min, y_max = nivel_actual - 1.0, nivel_actual + 1.0
+            if not indice.colisiona(x_min, x_max, y_min, y_max):
+                indice.agregar(x_min, x_max, y_min, y_max)
+                break
+            nivel_actual += paso
+        elementos_finales.append({'tipo': 'single', 'fila': fila, 'x': fecha, 'y': nivel_actual})
+
+    for i_arbol, (fecha, filas) in enumerate(lista_arboles):
+        trunk_dir = 1 if i_arbol % 2 == 0 else -1
+        x = fecha.value
+        # Caja de cada rama en X: derecha (i par) o izquierda (i impar) del tronco
+        x_ramas = [(x - margen_rama, x + ancho + margen_rama) if i % 2 == 0 else (x - ancho - margen_rama, x + margen_rama)
+                   for i in range(len(filas))]
+        altura_base_tronco = NIVEL_MIN_ARBOL; encontrado_tronco = False
+        for _ in range(15):
+            temp_cajas_ramas = []; temp_posiciones = []
+            y_fin_tronco = (altura_base_tronco + (len(filas) - 1) * STEP_ARBOL) * trunk_dir
+            for i_hito, fila in enumerate(filas):
+                y_nivel = (altura_base_tronco + (i_hito * STEP_ARBOL)) * trunk_dir
+                es_derecha = (i_hito % 2 == 0)
+                x_min_box, x_max_box = x_ramas[i_hito]
+                y_min_box, y_max_box = y_nivel - 1.2, y_nivel + 1.2
+                if indice.colisiona(x_min_box, x_max_box, y_min_box, y_max_box): break
+                x_caja = fecha + timedelta(days=ANCHO_CAJA_DIAS * (1 if es_derecha else -1))
+                temp_cajas_ramas.append((x_min_box, x_max_box, y_min_box, y_max_box))
+                temp_posiciones.append({'fila': fila, 'y_nivel': y_nivel, 'x_caja': x_caja, 'es_derecha': es_derecha})
+            else:
+                for caja in temp_cajas_ramas: indice.agregar(*caja)
+                encontrado_tronco = True
+            if encontrado_tronco: break
+            altura_base_tronco += STEP_ARBOL
+        elementos_finales.append({'tipo': 'arbol', 'fecha': fecha, 'y_fin_tronco': y_fin_tronco, 'ramas': temp_posiciones, 'fila_raiz': filas[0]})
+
+    return elementos_finales
+
+
+def _columnas_hitos(df_plot, mapa_colores=None):
+    """
+    Agente, fecha teórica, etiqueta y color de cada hito. Usa las columnas
+    precalculadas por ``enriquecer_hoja`` si están; con ``mapa_colores``
+    explícito el color sale de ese mapa.
+    """
+    agentes = df_plot['Agente'].tolist()
+    teoricas = df_plot['Fecha_teorica'].tolist() if 'Fecha_teorica' in df_plot.columns else [pd.NaT] * len(df_plot)
+    etiquetas = df_plot['Etiqueta'] if 'Etiqueta' in df_plot.columns else etiquetas_hitos(df_plot)
+    if mapa_colores is None and 'Color' in df_plot.columns:
+        colores = df_plot['Color']
+    else:
+        colores = colores_agentes(df_plot['Agente'], mapa_colores)
+    cantidades = df_plot['Cantidad'].tolist() if 'Cantidad' in df_plot.columns else [1] * len(df_plot)
+    return agentes, teoricas, etiquetas.tolist(), np.asarray(colores, dtype=object).tolist(), cantidades
+
+
+def _marcador(tamano, cantidad):
+    # Hitos agrupados por nivel de detalle (detalle.py): rombo que crece con la cantidad
+    if cantidad > 1:
+        return tamano * (1 + math.sqrt(min(cantidad, 50)) / 2), 'D'
+    return tamano, 'o'
+
+
+def _leyenda(agentes, colores):
+    # Un par (agente, color) por agente, en orden de aparición
+    vistos = {}
+    for agente, color in zip(agentes, colores):
+        if pd.notna(agente) and agente not in vistos:
+            vistos[agente] = color
+    return list(vistos.items())
+
+
+def calcular_disposicion_arbol(df_plot, titulo, f_inicio, f_fin, mapa_colores=None):
+    ANCHO_CAJA_DIAS = ancho_caja_dias(f_inicio, f_fin)
+    offset_gap = timedelta(days=ANCHO_CAJA_DIAS * 0.05)
+    agentes, teoricas, etiquetas, colores, cantidades = _columnas_hitos(df_plot, mapa_colores)
+    capas = _Capas(); max_abs_y = 4.0
+
+    with tramo("disposicion.ubicar_arbol") as t:
+        elementos = ubicar_elementos_arbol(df_plot, f_inicio, f_fin)
+        t["elementos"] = len(elementos)
+    for item in elementos:
+        if item['tipo'] == 'single':
+            fila = item['fila']; x = item['x']; y = item['y']
+            if abs(y) > max_abs_y: max_abs_y = abs(y)
+            color = colores[fila]
+            capas.agregar('tallos', x, 0, y, color, 0.5, 1, '-', 1)
+            tamano, marcador = _marcador(60, cantidades[fila])
+            capas.agregar('puntos', x, 0, tamano, color, marcador, 3, None, None)
+            f_teorica = teoricas[fila]
+            if pd.notnull(f_teorica) and abs((x - f_teorica).days) > 5:
+                carril = 1.0 if y > 0 else -1.0
+                capas.agregar('flechas', max(f_teorica, f_inicio), x, carril, 5)
+                dias = (x - f_teorica).days
+                pos_txt = max(max(f_teorica, f_inicio), x - timedelta(days=6))
+                capas.agregar('textos_dias', pos_txt, carril-0.25, f"{'+' if dias>0 else ''}{dias}d", 'top')
+            capas.agregar('etiquetas', x, y, etiquetas[fila], color, 8, 0.95)
+        elif item['tipo'] == 'arbol':
+            fecha = item['fecha']; y_fin = item['y_fin_tronco']
+            if abs(y_fin) > max_abs_y: max_abs_y = abs(y_fin)
+            color_raiz = colores[item['fila_raiz']] if pd.notna(agentes[item['fila_raiz']]) else '#34495e'
+            capas.agregar('puntos', fecha, 0, 80, color_raiz, 'o', 4, 'white', 1.5)
+            capas.agregar('tallos', fecha, 0, y_fin, '#7f8c8d', 0.5, 2, '--', 1)
+            for rama in item['ramas']:
+                fila = rama['fila']; y_nivel = rama['y_nivel']; x_caja = rama['x_caja']; es_derecha = rama['es_derecha']
+                if abs(y_nivel) > max_abs_y: max_abs_y = abs(y_nivel)
+                color = colores[fila]
+                x_linea_fin = x_caja - offset_gap if es_derecha else x_caja + offset_gap
+                capas.agregar('ramas', fecha, x_linea_fin, y_nivel, color, 1.5, 2)
+                tamano, marcador = _marcador(30, cantidades[fila])
+                capas.agregar('puntos', fecha, y_nivel, tamano, color, marcador, 3, None, None)
+                capas.agregar('etiquetas', x_caja, y_nivel, etiquetas[fila], color, 7.5, 1.0)
+                f_teorica = teoricas[fila]
+                if pd.notnull(f_teorica) and abs((fecha - f_teorica).days) > 3:
+                    y_flecha = y_nivel + (1.2 if y_nivel > 0 else -1.2)
+                    if abs(y_flecha) > max_abs_y: max_abs_y = abs(y_flecha)
+                    f_ini_vis = max(f_teorica, f_inicio)
+                    if f_teorica >= f_inicio:
+                        capas.agregar('tallos', f_teorica, 0, y_flecha, '#bdc3c7', 0.6, 1.5, ':', 1)
+                        capas.agregar('puntos', f_teorica, 0, 20, '#bdc3c7', '|', 1, None, None)
+                    capas.agregar('flechas', f_ini_vis, x_caja, y_flecha, 5)
+                    dias = (fecha - f_teorica).days
+                    pos_txt = max(f_ini_vis, x_caja - timedelta(days=6)) if x_caja > f_ini_vis else min(f_ini_vis, x_caja + timedelta(days=6))
+                    va_txt = 'top' if y_nivel > 0 else 'bottom'; offset_txt_y = -0.25 if y_nivel > 0 else 0.25
+                    capas.agregar('textos_dias', pos_txt, y_flecha + offset_txt_y, f"{'+' if dias>0 else ''}{dias}d", va_txt)
+
+    margen_y_final = max_abs_y + 3.0
+    return Disposicion(
+        titulo=titulo, modo='arbol', f_inicio=f_inicio, f_fin=f_fin,
+        y_lim=(-margen_y_final, margen_y_final), y_hoy=margen_y_final - 0.5,
+        leyenda=_leyenda(agentes, colores),
+        n_hitos=len(df_plot), **capas.tablas(),
+    )
+
+
+# ==========================================
+# MODO ESTÁNDAR
+# ==========================================
+
+BASE_NIVEL_POS = 5.0; BASE_NIVEL_NEG = -5.0; STEP_NIVEL = 2.5; MARGEN_DIAS = 75
+NIVELES_FLECHAS_POS, NIVELES_FLECHAS_NEG = [0.8, 1.6, 2.4], [-0.8, -1.6, -2.4]
+UMBRAL_FLECHA_DIAS = 5
+
+
+def asignar_niveles_estandar(df_plot, col_vigente='Fecha_Vigente', col_teorica='Fecha_teorica'):
+    """
+    Asigna en una pasada el nivel de cada hito y el carril de su flecha de retraso.
+
+    Devuelve ``(niveles, carriles)`` alineados con las filas de ``df_plot``;
+    ``carriles`` es NaN donde no corresponde dibujar flecha (sin fecha teórica
+    o diferencia de hasta ``UMBRAL_FLECHA_DIAS`` días).
+    """
+    vigentes = df_plot[col_vigente].to_numpy(dtype='datetime64[ns]').astype('int64')
+    if col_teorica in df_plot.columns:
+        teoricas = pd.to_datetime(df_plot[col_teorica]).to_numpy(dtype='datetime64[ns]')
+        hay_teorica = ~np.isnat(teoricas)
+        teoricas = teoricas.astype('int64')
+    else:
+        teoricas = np.zeros(len(df_plot), dtype='int64'); hay_teorica = np.zeros(len(df_plot), dtype=bool)
+    positivos = (df_plot.index.to_numpy() % 2 == 0)
+
+    # --- NIVELES: por nivel, fechas ocupadas ordenadas ---
+    # Colisión si |(fecha - ocupada).days| < MARGEN_DIAS, con .days truncando hacia -inf:
+    # equivale a ocupada en (fecha - MARGEN, fecha + MARGEN - 1 día].
+    antes, despues = MARGEN_DIAS * NS_POR_DIA, (MARGEN_DIAS - 1) * NS_POR_DIA
+    ocupacion_niveles = defaultdict(list)
+    niveles = np.empty(len(df_plot))
+    for i, (x, es_positivo) in enumerate(zip(vigentes.tolist(), positivos.tolist())):
+        paso = STEP_NIVEL if es_positivo else -STEP_NIVEL
+        nivel_actual = BASE_NIVEL_POS if es_positivo else BASE_NIVEL_NEG
+        for _ in range(20):
+            ocupadas = ocupacion_niveles[nivel_actual]
+            j = bisect_right(ocupadas, x - antes)
+            if j == len(ocupadas) or ocupadas[j] > x + despues: break
+            nivel_actual += paso
+        insort(ocupacion_niveles[nivel_actual], x)
+        niveles[i] = nivel_actual
+
+    # --- CARRILES DE FLECHA: intervalos disjuntos ordenados por carril ---
+    margen = UMBRAL_FLECHA_DIAS * NS_POR_DIA
+    ocupacion_flechas = {c: ([], []) for c in NIVELES_FLECHAS_POS + NIVELES_FLECHAS_NEG}
+    carriles = np.full(len(df_plot), np.nan)
+    for i in np.flatnonzero(hay_teorica).tolist():
+        x, t = int(vigentes[i]), int(teoricas[i])
+        if abs((x - t) // NS_POR_DIA) <= UMBRAL_FLECHA_DIAS: continue
+        opciones = NIVELES_FLECHAS_POS if niveles[i] > 0 else NIVELES_FLECHAS_NEG
+        inicio, fin = min(x, t), max(x, t)
+        carriles[i] = opciones[len(opciones) // 2]
+        for carril in opciones:
+            inicios, fines = ocupacion_flechas[carril]
+            j = bisect_right(inicios, fin + margen) - 1
+            if j < 0 or fines[j] + margen < inicio:
+                inicios.insert(j + 1, inicio); fines.insert(j + 1, fin)
+                carriles[i] = carril
+                break
+    return niveles, carriles
+
+
+def calcular_disposicion_estandar(df_plot, titulo, f_inicio, f_fin, mapa_colores=None):
+    col_vigente, col_teorica = 'Fecha_Vigente', 'Fecha_teorica'
+    with tramo("disposicion.asignar_niveles", hitos=len(df_plot)):
+        niveles, carriles_flecha = asignar_niveles_estandar(df_plot, col_vigente, col_teorica)
+    agentes, teoricas, etiquetas, colores, cantidades = _columnas_hitos(df_plot, mapa_colores)
+    capas = _Capas()
+
+    max_y = niveles.max() if len(niveles) else 4
+    min_y = niveles.min() if len(niveles) else -4
+    limite_superior = max(8, max_y + 3.0)
+    limite_inferior = min(-8, min_y - 3.0)
+
+    for pos, f_vigente in enumerate(df_plot[col_vigente].tolist()):
+        f_teorica = teoricas[pos]; nivel = niveles[pos]; color = colores[pos]
+        capas.agregar('tallos', f_vigente, 0, nivel, color, 0.5, 1, '-', 1)
+        tamano, marcador = _marcador(60, cantidades[pos])
+        capas.agregar('puntos', f_vigente, 0, tamano, color, marcador, 3, None, None)
+        if not np.isnan(carriles_flecha[pos]):
+            dias = (f_vigente - f_teorica).days
+            altura_cota = carriles_flecha[pos]
+            f_ini_vis = max(f_teorica, f_inicio)
+            if f_teorica >= f_inicio:
+                capas.agregar('tallos', f_teorica, 0, altura_cota, '#bdc3c7', 0.8, 1.5, ':', 1)
+                capas.agregar('puntos', f_teorica, 0, 20, '#bdc3c7', '|', 2, None, None)
+            capas.agregar('flechas', f_ini_vis, f_vigente, altura_cota, 20)
+            pos_txt = max(f_ini_vis, f_vigente - timedelta(days=6))
+            signo = "+" if dias > 0 else ""
+            capas.agregar('textos_dias', pos_txt, altura_cota - 0.25, f"{signo}{dias}d", 'top')
+        capas.agregar('etiquetas', f_vigente, nivel, etiquetas[pos], color, 8, 0.95)
+
+    return Disposicion(
+        titulo=titulo, modo='estandar', f_inicio=f_inicio, f_fin=f_fin,
+        y_lim=(limite_inferior, limite_superior), y_hoy=limite_superior * 0.95,
+        leyenda=_leyenda(agentes, colores),
+        n_hitos=len(df_plot), **capas.tablas(),
+    )
+
+
+def calcular_disposicion(df_plot, titulo, f_inicio, f_fin, mapa_colores=None):
+    """
+    Elige el modo (árbol si hay fechas repetidas) y calcula la disposición.
+    Sin ``mapa_colores`` usa la columna 'Color' de la hoja (o la calcula).
+    """
+    if requiere_formato_arbol(df_plot):
+        with tramo("disposicion.arbol", hitos=len(df_plot)):
+            return calcular_disposicion_arbol(df_plot, titulo, f_inicio, f_fin, mapa_colores)
+    with tramo("disposicion.estandar", hitos=len(df_plot)):
+        return calcular_disposicion_estandar(df_plot, titulo, f_inicio, f_fin, mapa_colores)
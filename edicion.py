@@ -0,0 +1,146 @@
+"""
+Sesión de edición de 'Fecha_Real_Manual' para la pestaña de gestión.
+
+La hoja normalizada del almacén (``hojas.AlmacenHojas``) no se copia ni se
+modifica: la sesión guarda una referencia y, aparte, sólo las celdas
+editadas, ``{fila_excel: Timestamp | None}`` (fila 1 = encabezado, como
+``parche_xlsx.cambios_columna``). La fila de Excel es la identidad estable de
+cada hito, aunque la vista se filtre o se pagine.
+
+Al editor llega sólo la página visible (``pagina``): las columnas de
+``COLUMNAS_EDITOR`` con las ediciones aplicadas, 'Fecha_Vigente' recalculada
+en las filas editadas (manual si hay, si no proyectada, como
+``hojas.preparar_hoja``) y el semáforo 'Estado' de esas filas. Lo que
+devuelve el editor se compara con esa misma página (``leer_editor``) y el
+guardado recibe sólo ``cambios``.
+
+Lo ya guardado queda como ``confirmados`` hasta que llega una versión nueva
+del libro, para que el editor no muestre el valor anterior mientras el
+archivo se sincroniza.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from hojas import COLUMNAS_EDITOR
+from vistas import estado_hitos
+
+COLUMNA_EDITABLE = "Fecha_Real_Manual"
+TAMANOS_PAGINA = (50, 100, 250, 500)
+# Posición en la hoja -> fila de Excel (encabezado en la fila 1)
+DESPLAZAMIENTO_FILA = 2
+
+
+def _fecha(valor):
+    valor = pd.to_datetime(valor, errors='coerce')
+    return None if pd.isna(valor) else valor
+
+
+def _iguales(a, b):
+    return (a is None and b is None) or (a is not None and b is not None and a == b)
+
+
+def paginas(filas, tamano):
+    """Cantidad de páginas de ``tamano`` filas (al menos una)."""
+    return max(1, math.ceil(filas / tamano))
+
+
+class SesionEdicion:
+
+    def __init__(self, df, hoja, sha, pendientes=None):
+        self.hoja, self.sha = hoja, sha
+        self.filas = len(df)
+        self.editable = COLUMNA_EDITABLE in df.columns
+        self.espejo = 'Fecha_Vigente_Espejo' in df.columns
+        self.columnas = [c for c in COLUMNAS_EDITOR if c in df.columns]
+        self.cambios = {}
+        self.confirmados = {}
+        self._df = df
+        # Las pendientes de otra versión del libro se conservan si siguen siendo cambios
+        self.registrar(pendientes or {})
+
+    @classmethod
+    def continuar(cls, anterior, df, hoja, sha):
+        """La sesión de ``anterior`` si sigue siendo de la misma versión; si no, una nueva con sus pendientes."""
+        if anterior is not None and anterior.hoja == hoja and anterior.sha == sha:
+            return anterior
+        return cls(df, hoja, sha, anterior.cambios if anterior is not None and anterior.hoja == hoja else None)
+
+    # --- VALORES ---
+    def original(self, fila):
+        """Valor de la versión del libro (o el último guardado) en la fila de Excel ``fila``."""
+        if fila in self.confirmados:
+            return self.confirmados[fila]
+        return _fecha(self._df[COLUMNA_EDITABLE].iat[fila - DESPLAZAMIENTO_FILA])
+
+    def registrar(self, cambios):
+        """
+        Incorpora ``{fila_excel: fecha o None}``; una fila que vuelve a su
+        valor original deja de ser un cambio. Devuelve cuántas filas cambiaron.
+        """
+        if not self.editable:
+            return 0
+        modificadas = 0
+        for fila, valor in cambios.items():
+            fila, valor = int(fila), _fecha(valor)
+            if not DESPLAZAMIENTO_FILA <= fila < self.filas + DESPLAZAMIENTO_FILA:
+                continue
+            previo = self.cambios.get(fila, self.original(fila))
+            if _iguales(previo, valor):
+                continue
+            modificadas += 1
+            if _iguales(valor, self.original(fila)):
+                self.cambios.pop(fila, None)
+            else:
+                self.cambios[fila] = valor
+        return modificadas
+
+    def descartar(self):
+        self.cambios = {}
+
+    def confirmar(self):
+        """Pasa ``cambios`` a ``confirmados`` (tras guardarlos) y los devuelve."""
+        guardados, self.cambios = self.cambios, {}
+        self.confirmados.update(guardados)
+        return guardados
+
+    # --- VISTA ---
+    def posiciones(self, mascara=None, solo_modificadas=False):
+        """Posiciones en la hoja que muestra el editor, según ``mascara`` (ver ``IndiceHitos.mascara``)."""
+        if solo_modificadas:
+            posiciones = np.array(sorted(self.cambios), dtype=np.int64) - DESPLAZAMIENTO_FILA
+            return posiciones if mascara is None else posiciones[mascara[posiciones]]
+        return np.arange(self.filas) if mascara is None else np.flatnonzero(mascara)
+
+    def pagina(self, posiciones):
+        """
+        Filas ``posiciones`` listas para el editor: 'Estado' + columnas del
+        editor, con índice = fila de Excel y las ediciones aplicadas.
+        """
+        vista = self._df.iloc[posiciones]
+        vista = vista[self.columnas].set_index(pd.Index(posiciones + DESPLAZAMIENTO_FILA, name="Fila"))
+        if self.espejo and 'Fecha_Vigente' in vista.columns:
+            vista['Fecha_Vigente'] = self._df['Fecha_Vigente_Espejo'].iloc[posiciones].to_numpy()
+        superpuestas = {**self.confirmados, **self.cambios}
+        if self.editable and superpuestas:
+            filas = vista.index.intersection(list(superpuestas))
+            if len(filas):
+                nuevas = pd.Series([superpuestas[f] for f in filas], index=filas, dtype='datetime64[ns]')
+                vista.loc[filas, COLUMNA_EDITABLE] = nuevas
+                if self.espejo and 'Fecha_Vigente' in vista.columns:
+                    proyectada = self._df['Fecha_Proyectada'].iloc[filas - DESPLAZAMIENTO_FILA].to_numpy()
+                    vista.loc[filas, 'Fecha_Vigente'] = nuevas.fillna(pd.Series(proyectada, index=filas))
+        if 'Fecha_Vigente' in vista.columns:
+            vista.insert(0, "Estado", estado_hitos(vista['Fecha_Vigente']))
+        return vista
+
+    def leer_editor(self, vista, editada):
+        """Registra lo que cambió entre la ``vista`` mostrada y la ``editada`` que devolvió el editor."""
+        if not self.editable or COLUMNA_EDITABLE not in editada.columns:
+            return 0
+        antes = pd.to_datetime(vista[COLUMNA_EDITABLE], errors='coerce')
+        despues = pd.to_datetime(editada[COLUMNA_EDITABLE], errors='coerce').reindex(antes.index)
+        iguales = (antes == despues) | (antes.isna() & despues.isna())
+        distintas = ~iguales.to_numpy()
+        return self.registrar(dict(zip(antes.index[distintas], despues[distintas])))
@@ -0,0 +1,360 @@
+"""
+Renderizado con matplotlib de una ``Disposicion`` ya calculada.
+
+Aquí no se decide ninguna posición: todo lo que se dibuja viene de las capas
+de ``disposicion.py``. Lo único propio del render es lo que depende del
+momento en que se dibuja (rótulo "Generado", línea de HOY) y el recuadro del
+periodo personalizado.
+
+No se usa ``pyplot``: cada render crea su propia ``Figure`` con un lienzo Agg
+explícito, sin estado global ni figura "actual", por lo que varios hilos
+pueden renderizar a la vez. ``PoolRender`` acota cuántos lo hacen.
+
+Importar este módulo carga matplotlib; la app lo importa recién al primer
+render. ``precalentar_fuentes`` adelanta, cuando se lo llama, lo que ese
+primer render pagaría además (fuentes, glifos, savefig).
+"""
+import contextvars
+import io
+import math
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import matplotlib.dates as mdates
+import matplotlib.patheffects as pe
+import numpy as np
+import pandas as pd
+from matplotlib import transforms
+from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.colors import to_rgba, to_rgba_array
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from matplotlib.lines import Line2D
+from matplotlib.patches import BoxStyle, Patch
+from matplotlib.path import Path
+from matplotlib.ticker import FuncFormatter
+
+from disposicion import fecha_es
+from perfil import tramo
+
+
+def _opcional(valor):
+    return None if pd.isnull(valor) else valor
+
+
+def dibujar_capas(ax, disp):
+    for t in disp.tallos.itertuples(index=False):
+        ax.vlines(t.x, t.y0, t.y1, color=t.color, alpha=t.alpha, linewidth=t.lw, linestyle=t.estilo, zorder=t.zorder)
+    for r in disp.ramas.itertuples(index=False):
+        ax.plot([r.x0, r.x1], [r.y, r.y], color=r.color, linewidth=r.lw, zorder=r.zorder)
+    for p in disp.puntos.itertuples(index=False):
+        extra = {} if _opcional(p.borde) is None else {'edgecolor': p.borde, 'linewidth': p.lw_borde}
+        ax.scatter(p.x, p.y, s=p.s, color=p.color, marker=p.marcador, zorder=p.zorder, **extra)
+    for f in disp.flechas.itertuples(index=False):
+        ax.annotate("", xy=(f.x1, f.y), xytext=(f.x0, f.y), arrowprops=dict(arrowstyle="->", color='#555555', lw=0.9), zorder=f.zorder)
+    for t in disp.textos_dias.itertuples(index=False):
+        ax.text(t.x, t.y, t.texto, ha='center', va=t.va, fontsize=7, color='#555555', fontweight='bold', zorder=30).set_path_effects([pe.withStroke(linewidth=2.0, foreground='white')])
+    for e in disp.etiquetas.itertuples(index=False):
+        ax.annotate(e.texto, xy=(e.x, e.y), xytext=(e.x, e.y), bbox=dict(boxstyle="round,pad=0.4", fc="white", ec=e.color, lw=1.5, alpha=e.alpha), ha='center', va='center', fontsize=e.fontsize, color='#2c3e50', zorder=10)
+
+
+# ==========================================
+# BACKEND EN LOTE
+# ==========================================
+# Una colección por tipo de primitiva (y zorder) en vez de varios artistas por
+# hito. Las cajas de etiqueta se dibujan todas en un único PathCollection cuyos
+# trazados están en puntos y se desplazan a coordenadas de datos, igual que
+# los marcadores de un scatter; los textos van sin bbox propio. Para que una
+# etiqueta tape a las anteriores que pisa (caja y texto, como las anotaciones
+# del backend clásico), las cajas van en una colección por nivel de
+# superposición (``_niveles_superposicion``) y cada texto justo encima de la
+# colección de su caja.
+
+PAD_CAJA = 0.4          # boxstyle="round,pad=0.4", en fracción del tamaño de fuente
+INTERLINEADO = 1.2
+MAX_TICKS_EJE = 36      # meses rotulados en el eje antes de espaciar los ticks
+TAMANOS_FUENTE = (7, 8, 9, 10, 18)     # los del gráfico (etiquetas, días, HOY, "Generado", título)
+# Cota inferior del lado del eje respecto de la figura. Las medidas de las
+# etiquetas en datos se calculan con ella, así que salen más grandes que las
+# reales: sobran etiquetas en el cálculo de constrained_layout o niveles de
+# superposición, nunca faltan. Medido de 5 a 2.000 hitos, el eje ocupa entre
+# el 79 % y el 91 % del ancho; hace falta más de un cuarto de figura de
+# margen por lado para bajar del 50 %.
+FRACCION_EJE_MINIMA = 0.5
+Z_ETIQUETAS = (10, 20)  # entre las anotaciones del clásico (10) y las flechas del modo estándar (20)
+_medidor = RendererAgg(1, 1, 72)      # a 72 dpi, 1 píxel = 1 punto
+_lock_medidor = threading.Lock()
+
+# Punta abierta "->" (como arrowstyle="->"), apuntando a +x, en puntos
+_PUNTA_FLECHA = Path([(-4.0, 2.0), (0.0, 0.0), (-4.0, -2.0)], [Path.MOVETO, Path.LINETO, Path.LINETO])
+_PUNTA_FLECHA_IZQ = Path(_PUNTA_FLECHA.vertices * [-1, 1], _PUNTA_FLECHA.codes)
+
+
+@lru_cache(maxsize=8192)
+def _ancho_linea(linea, fontsize):
+    with _lock_medidor:
+        return _medidor.get_text_width_height_descent(linea, FontProperties(size=fontsize), ismath=False)[0]
+
+
+@lru_cache(maxsize=4096)
+def _caja_etiqueta(texto, fontsize):
+    """Trazado de la caja redondeada de una etiqueta, centrado en (0, 0) y en puntos."""
+    lineas = texto.split("\n")
+    ancho = max(_ancho_linea(l, fontsize) for l in lineas)
+    alto = len(lineas) * fontsize * INTERLINEADO
+    pad = PAD_CAJA * fontsize
+    return BoxStyle("round", pad=pad)(-ancho / 2, -alto / 2, ancho, alto, 1.0)
+
+
+def _niveles_superposicion(x, y, medio_ancho, medio_alto):
+    """
+    Nivel de cada caja (en orden de dibujo): 0 si no pisa ninguna anterior; si
+    no, uno más que la más alta de las anteriores que pisa. Las cajas de un
+    mismo nivel no se pisan entre sí, así que pueden ir en una colección.
+    """
+    celda_x, celda_y = 2 * medio_ancho.max(), 2 * medio_alto.max()
+    if not (celda_x > 0 and celda_y > 0):
+        return np.zeros(len(x), dtype=int)
+    niveles = np.zeros(len(x), dtype=int)
+    grilla = defaultdict(list)
+    for j, (cx, cy) in enumerate(zip((x // celda_x).astype(int).tolist(), (y // celda_y).astype(int).tolist())):
+        nivel = 0
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for i in grilla.get((cx + dx, cy + dy), ()):
+                    if (niveles[i] >= nivel and abs(x[i] - x[j]) < medio_ancho[i] + medio_ancho[j]
+                            and abs(y[i] - y[j]) < medio_alto[i] + medio_alto[j]):
+                        nivel = niveles[i] + 1
+        niveles[j] = nivel
+        grilla[cx, cy].append(j)
+    return niveles
+
+
+def _a_num(serie):
+    return mdates.date2num(serie.to_numpy())
+
+
+def _coleccion_puntos(ax, paths, offsets, caras, bordes, anchos, zorder, clip_on=True):
+    col = PathCollection(paths, sizes=[1.0], offsets=offsets, offset_transform=ax.transData,
+                         transform=transforms.IdentityTransform(), clip_on=clip_on,
+                         facecolors=caras, edgecolors=bordes, linewidths=anchos, zorder=zorder)
+    ax.add_collection(col, autolim=False)
+    return col
+
+
+def dibujar_capas_en_lote(ax, disp):
+    ax.xaxis_date()
+    tallos = disp.tallos
+    if len(tallos):
+        x = _a_num(tallos.x)
+        segmentos = np.stack([np.column_stack([x, tallos.y0]), np.column_stack([x, tallos.y1])], axis=1)
+        colores = to_rgba_array(tallos.color.tolist()); colores[:, 3] = tallos.alpha
+        for z in tallos.zorder.unique():
+            m = (tallos.zorder == z).to_numpy()
+            ax.add_collection(LineCollection(segmentos[m], colors=colores[m], linewidths=tallos.lw[m],
+                                             linestyles=tallos.estilo[m].tolist(), zorder=z), autolim=False)
+
+    ramas = disp.ramas
+    if len(ramas):
+        segmentos = np.stack([np.column_stack([_a_num(ramas.x0), ramas.y]), np.column_stack([_a_num(ramas.x1), ramas.y])], axis=1)
+        ax.add_collection(LineCollection(segmentos, colors=ramas.color.tolist(), linewidths=ramas.lw,
+                                         zorder=ramas.zorder.iloc[0]), autolim=False)
+
+    puntos = disp.puntos
+    if len(puntos):
+        con_borde = puntos.borde.notna()
+        for (marcador, z, borde), grupo in puntos.groupby([puntos.marcador, puntos.zorder, con_borde], sort=False):
+            xy = np.column_stack([_a_num(grupo.x), grupo.y])
+            if borde:
+                ax.scatter(xy[:, 0], xy[:, 1], s=grupo.s, c=grupo.color.tolist(), marker=marcador, zorder=z,
+                           edgecolors=grupo.borde.tolist(), linewidths=grupo.lw_borde)
+            else:
+                ax.scatter(xy[:, 0], xy[:, 1], s=grupo.s, c=grupo.color.tolist(), marker=marcador, zorder=z)
+
+    flechas = disp.flechas
+    if len(flechas):
+        x0, x1 = _a_num(flechas.x0), _a_num(flechas.x1)
+        segmentos = np.stack([np.column_stack([x0, flechas.y]), np.column_stack([x1, flechas.y])], axis=1)
+        for z in flechas.zorder.unique():
+            m = (flechas.zorder == z).to_numpy()
+            ax.add_collection(LineCollection(segmentos[m], colors='#555555', linewidths=0.9, zorder=z), autolim=False)
+            puntas = [_PUNTA_FLECHA if a >= b else _PUNTA_FLECHA_IZQ for a, b in zip(x1[m], x0[m])]
+            _coleccion_puntos(ax, puntas, np.column_stack([x1[m], flechas.y[m]]), 'none', '#555555', 0.9, z)
+
+    trazo_blanco = [pe.withStroke(linewidth=2.0, foreground='white')]
+    for t in disp.textos_dias.itertuples(index=False):
+        ax.text(t.x, t.y, t.texto, ha='center', va=t.va, fontsize=7, color='#555555', fontweight='bold', zorder=30, path_effects=trazo_blanco)
+
+    etiquetas = disp.etiquetas
+    if len(etiquetas):
+        cajas = [_caja_etiqueta(texto, fs) for texto, fs in zip(etiquetas.texto, etiquetas.fontsize)]
+        bordes = to_rgba_array(etiquetas.color.tolist()); bordes[:, 3] = etiquetas.alpha
+        caras = np.tile(to_rgba('white'), (len(etiquetas), 1)); caras[:, 3] = etiquetas.alpha
+        x, y = _a_num(etiquetas.x), etiquetas.y.to_numpy(dtype=float)
+        offsets = np.column_stack([x, y])
+        # Tamaño de cada caja en datos, sobreestimado (ver FRACCION_EJE_MINIMA)
+        figura = ax.figure
+        dias_por_punto = (disp.f_fin - disp.f_inicio).days / (figura.get_figwidth() * 72 * FRACCION_EJE_MINIMA)
+        y_por_punto = (disp.y_lim[1] - disp.y_lim[0]) / (figura.get_figheight() * 72 * FRACCION_EJE_MINIMA)
+        extensiones = [c.get_extents() for c in cajas]
+        medio_ancho = np.array([e.width / 2 for e in extensiones]) * dias_por_punto
+        medio_alto = np.array([e.height / 2 for e in extensiones]) * y_por_punto
+
+        niveles = _niveles_superposicion(x, y, medio_ancho, medio_alto)
+        paso = min(1e-3, (Z_ETIQUETAS[1] - Z_ETIQUETAS[0]) / (2 * (niveles.max() + 1)))
+        for nivel in np.unique(niveles):
+            m = niveles == nivel
+            # Sin recorte, como el bbox de las anotaciones del backend clásico
+            _coleccion_puntos(ax, [c for c, en in zip(cajas, m) if en], offsets[m], caras[m], bordes[m], 1.5,
+                              Z_ETIQUETAS[0] + 2 * nivel * paso, clip_on=False)
+
+        # constrained_layout solo necesita las etiquetas que pueden salirse del eje;
+        # las interiores quedan fuera del cálculo y se maquetan una sola vez al dibujar.
+        x_min, x_max = mdates.date2num(disp.f_inicio), mdates.date2num(disp.f_fin)
+        en_borde = (x - medio_ancho < x_min) | (x + medio_ancho > x_max)
+        for e, nivel, borde in zip(etiquetas.itertuples(index=False), niveles.tolist(), en_borde.tolist()):
+            ax.text(e.x, e.y, e.texto, ha='center', va='center', fontsize=e.fontsize, color='#2c3e50',
+                    zorder=Z_ETIQUETAS[0] + (2 * nivel + 1) * paso, in_layout=borde)
+
+
+BACKENDS = {'clasico': dibujar_capas, 'lotes': dibujar_capas_en_lote}
+_precalentado = threading.Event()
+
+
+def precalentar_fuentes(forzar=False):
+    """
+    Resuelve las fuentes del gráfico en el font manager, carga sus glifos en
+    Agg y pasa una figura mínima por savefig, para que el primer render no lo
+    pague. Sólo la primera llamada trabaja (salvo ``forzar``).
+    """
+    if _precalentado.is_set() and not forzar:
+        return
+    with tramo("grafico.precalentar"):
+        muestra = "Línea de Tiempo: HOY 0123456789 ÁÉÍÓÚÑáéíóúñ (días)"
+        for tamano in TAMANOS_FUENTE:
+            _ancho_linea(muestra, tamano)
+        fig = Figure(figsize=(2, 1))
+        FigureCanvasAgg(fig)
+        try:
+            ax = fig.add_subplot()
+            ax.set_xlim(datetime(2000, 1, 1), datetime(2000, 12, 31))
+            ax.xaxis.set_major_formatter(FuncFormatter(lambda x, p: fecha_es(mdates.num2date(x), "eje")))
+            ax.set_title(muestra, fontsize=18, fontweight='bold')
+            ax.text(0.5, 0.5, muestra, transform=ax.transAxes, fontsize=7, fontweight='bold',
+                    path_effects=[pe.withStroke(linewidth=2.0, foreground='white')])
+            ax.legend(handles=[Patch(facecolor='#2c3e50', label=muestra)], title=muestra)
+            fig.savefig(io.BytesIO(), format='png', dpi=72)
+        finally:
+            fig.clear()
+            fig.canvas = None
+    _precalentado.set()
+
+
+def renderizar_disposicion(disp, mostrar_hoy, tipo_rango, backend='lotes'):
+    f_inicio, f_fin = disp.f_inicio, disp.f_fin
+    fig = Figure(figsize=(16, 9), layout='constrained')
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.axhline(0, color="#34495e", linewidth=2, zorder=1)
+    fig.text(0.015, 0.98, f"Generado: {datetime.now().strftime('%d/%m/%Y')}", fontsize=10, color='#555555')
+
+    with tramo("grafico.dibujar", backend=backend) as t:
+        BACKENDS[backend](ax, disp)
+        t["artistas"] = len(ax.get_children())
+
+    ax.spines['left'].set_visible(False); ax.spines['right'].set_visible(False); ax.spines['top'].set_visible(False); ax.yaxis.set_visible(False)
+    ax.set_xlim(f_inicio, f_fin)
+    ax.set_ylim(*disp.y_lim)
+
+    if mostrar_hoy and (f_inicio <= datetime.now() <= f_fin):
+        hoy = datetime.now()
+        ax.axvline(hoy, color='#e74c3c', linestyle='--', alpha=0.8, linewidth=1.5, zorder=0)
+        offset_dias_hoy = (f_fin - f_inicio).days * 0.008
+        ax.text(hoy - timedelta(days=offset_dias_hoy), disp.y_hoy, f"HOY\n{fecha_es(hoy, 'hoy_full')}", color='#e74c3c', fontsize=9, fontweight='bold', ha='right', va='top')
+
+    # Un tick por mes hasta tres años; en rangos más largos (portafolio) se espacian
+    meses = (f_fin.year - f_inicio.year) * 12 + f_fin.month - f_inicio.month + 1
+    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=max(1, math.ceil(meses / MAX_TICKS_EJE))))
+    ax.xaxis.set_major_formatter(FuncFormatter(lambda x, p: fecha_es(mdates.num2date(x), "eje")))
+
+    titulo_limpio = disp.titulo.replace('_', ' ')
+    ax.set_title(f"Línea de Tiempo: {titulo_limpio}", fontsize=18, fontweight='bold', color='#2c3e50', pad=25)
+
+    leyenda = [Patch(facecolor=color, label=agente) for agente, color in disp.leyenda]
+    leyenda.append(Line2D([0],[0], color='#555555', lw=1, marker='>', label='Días Retraso'))
+    ax.legend(handles=leyenda, title="Agentes Responsables", loc='upper center', bbox_to_anchor=(0.5, -0.14), ncol=4, fancybox=True, shadow=True)
+
+    if tipo_rango == 3:
+        txt_rango = f"Periodo Personalizado:\n{f_inicio.strftime('%d/%m/%Y')} - {f_fin.strftime('%d/%m/%Y')}"
+        ax.text(0.0, -0.14, txt_rango, transform=ax.transAxes, fontsize=9, color='#555555', va='top', ha='left', bbox=dict(boxstyle="round,pad=0.4", fc="#ecf0f1", ec="#bdc3c7", lw=1))
+
+    return fig
+
+
+def exportar_disposicion(disp, mostrar_hoy, tipo_rango, formato='png', dpi=100, backend='lotes'):
+    """Renderiza y serializa a ``formato`` ('png', 'svg' o 'pdf'); la figura se libera al terminar."""
+    fig = renderizar_disposicion(disp, mostrar_hoy, tipo_rango, backend=backend)
+    try:
+        with tramo("grafico.savefig", formato=formato, dpi=dpi) as t:
+            salida = io.BytesIO()
+            fig.savefig(salida, format=formato, dpi=dpi, bbox_inches='tight', pad_inches=0.2)
+            t["bytes"] = salida.tell()
+        return salida.getvalue()
+    finally:
+        fig.clear()
+        fig.canvas = None
+
+
+class PoolRender:
+    """
+    Hilos de render acotados. ``max_pendientes`` limita los trabajos en cola:
+    si se llena, ``exportar`` espera un cupo (hasta ``timeout``) en vez de
+    acumular figuras en memoria.
+    """
+
+    def __init__(self, hilos=2, max_pendientes=8):
+        self.hilos = hilos
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="render")
+        self._cupos = threading.BoundedSemaphore(hilos + max_pendientes)
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.completados = 0
+        self.errores = 0
+
+    def _trabajo(self, *args):
+        with self._lock: self.en_curso += 1
+        try:
+            return exportar_disposicion(*args)
+        except Exception:
+            with self._lock: self.errores += 1
+            raise
+        finally:
+            with self._lock:
+                self.en_curso -= 1
+                self.completados += 1
+            self._cupos.release()
+
+    def exportar(self, disp, mostrar_hoy, tipo_rango, formato='png', dpi=100, backend='lotes', timeout=120):
+        with tramo("grafico.pool", formato=formato):
+            if not self._cupos.acquire(timeout=timeout):
+                raise TimeoutError("No hay cupo en el pool de render.")
+            try:
+                # El contexto viaja al hilo de render para que sus tramos caigan en la traza del rerun
+                futuro = self._ejecutor.submit(contextvars.copy_context().run, self._trabajo,
+                                               disp, mostrar_hoy, tipo_rango, formato, dpi, backend)
+            except BaseException:
+                self._cupos.release()
+                raise
+            return futuro.result(timeout=timeout)
+
+    def estadisticas(self):
+        with self._lock:
+            return {"hilos": self.hilos, "en_curso": self.en_curso, "completados": self.completados, "errores": self.errores}
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True)
+
@@ -0,0 +1,347 @@
+"""
+Historial de fechas de los hitos a lo largo de los commits del libro.
+
+Cada commit que cambió el xlsx en un clon local de git (``git log
+--first-parent``, sin red) se ingiere una sola vez: se leen sus hojas con
+``lector.leer_hojas`` y de cada hito se toma la fecha vigente (la espejo de
+``hojas.tipar_hoja`` si existe; si no, 'Fecha_Vigente'). Sólo se guardan las
+diferencias con la versión anterior, en formato columnar:
+
+    versiones   commit, fecha del commit y blob del xlsx
+    hitos       id -> 'Hoja', 'Hito / Etapa', 'Agente', 'Ordinal'
+    deltas      (version, hito, evento, fecha, dias) con evento 'alta',
+                'cambio' o 'baja' y ``dias`` el corrimiento de un cambio
+
+La identidad de un hito es (hoja, texto del hito, agente, ordinal entre
+repetidos): no depende de la fila, así que insertar filas no lo rompe. Si el
+texto del hito cambia, cuenta como baja del anterior y alta del nuevo.
+
+``actualizar`` ingiere sólo los commits nuevos (un blob repetido no se vuelve
+a leer). Si la historia se reescribió, el historial se reconstruye. Con
+``directorio`` y ``pyarrow``, el historial se guarda en disco como Feather
+y sobrevive a los reinicios.
+
+Las consultas salen del historial, sin volver a abrir ningún xlsx:
+``estado_al`` (las fechas tal como estaban en un momento), ``deriva``
+(corrimiento de cada hito entre dos fechas), ``tendencia`` (cambios y días
+corridos por periodo) y ``historial_hito``.
+
+Uso:
+    python historico.py --repo . --desde 2026-04-01
+"""
+import argparse
+import json
+import os
+import subprocess
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from hojas import COLUMNAS_LEIDAS, hojas_visibles, tipar_hoja
+from lector import leer_hojas, nombres_hojas
+from perfil import tramo
+
+# Sube cuando cambia qué se guarda por versión: invalida los historiales en disco
+VERSION_HISTORIAL = 1
+EVENTOS = ("alta", "cambio", "baja")
+_SIN_BLOB = "0" * 40
+
+
+class HistorialNoDisponible(Exception):
+    """No hay un clon de git utilizable (o git no está instalado)."""
+
+
+def _git(repo, *argumentos):
+    try:
+        return subprocess.run(["git", "-C", repo, *argumentos], capture_output=True, check=True).stdout
+    except FileNotFoundError as e:
+        raise HistorialNoDisponible("git no está instalado.") from e
+    except subprocess.CalledProcessError as e:
+        raise HistorialNoDisponible(e.stderr.decode("utf-8", "replace").strip() or str(e)) from e
+
+
+def commits_del_archivo(repo, ruta):
+    """``[(commit, fecha_unix, blob)]`` de los commits que cambiaron ``ruta``, del más antiguo al más nuevo."""
+    salida = _git(repo, "log", "--first-parent", "--reverse", "--raw", "--no-abbrev", "--no-renames",
+                  "--format=commit %H %ct", "--", ruta).decode("utf-8")
+    commits, actual = [], None
+    for linea in salida.splitlines():
+        if linea.startswith("commit "):
+            _, commit, fecha = linea.split()
+            actual = (commit, int(fecha))
+        elif linea.startswith(":") and actual is not None:
+            # :modo_antes modo_despues blob_antes blob_despues estado\truta
+            blob = linea.split("\t", 1)[0].split()[3]
+            if blob != _SIN_BLOB:               # el archivo se borró en ese commit
+                commits.append((*actual, blob))
+            actual = None
+    return commits
+
+
+def fechas_hitos(contenido):
+    """
+    Fecha vigente de cada hito de las hojas visibles, con su identidad:
+    DataFrame con 'Hoja', 'Hito / Etapa', 'Agente', 'Ordinal' y 'Fecha'.
+    """
+    hojas = hojas_visibles(nombres_hojas(contenido))
+    partes = []
+    for hoja, df in leer_hojas(contenido, hojas, COLUMNAS_LEIDAS).items():
+        df = tipar_hoja(df)
+        col_fecha = 'Fecha_Vigente_Espejo' if 'Fecha_Vigente_Espejo' in df.columns else 'Fecha_Vigente'
+        if col_fecha not in df.columns or 'Hito / Etapa' not in df.columns:
+            continue
+        parte = pd.DataFrame({
+            'Hoja': hoja,
+            'Hito / Etapa': df['Hito / Etapa'].fillna("").astype(str).str.strip(),
+            'Agente': df['Agente'].fillna("").astype(str).str.strip() if 'Agente' in df.columns else "",
+            'Fecha': df[col_fecha].astype('datetime64[ns]'),
+        })
+        parte = parte[parte['Hito / Etapa'] != ""]
+        parte['Ordinal'] = parte.groupby(['Hito / Etapa', 'Agente']).cumcount()
+        partes.append(parte)
+    if not partes:
+        return pd.DataFrame({c: pd.Series(dtype=object) for c in ('Hoja', 'Hito / Etapa', 'Agente', 'Ordinal')}
+                            | {'Fecha': pd.Series(dtype='datetime64[ns]')})
+    return pd.concat(partes, ignore_index=True)
+
+
+def _claves(df):
+    return (df['Hoja'] + "\x1f" + df['Hito / Etapa'] + "\x1f" + df['Agente'] + "\x1f"
+            + df['Ordinal'].astype(str)).to_numpy(dtype=object)
+
+
+def _deltas_vacios():
+    return pd.DataFrame({
+        'version': pd.Series(dtype=np.int32), 'hito': pd.Series(dtype=np.int32),
+        'evento': pd.Categorical([], categories=EVENTOS), 'fecha': pd.Series(dtype='datetime64[ns]'),
+        'dias': pd.Series(dtype=np.float32),
+    })
+
+
+class HistorialLibro:
+
+    def __init__(self, repo, ruta, directorio=None):
+        self.repo = repo
+        self.ruta = ruta
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._reiniciar()
+        self._leer_disco()
+
+    def _reiniciar(self):
+        self.versiones = []                 # [{'commit', 'fecha', 'blob'}] en orden
+        self._hitos = {'Hoja': [], 'Hito / Etapa': [], 'Agente': [], 'Ordinal': []}
+        self._ids = {}                      # clave -> id de hito
+        self._partes = []                   # deltas por versión, sin concatenar
+        self._deltas = _deltas_vacios()
+        self._estado = pd.Series(dtype='datetime64[ns]')      # hito -> fecha en la última versión
+
+    # --- COPIA EN DISCO (OPCIONAL) ---
+    def _dir(self):
+        return os.path.join(self.directorio, f"v{VERSION_HISTORIAL}")
+
+    def _leer_disco(self):
+        if not self.directorio: return
+        try:
+            with open(os.path.join(self._dir(), "versiones.json"), "r", encoding="utf-8") as f:
+                versiones = json.load(f)
+            hitos = pd.read_feather(os.path.join(self._dir(), "hitos.feather"))
+            deltas = pd.read_feather(os.path.join(self._dir(), "deltas.feather"))
+        except (OSError, ValueError, ImportError):
+            return
+        self.versiones = versiones
+        self._hitos = {c: hitos[c].tolist() for c in self._hitos}
+        self._ids = dict(zip(_claves(hitos), range(len(hitos))))
+        self._deltas = deltas.astype({'evento': pd.CategoricalDtype(EVENTOS)})
+        ultimas = self._deltas.drop_duplicates('hito', keep='last')
+        ultimas = ultimas[ultimas['evento'] != "baja"]
+        self._estado = pd.Series(ultimas['fecha'].to_numpy(), index=ultimas['hito'].to_numpy())
+
+    def _escribir_disco(self):
+        if not self.directorio: return
+        try:
+            os.makedirs(self._dir(), exist_ok=True)
+            ruta_versiones = os.path.join(self._dir(), "versiones.json")
+            if os.path.exists(ruta_versiones):
+                os.remove(ruta_versiones)
+            self.hitos.to_feather(os.path.join(self._dir(), "hitos.feather"))
+            self.deltas.to_feather(os.path.join(self._dir(), "deltas.feather"))
+            # versiones.json se escribe al final: sin él el historial no se considera completo
+            with open(ruta_versiones, "w", encoding="utf-8") as f:
+                json.dump(self.versiones, f)
+        except (OSError, ValueError, ImportError):
+            # Sin disco escribible o sin pyarrow el historial sigue en memoria
+            pass
+
+    # --- INGESTA INCREMENTAL ---
+    def _ingerir(self, version, contenido):
+        actuales = fechas_hitos(contenido)
+        claves = _claves(actuales)
+        ids = pd.Series(claves).map(self._ids)
+        nuevas = ids.isna().to_numpy()
+        for clave in claves[nuevas]:
+            self._ids.setdefault(clave, len(self._ids))
+        for columna, valores in self._hitos.items():
+            valores.extend(actuales.loc[nuevas, columna].tolist())
+        ids = pd.Series(claves).map(self._ids).to_numpy(dtype=np.int32)
+        fechas = pd.Series(actuales['Fecha'].to_numpy(), index=ids)
+
+        antes = self._estado
+        altas = fechas.index.difference(antes.index)
+        bajas = antes.index.difference(fechas.index)
+        comunes = fechas.index.intersection(antes.index)
+        previas, nuevas_fechas = antes[comunes], fechas[comunes]
+        distintas = ~((previas == nuevas_fechas) | (previas.isna() & nuevas_fechas.isna())).to_numpy()
+        cambios = comunes[distintas]
+        partes = [
+            ("alta", altas, fechas[altas].to_numpy(), np.nan),
+            ("cambio", cambios, fechas[cambios].to_numpy(), (fechas[cambios] - antes[cambios]).dt.days.to_numpy()),
+            ("baja", bajas, np.full(len(bajas), np.datetime64("NaT"), dtype='datetime64[ns]'), np.nan),
+        ]
+        delta = pd.concat([pd.DataFrame({
+            'version': np.int32(version), 'hito': np.asarray(hitos, dtype=np.int32),
+            'evento': pd.Categorical([evento] * len(hitos), categories=EVENTOS),
+            'fecha': pd.Series(valores, dtype='datetime64[ns]'), 'dias': np.asarray(dias, dtype=np.float32),
+        }) for evento, hitos, valores, dias in partes], ignore_index=True)
+        self._partes.append(delta)
+        self._estado = fechas
+        return len(delta)
+
+    def actualizar(self):
+        """Ingiere los commits nuevos del archivo; devuelve cuántas versiones se agregaron."""
+        with self._lock, tramo("historial.actualizar") as t:
+            commits = commits_del_archivo(self.repo, self.ruta)
+            conocidos = [v['commit'] for v in self.versiones]
+            if [c for c, _, _ in commits[:len(conocidos)]] != conocidos:
+                t["reconstruido"] = bool(conocidos)        # historia reescrita (o historial ajeno)
+                self._reiniciar()
+            pendientes = commits[len(self.versiones):]
+            blob_previo = self.versiones[-1]['blob'] if self.versiones else None
+            leidas = 0
+            for commit, fecha, blob in pendientes:
+                if blob != blob_previo:
+                    with tramo("historial.ingerir", commit=commit[:8]) as ti:
+                        ti["deltas"] = self._ingerir(len(self.versiones), _git(self.repo, "cat-file", "blob", blob))
+                    leidas += 1
+                self.versiones.append({'commit': commit, 'fecha': fecha, 'blob': blob})
+                blob_previo = blob
+            t.update(versiones=len(pendientes), leidas=leidas)
+            if pendientes:
+                self._escribir_disco()
+            return len(pendientes)
+
+    # --- TABLAS ---
+    @property
+    def hitos(self):
+        """'Hoja', 'Hito / Etapa', 'Agente' y 'Ordinal' (entre repetidos) de cada id de hito."""
+        return pd.DataFrame(self._hitos)
+
+    @property
+    def deltas(self):
+        if self._partes:
+            self._deltas = pd.concat([self._deltas, *self._partes], ignore_index=True)
+            self._partes = []
+        return self._deltas
+
+    def _fechas_versiones(self):
+        # Hora local, como las fechas que llegan de la app (datetime.now())
+        return pd.DatetimeIndex([datetime.fromtimestamp(v['fecha']) for v in self.versiones], dtype='datetime64[ns]')
+
+    def version_al(self, momento):
+        """Última versión con commit hasta ``momento`` (inclusive); -1 si no hay ninguna."""
+        return int(self._fechas_versiones().searchsorted(pd.Timestamp(momento).as_unit('ns'), side='right')) - 1
+
+    def _acotar(self, df, hoja):
+        df = df.join(self.hitos, on='hito')
+        return df if hoja is None else df[df['Hoja'] == hoja]
+
+    # --- CONSULTAS ---
+    def hojas(self):
+        return list(dict.fromkeys(self._hitos['Hoja']))
+
+    def estado_al(self, momento, hoja=None):
+        """
+        Hitos tal como estaban en el último commit hasta ``momento``: 'Hoja',
+        'Hito / Etapa', 'Agente' y 'Fecha_Vigente', en el orden del libro.
+        """
+        deltas = self.deltas
+        deltas = deltas[deltas['version'] <= self.version_al(momento)]
+        ultimas = deltas.drop_duplicates('hito', keep='last')
+        ultimas = ultimas[ultimas['evento'] != "baja"].sort_values('hito')
+        df = self._acotar(ultimas[['hito', 'fecha']], hoja)
+        return (df.rename(columns={'fecha': 'Fecha_Vigente'})
+                [['hito', 'Hoja', 'Hito / Etapa', 'Agente', 'Fecha_Vigente']].reset_index(drop=True))
+
+    def deriva(self, desde, hasta=None, hoja=None):
+        """
+        Por hito vigente en ``hasta`` (ahora si es None): fecha en ``desde`` y en
+        ``hasta``, días corridos y cantidad de cambios entre ambas, de mayor a
+        menor atraso absoluto. Un hito que no existía en ``desde`` no tiene
+        fecha inicial.
+        """
+        hasta = pd.Timestamp.now() if hasta is None else hasta
+        inicial = self.estado_al(desde, hoja).set_index('hito')['Fecha_Vigente'].rename('Fecha_Inicial')
+        df = self.estado_al(hasta, hoja).set_index('hito').rename(columns={'Fecha_Vigente': 'Fecha_Final'})
+        deltas = self.deltas
+        tramo_deltas = deltas[(deltas['version'] > self.version_al(desde))
+                              & (deltas['version'] <= self.version_al(hasta)) & (deltas['evento'] == "cambio")]
+        df = df.join(inicial).join(tramo_deltas.groupby('hito').size().rename('Cambios'))
+        df['Cambios'] = df['Cambios'].fillna(0).astype(int)
+        df['Dias'] = (df['Fecha_Final'] - df['Fecha_Inicial']).dt.days
+        df = df[['Hoja', 'Hito / Etapa', 'Agente', 'Fecha_Inicial', 'Fecha_Final', 'Dias', 'Cambios']]
+        return df.iloc[np.argsort(-df['Dias'].abs().fillna(-1).to_numpy(), kind='stable')]
+
+    def tendencia(self, desde=None, hasta=None, hoja=None, frecuencia="MS"):
+        """
+        Por periodo de ``frecuencia``: hitos con cambio de fecha, cuántos se
+        atrasaron y adelantaron, y días corridos en neto.
+        """
+        deltas = self.deltas
+        deltas = self._acotar(deltas[deltas['evento'] == "cambio"], hoja)
+        df = pd.DataFrame({
+            'Fecha': self._fechas_versiones()[deltas['version'].to_numpy()],
+            'Cambios': 1, 'Atrasos': (deltas['dias'] > 0).to_numpy(dtype=int),
+            'Adelantos': (deltas['dias'] < 0).to_numpy(dtype=int), 'Dias_Netos': deltas['dias'].to_numpy(),
+        })
+        if desde is not None: df = df[df['Fecha'] >= pd.Timestamp(desde)]
+        if hasta is not None: df = df[df['Fecha'] <= pd.Timestamp(hasta)]
+        return df.set_index('Fecha').resample(frecuencia).sum()
+
+    def historial_hito(self, hito):
+        """Cada versión en que cambió el hito ``hito``: fecha del commit, evento, fecha vigente y días corridos."""
+        deltas = self.deltas
+        df = deltas[deltas['hito'] == hito]
+        return pd.DataFrame({
+            'Commit': [self.versiones[v]['commit'][:8] for v in df['version']],
+            'Fecha_Commit': self._fechas_versiones()[df['version'].to_numpy()],
+            'Evento': df['evento'].astype(str).to_numpy(), 'Fecha_Vigente': df['fecha'].to_numpy(),
+            'Dias': df['dias'].to_numpy(),
+        })
+
+    def estadisticas(self):
+        return {"versiones": len(self.versiones), "hitos": len(self._ids), "deltas": len(self.deltas),
+                "bytes_deltas": int(self.deltas.memory_usage(deep=True).sum())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", default=".", help="clon local de git")
+    parser.add_argument("--ruta", default="db_decreto10.xlsx", help="ruta del libro dentro del repositorio")
+    parser.add_argument("--directorio", help="carpeta donde guardar el historial entre corridas")
+    parser.add_argument("--desde", help="fecha inicial de la deriva (por defecto, hace seis meses)")
+    parser.add_argument("--hoja")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    historial = HistorialLibro(args.repo, args.ruta, args.directorio)
+    nuevas = historial.actualizar()
+    print(f"{nuevas} versión(es) nueva(s); {historial.estadisticas()}")
+    desde = pd.Timestamp(args.desde) if args.desde else pd.Timestamp.now() - pd.DateOffset(months=6)
+    print(historial.tendencia(desde, hoja=args.hoja).to_string())
+    print(historial.deriva(desde, hoja=args.hoja).head(args.top).to_string())
+
+
+if __name__ == "__main__":
+    main()
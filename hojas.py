@@ -0,0 +1,202 @@
+"""
+Almacén de hojas normalizadas, parseadas una sola vez por versión del libro.
+
+Cada versión (hash SHA-256 del xlsx) se parsea completa la primera vez que se
+pide: todas las hojas visibles pasan por ``normalizar_columnas``, se tipan las
+columnas de fecha y se calculan las columnas derivadas. El resultado queda en
+memoria (LRU por versión) y, si ``pyarrow`` está instalado, en disco como
+Feather para que un reinicio no vuelva a pasar por openpyxl.
+
+Del Excel se leen sólo las columnas de ``COLUMNAS_LEIDAS`` (``lector.py``):
+las que reconoce ``normalizar_columnas``, las de fecha y las que muestra el
+editor. ``AlmacenHojas(proyectar=False)`` vuelve a leer las hojas completas.
+
+Las columnas derivadas para dibujar ('Etiqueta' y 'Color', ver
+``disposicion.enriquecer_hoja``) se calculan aquí, una vez por versión.
+"""
+import io
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import CacheLRU
+from disposicion import enriquecer_hoja, envolver_columna
+from indice import IndiceHitos
+from lector import MOTOR_RAPIDO, leer_hojas
+from perfil import tramo
+
+COLUMNAS_FECHA = ['Fecha_Real_Manual', 'Fecha_Proyectada', 'Fecha_teorica', 'Fecha_Vigente']
+# Sube cuando cambian las columnas que agrega preparar_hoja: invalida las copias en disco
+VERSION_PREPARACION = 4
+# Vista combinada de todas las hojas; los corchetes no son válidos en un nombre de hoja de Excel
+PORTAFOLIO = "[Portafolio]"
+
+
+ALIAS_COLUMNAS = {
+    'Fecha_Vigente': ['Fecha_Vigente', 'Fecha Vigente', 'Fecha Real', 'Fecha_Real_Manual', 'Fecha Actual', 'Fecha_Real'],
+    'Fecha_teorica': ['Fecha_teórica', 'Fecha_teorica', 'Fecha Teórica', 'Fecha Teorica', 'Fecha_Proyectada', 'Fecha Proyectada', 'Fecha Planificada'],
+    'Hito / Etapa': ['Hito / Etapa', 'Hito', 'Etapa', 'Nombre Hito', 'Actividad'],
+    'Agente': ['Agente', 'Responsable', 'Actor', 'Encargado']
+}
+# Columnas del editor de fechas (app.py), en el orden en que se muestran
+COLUMNAS_EDITOR = [
+    "Norma", "Proceso", "Hito / Etapa", "Agente",
+    # "Fecha_teorica" (ELIMINADA de la vista)
+    "Fecha_Real_Manual",
+    "Fecha_Vigente",
+    "Respuesta/Interactua", "Descripción"
+]
+COLUMNAS_LEIDAS = frozenset(
+    [v for variantes in ALIAS_COLUMNAS.values() for v in variantes] + COLUMNAS_FECHA + COLUMNAS_EDITOR
+)
+
+
+def normalizar_columnas(df):
+    df.columns = df.columns.str.strip()
+    renombres = {}
+    for estandar, variantes in ALIAS_COLUMNAS.items():
+        for variante in variantes:
+            if variante in df.columns:
+                renombres[variante] = estandar
+                break
+    df = df.rename(columns=renombres)
+    return df
+
+
+def _compactar_mixtas(df):
+    # Columnas con valores de distinto tipo (ej. Plazo: 20 y '-') pasan a texto
+    # para que el formato columnar las acepte; los nulos se conservan.
+    for col in df.columns[df.dtypes == object]:
+        no_nulos = df[col].dropna()
+        if no_nulos.map(type).nunique() > 1:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def tipar_hoja(df):
+    """Normaliza las columnas, tipa las fechas y calcula 'Fecha_Vigente_Espejo'."""
+    df = normalizar_columnas(df)
+    for col in COLUMNAS_FECHA:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    # Cálculo espejo: si hay fecha manual -> manual. Si no -> Proyectada.
+    if 'Fecha_Proyectada' in df.columns and 'Fecha_Real_Manual' in df.columns:
+        df['Fecha_Vigente_Espejo'] = df['Fecha_Real_Manual'].fillna(df['Fecha_Proyectada'])
+    return df
+
+
+def preparar_hoja(df):
+    """Normaliza y tipa una hoja recién leída del Excel y agrega las columnas para dibujar."""
+    return enriquecer_hoja(_compactar_mixtas(tipar_hoja(df)))
+
+
+def hojas_visibles(nombres):
+    return [h for h in nombres if not h.startswith('_')]
+
+
+def combinar_hojas(frames):
+    """
+    Todas las hojas con fechas en un solo frame cronológico, con su
+    'Normativa'. Colores y etiquetas se recalculan sobre el conjunto para que
+    cada agente tenga un único color y cada caja diga de qué normativa es.
+    """
+    # 'Hoja' y 'Fila' (posición en su hoja) ubican cada hito en el índice (indice.IndiceHitos.ids)
+    partes = [df.assign(Normativa=nombre.replace('_', ' '), Hoja=nombre, Fila=np.arange(len(df)))
+              for nombre, df in frames.items() if {'Fecha_Vigente', 'Agente'} <= set(df.columns)]
+    if not partes:
+        return pd.DataFrame({'Fecha_Vigente': pd.Series(dtype='datetime64[ns]'), 'Agente': pd.Series(dtype=object)})
+    df = pd.concat([p.drop(columns=['Color', 'Etiqueta'], errors='ignore') for p in partes], ignore_index=True)
+    df = enriquecer_hoja(df.sort_values('Fecha_Vigente', kind='stable').reset_index(drop=True))
+    df['Etiqueta'] = envolver_columna(df['Normativa'], 25) + "\n" + df['Etiqueta'].to_numpy(dtype=object)
+    return df
+
+
+class AlmacenHojas:
+
+    def __init__(self, max_versiones=3, directorio=None, proyectar=True, motor=None):
+        self.directorio = directorio
+        self.proyectar = proyectar
+        self.motor = motor
+        self._memoria = CacheLRU(max_entradas=max_versiones)
+        self._portafolios = CacheLRU(max_entradas=max_versiones)
+        self._indices = CacheLRU(max_entradas=max_versiones)
+        self._lock_excel = threading.Lock()
+
+    # --- COPIA EN DISCO (OPCIONAL) ---
+    def _dir_version(self, sha):
+        version = f"v{VERSION_PREPARACION}" if self.proyectar else f"v{VERSION_PREPARACION}-completa"
+        return os.path.join(self.directorio, version, sha)
+
+    def _leer_disco(self, sha):
+        if not self.directorio: return None
+        ruta_indice = os.path.join(self._dir_version(sha), "hojas.json")
+        try:
+            with open(ruta_indice, "r", encoding="utf-8") as f:
+                nombres = json.load(f)
+            return {nombre: pd.read_feather(os.path.join(self._dir_version(sha), f"{i}.feather"))
+                    for i, nombre in enumerate(nombres)}
+        except (OSError, ValueError, ImportError):
+            return None
+
+    def _escribir_disco(self, sha, frames):
+        if not self.directorio: return
+        destino = self._dir_version(sha)
+        try:
+            os.makedirs(destino, exist_ok=True)
+            for i, df in enumerate(frames.values()):
+                df.to_feather(os.path.join(destino, f"{i}.feather"))
+            # El índice se escribe al final: sin él la versión no se considera completa
+            with open(os.path.join(destino, "hojas.json"), "w", encoding="utf-8") as f:
+                json.dump(list(frames), f, ensure_ascii=False)
+        except Exception:
+            pass
+
+    # --- PARSEO ÚNICO POR VERSIÓN ---
+    def _parsear(self, libro, t):
+        with tramo("hojas.leer_disco"):
+            frames = self._leer_disco(libro.sha)
+        if frames is not None:
+            t["cache"] = "disco"
+            return frames
+        t["cache"] = "miss"
+        with tramo("hojas.read_excel") as tr, self._lock_excel:
+            nombres = hojas_visibles(libro.hojas)
+            if self.proyectar:
+                tr["motor"] = self.motor or MOTOR_RAPIDO or "openpyxl"
+                crudos = leer_hojas(libro.contenido, nombres, COLUMNAS_LEIDAS, self.motor)
+            else:
+                tr["motor"] = "pandas"
+                crudos = pd.read_excel(io.BytesIO(libro.contenido), sheet_name=nombres, engine="openpyxl")
+            tr["hojas"] = len(crudos)
+        with tramo("hojas.preparar") as tp:
+            frames = {nombre: preparar_hoja(df) for nombre, df in crudos.items()}
+            tp["filas"] = sum(len(df) for df in frames.values())
+        with tramo("hojas.escribir_disco"):
+            self._escribir_disco(libro.sha, frames)
+        return frames
+
+    def hojas(self, libro):
+        """Diccionario ``{hoja: DataFrame}`` de la versión; no modificar los frames."""
+        with tramo("hojas.obtener", cache="hit") as t:
+            return self._memoria.obtener_o_calcular(libro.sha, lambda: self._parsear(libro, t))
+
+    def portafolio(self, libro):
+        """Todas las hojas combinadas (``combinar_hojas``), calculado una vez por versión; no modificar."""
+        return self._portafolios.obtener_o_calcular(libro.sha, lambda: combinar_hojas(self.hojas(libro)))
+
+    def indice(self, libro):
+        """Índice de búsqueda y facetas de todas las hojas (``indice.IndiceHitos``), uno por versión."""
+        with tramo("hojas.indice", cache="hit" if libro.sha in self._indices else "miss"):
+            return self._indices.obtener_o_calcular(libro.sha, lambda: IndiceHitos(self.hojas(libro)))
+
+    def obtener(self, libro, hoja):
+        """Copia de la hoja normalizada (o de ``PORTAFOLIO``), libre para que el llamador la modifique."""
+        if hoja == PORTAFOLIO:
+            return self.portafolio(libro).copy()
+        return self.hojas(libro)[hoja].copy()
+
+    def estadisticas(self):
+        return self._memoria.estadisticas()
@@ -0,0 +1,157 @@
+"""
+Índice invertido de los hitos de todas las hojas, una vez por versión del libro.
+
+Cada fila de cada hoja recibe un id global (las hojas van una tras otra en el
+orden del libro). Se indexan:
+
+    tokens    palabras de 'Hito / Etapa', 'Agente', 'Proceso', 'Norma' y
+              'Descripción', en mayúsculas y sin tildes
+    facetas   valor exacto de 'Normativa' (la hoja), 'Agente', 'Proceso' y
+              'Norma', y 'Alcance' (Zonal / Nacional / Común según el texto
+              del hito, como el antiguo filtro de proceso)
+
+Una consulta es texto libre más facetas. Cada palabra del texto se busca como
+prefijo (``"valor"`` encuentra VALORIZACIÓN) y todas deben aparecer; dentro
+de una faceta los valores se suman y entre facetas se intersectan. Todo se
+resuelve con intersecciones de conjuntos de ids, sin recorrer las columnas.
+"""
+import bisect
+import functools
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+CAMPOS_TEXTO = ('Hito / Etapa', 'Agente', 'Proceso', 'Norma', 'Descripción')
+FACETAS = ('Normativa', 'Alcance', 'Agente', 'Proceso', 'Norma')
+# Alcance -> texto que lo marca en 'Hito / Etapa' (en mayúsculas, con tildes)
+ALCANCES = {"Zonal": "ZONAL", "Nacional": "NACIONAL", "Común": "COMÚN"}
+_RE_TOKEN = r'[A-Z0-9]+'
+
+
+def plegar(textos):
+    """Serie de textos en mayúsculas y sin tildes, la forma en que se indexan."""
+    return (pd.Series(textos, dtype=object).fillna("").astype(str)
+            .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.upper())
+
+
+def tokens(texto):
+    """Palabras de una consulta, plegadas igual que ``plegar``."""
+    plegado = unicodedata.normalize('NFKD', texto or "").encode('ascii', 'ignore').decode('ascii').upper()
+    return re.findall(_RE_TOKEN, plegado)
+
+
+def _postings(claves, ids):
+    """``{clave: frozenset(ids)}`` agrupando ``ids`` por ``claves`` (arrays del mismo largo)."""
+    codigos, unicas = pd.factorize(claves)
+    orden = np.argsort(codigos, kind='stable')
+    limites = np.concatenate([[0], np.cumsum(np.bincount(codigos, minlength=len(unicas)))])
+    ids = ids[orden]
+    return {clave: frozenset(ids[a:b].tolist()) for clave, a, b in zip(unicas, limites[:-1], limites[1:])}
+
+
+class IndiceHitos:
+
+    def __init__(self, frames):
+        self.rangos = {}                # hoja -> (primer id, cantidad de filas)
+        textos, facetas = [], {faceta: [] for faceta in FACETAS}
+        inicio = 0
+        for hoja, df in frames.items():
+            n = len(df)
+            self.rangos[hoja] = (inicio, n)
+            ids = np.arange(inicio, inicio + n)
+            presentes = [df[c].fillna("").astype(str).to_numpy(dtype=object) for c in CAMPOS_TEXTO if c in df.columns]
+            if presentes:
+                textos.append(pd.Series(functools.reduce(lambda a, b: a + " " + b, presentes), index=ids))
+            facetas['Normativa'].append(pd.Series(hoja.replace('_', ' '), index=ids))
+            for faceta in ('Agente', 'Proceso', 'Norma'):
+                if faceta in df.columns:
+                    facetas[faceta].append(pd.Series(df[faceta].to_numpy(), index=ids))
+            if 'Hito / Etapa' in df.columns:
+                hito = df['Hito / Etapa'].astype(str).str.upper()
+                for alcance, marca in ALCANCES.items():
+                    marcadas = ids[hito.str.contains(marca, regex=False).to_numpy()]
+                    facetas['Alcance'].append(pd.Series(alcance, index=marcadas))
+            inicio += n
+        self.total = inicio
+
+        self._tokens = {}
+        if textos:
+            por_fila = plegar(pd.concat(textos)).str.findall(_RE_TOKEN).explode().dropna()
+            pares = pd.DataFrame({'token': por_fila.to_numpy(), 'id': por_fila.index}).drop_duplicates()
+            self._tokens = _postings(pares['token'].to_numpy(dtype=object), pares['id'].to_numpy())
+        self._vocabulario = sorted(self._tokens)
+        self._facetas = {}
+        for faceta, partes in facetas.items():
+            valores = pd.concat(partes).dropna() if partes else pd.Series(dtype=object)
+            valores = valores[valores.astype(str).str.strip() != ""]
+            self._facetas[faceta] = _postings(valores.astype(str).to_numpy(dtype=object), valores.index.to_numpy())
+        self._prefijos, self._conteos = {}, {}
+        self._lock = threading.Lock()
+
+    # --- CONSULTAS ---
+    def _prefijo(self, token):
+        with self._lock:
+            if token not in self._prefijos:
+                desde = bisect.bisect_left(self._vocabulario, token)
+                hasta = bisect.bisect_left(self._vocabulario, token + "\x7f")
+                self._prefijos[token] = frozenset().union(*(self._tokens[t] for t in self._vocabulario[desde:hasta]))
+            return self._prefijos[token]
+
+    def seleccionar(self, texto="", facetas=None):
+        """
+        Ids que cumplen ``texto`` y ``facetas`` (``{faceta: valores}``), o None si
+        la consulta no restringe nada.
+        """
+        conjuntos = [self._prefijo(t) for t in tokens(texto or "")]
+        for faceta, valores in (facetas or {}).items():
+            if valores:
+                postings = self._facetas.get(faceta, {})
+                conjuntos.append(frozenset().union(*(postings.get(str(v), frozenset()) for v in valores)))
+        if not conjuntos:
+            return None
+        conjuntos.sort(key=len)
+        return conjuntos[0].intersection(*conjuntos[1:])
+
+    def ids(self, df, hoja):
+        """Id global de cada fila de ``df``: una hoja tal como se leyó o el portafolio (columnas 'Hoja'/'Fila')."""
+        if hoja in self.rangos:
+            inicio, n = self.rangos[hoja]
+            if len(df) != n:
+                raise ValueError(f"La hoja '{hoja}' no coincide con la versión indexada.")
+            return np.arange(inicio, inicio + n)
+        inicios = df['Hoja'].map({h: i for h, (i, _) in self.rangos.items()})
+        return (inicios + df['Fila']).to_numpy(dtype=np.int64)
+
+    def mascara(self, df, hoja, seleccion):
+        """Máscara booleana de las filas de ``df`` en ``seleccion``; None si ``seleccion`` es None."""
+        if seleccion is None:
+            return None
+        marcados = np.zeros(self.total, dtype=bool)
+        marcados[np.fromiter(seleccion, dtype=np.int64, count=len(seleccion))] = True
+        return marcados[self.ids(df, hoja)]
+
+    def conteos(self, faceta, hoja=None, seleccion=None):
+        """``{valor: hitos}`` de la faceta, de mayor a menor, acotado a la hoja y/o a ``seleccion``."""
+        if seleccion is None:
+            with self._lock:
+                if (faceta, hoja) not in self._conteos:
+                    self._conteos[faceta, hoja] = self._contar(faceta, hoja, None)
+                return self._conteos[faceta, hoja]
+        return self._contar(faceta, hoja, seleccion)
+
+    def _contar(self, faceta, hoja, seleccion):
+        acotar = None
+        if hoja in self.rangos:
+            inicio, n = self.rangos[hoja]
+            acotar = range(inicio, inicio + n)
+        conteos = {}
+        for valor, ids in self._facetas.get(faceta, {}).items():
+            if seleccion is not None:
+                ids = ids & seleccion
+            cantidad = len(ids) if acotar is None else sum(1 for i in ids if i in acotar)
+            if cantidad:
+                conteos[valor] = cantidad
+        return dict(sorted(conteos.items(), key=lambda kv: (-kv[1], kv[0])))
@@ -0,0 +1,108 @@
+"""
+Salida interactiva: la ``Disposicion`` como carga compacta para el navegador.
+
+En vez de renderizar con matplotlib y enviar un PNG en cada cambio, las capas
+ya posicionadas de ``disposicion.py`` se serializan a JSON columnar y el
+componente de ``componentes/linea_tiempo`` las dibuja en SVG, con zoom (rueda)
+y desplazamiento (arrastre) del eje de tiempo sin volver al servidor.
+
+La carga no depende del momento en que se muestra: la línea de HOY se pasa
+aparte (``marca_hoy``), así que una carga se calcula una vez por disposición.
+Formato (versión ``VERSION_CARGA``):
+
+    x          días (fracción incluida) desde ``origen`` (fecha ISO de f_inicio)
+    colores    paleta; las capas guardan el índice del color
+    capas      una por tabla de ``COLUMNAS_CAPAS``, como listas por columna
+
+matplotlib (``grafico.py``) sigue siendo el camino de las exportaciones.
+"""
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from disposicion import MESES_CORTOS, fecha_es
+
+VERSION_CARGA = 1
+RUTA_COMPONENTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "componentes", "linea_tiempo")
+DECIMALES_X = 3         # ~1,5 minutos: de sobra a cualquier zoom útil
+# Capa -> {clave en la carga: columna de la tabla}; 'c'/'b' pasan por la paleta
+CAMPOS_CAPAS = {
+    'tallos':      {'x': 'x', 'y0': 'y0', 'y1': 'y1', 'c': 'color', 'a': 'alpha', 'lw': 'lw', 'e': 'estilo'},
+    'ramas':       {'x0': 'x0', 'x1': 'x1', 'y': 'y', 'c': 'color', 'lw': 'lw'},
+    'puntos':      {'x': 'x', 'y': 'y', 's': 's', 'c': 'color', 'm': 'marcador', 'z': 'zorder', 'b': 'borde', 'bw': 'lw_borde'},
+    'flechas':     {'x0': 'x0', 'x1': 'x1', 'y': 'y'},
+    'textos_dias': {'x': 'x', 'y': 'y', 't': 'texto', 'va': 'va'},
+    'etiquetas':   {'x': 'x', 'y': 'y', 't': 'texto', 'c': 'color', 'fs': 'fontsize', 'a': 'alpha'},
+}
+
+
+def _lista(numeros, decimales):
+    # JSON no admite NaN: los faltantes van como null
+    numeros = np.round(numeros, decimales)
+    return [None if math.isnan(v) else v for v in numeros.tolist()]
+
+
+def _dias(fechas, origen):
+    dias = (pd.to_datetime(fechas) - origen) / pd.Timedelta(days=1)
+    return _lista(dias.to_numpy(dtype=float), DECIMALES_X)
+
+
+def _numeros(valores):
+    return _lista(pd.to_numeric(valores).to_numpy(dtype=float), 3)
+
+
+def carga_disposicion(disp):
+    """Diccionario serializable (ver el docstring del módulo) con todo lo que dibuja el componente."""
+    origen = pd.Timestamp(disp.f_inicio)
+    paleta = {}
+
+    def indice_color(color):
+        if pd.isnull(color):
+            return -1
+        return paleta.setdefault(color, len(paleta))
+
+    capas = {}
+    for nombre, campos in CAMPOS_CAPAS.items():
+        tabla = getattr(disp, nombre)
+        capa = {}
+        for clave, columna in campos.items():
+            valores = tabla[columna]
+            if columna in ('x', 'x0', 'x1'):
+                capa[clave] = _dias(valores, origen)
+            elif columna in ('color', 'borde'):
+                capa[clave] = [indice_color(c) for c in valores]
+            elif pd.api.types.is_numeric_dtype(valores):
+                capa[clave] = _numeros(valores)
+            else:
+                capa[clave] = ["" if pd.isnull(v) else str(v) for v in valores]
+        capas[nombre] = capa
+
+    return {
+        'v': VERSION_CARGA,
+        'titulo': f"Línea de Tiempo: {disp.titulo.replace('_', ' ')}",
+        'modo': disp.modo,
+        'origen': origen.strftime("%Y-%m-%d"),
+        'x': [0.0, _dias([disp.f_fin], origen)[0]],
+        'y': [float(disp.y_lim[0]), float(disp.y_lim[1])],
+        'y_hoy': float(disp.y_hoy),
+        'n_hitos': int(disp.n_hitos),
+        'meses': MESES_CORTOS[1:].tolist(),
+        'leyenda': [[str(agente), indice_color(color)] for agente, color in disp.leyenda],
+        'colores': list(paleta),
+        'capas': capas,
+    }
+
+
+def serializar(disp):
+    """JSON compacto de ``carga_disposicion``."""
+    return json.dumps(carga_disposicion(disp), ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+
+def marca_hoy(disp, hoy):
+    """Posición y rótulo de la línea de HOY para la carga de ``disp``; None si ``hoy`` queda fuera del rango."""
+    if not disp.f_inicio <= hoy <= disp.f_fin:
+        return None
+    return {'x': _dias([hoy], pd.Timestamp(disp.f_inicio))[0], 'texto': f"HOY\n{fecha_es(hoy, 'hoy_full')}"}
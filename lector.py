@@ -0,0 +1,277 @@
+"""
+Lectura proyectada del xlsx: sólo las columnas que la app usa.
+
+``pd.read_excel`` convierte cada celda de cada columna en un objeto de Python
+y arma el DataFrame completo antes de que ``normalizar_columnas`` descarte lo
+que no sirve. Aquí, del encabezado se eligen las columnas pedidas y sólo esas
+celdas se convierten. Hay tres motores:
+
+    xml        recorre el XML de la hoja con expresiones regulares, como
+               ``parche_xlsx``, y salta sin convertir las celdas de otras
+               columnas (por defecto)
+    openpyxl   modo de sólo lectura, fila a fila; es la referencia y el
+               respaldo cuando el XML no tiene la forma que ``xml`` espera
+    calamine   ``pd.read_excel(engine="calamine")`` con ``usecols``, si
+               ``python-calamine`` está instalado (se prefiere a ``xml``)
+
+Las filas finales vacías en esas columnas se descartan; las intermedias se
+conservan, porque la posición de cada fila es su fila en el Excel (ver
+``parche_xlsx.cambios_columna``). La inferencia de tipos es la de
+``pd.read_excel`` (``TextParser`` con los mismos valores nulos), así que el
+resultado coincide columna a columna con leer la hoja completa.
+
+``nombres_hojas`` y ``encabezados`` sirven para listar el libro sin
+materializar datos. openpyxl se importa sólo si se usa (motor ``openpyxl`` o
+``encabezados``): el camino ``xml`` no lo carga.
+"""
+import datetime
+import io
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from html import unescape
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from parche_xlsx import NS_MAIN, es_fecha1904, indices_estilos_fecha, ruta_hoja, textos_compartidos
+
+try:
+    import python_calamine  # noqa: F401
+    MOTOR_RAPIDO = "calamine"
+except ImportError:
+    MOTOR_RAPIDO = "xml"
+
+MOTORES = ("xml", "openpyxl", "calamine")
+
+# Excel (y openpyxl/xlsxwriter) escriben siempre ``r`` como primer atributo de la celda
+# Se busca sobre los bytes del XML, sin decodificar la hoja entera
+_RE_CELDA_REF = re.compile(rb'<c r="([A-Z]+)(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_RE_INICIO_CELDA = re.compile(rb'<c\b')
+_RE_TIPO = re.compile(rb'\st="([^"]*)"')
+_RE_ESTILO = re.compile(rb'\ss="([^"]*)"')
+_RE_VALOR = re.compile(rb'<v>(.*?)</v>', re.S)
+_RE_TEXTO = re.compile(rb'<t\b[^>]*>(.*?)</t>', re.S)
+TAMANO_TROZO = 1 << 18      # bytes de XML descomprimido que se procesan por vez
+# Épocas de ``openpyxl.utils.datetime`` (CALENDAR_WINDOWS_1900 / CALENDAR_MAC_1904)
+EPOCA_1900 = datetime.datetime(1899, 12, 30)
+EPOCA_1904 = datetime.datetime(1904, 1, 1)
+
+
+def nombres_hojas(contenido):
+    """Hojas del libro en orden, leídas de ``xl/workbook.xml`` sin abrir ninguna."""
+    with zipfile.ZipFile(io.BytesIO(contenido)) as zin:
+        libro = ET.fromstring(zin.read("xl/workbook.xml"))
+    return [nodo.get("name") for nodo in libro.iter(f"{{{NS_MAIN}}}sheet")]
+
+
+def _abrir(contenido):
+    import openpyxl
+    return openpyxl.load_workbook(io.BytesIO(contenido), read_only=True, data_only=True, keep_links=False)
+
+
+def encabezados(contenido, hojas=None):
+    """``{hoja: [columnas]}`` leyendo sólo la primera fila de cada hoja."""
+    wb = _abrir(contenido)
+    try:
+        resultado = {}
+        for hoja in hojas if hojas is not None else wb.sheetnames:
+            ws = wb[hoja]
+            ws.reset_dimensions()
+            fila = next(ws.iter_rows(max_row=1, values_only=True), ())
+            resultado[hoja] = [v for v in fila if v is not None]
+        return resultado
+    finally:
+        wb.close()
+
+
+def _celda(valor, errores=frozenset()):
+    # Igual que el lector openpyxl de pandas: vacío -> "", error -> NaN, 3.0 -> 3
+    # ``errores`` son los ERROR_CODES de openpyxl; el camino xml los detecta por el tipo
+    if valor is None:
+        return ""
+    if isinstance(valor, float):
+        entero = int(valor) if np.isfinite(valor) else None
+        return entero if entero == valor else valor
+    if isinstance(valor, str) and valor in errores:
+        return np.nan
+    return valor
+
+
+def _recortar(filas):
+    ultima = len(filas)
+    while ultima and all(isinstance(v, str) and v == "" for v in filas[ultima - 1]):
+        ultima -= 1
+    return filas[:ultima]
+
+
+def _armar(nombres, datos):
+    datos = _recortar(datos)
+    if not nombres or not datos:
+        return pd.DataFrame(columns=nombres)
+    return TextParser([nombres] + datos, header=0, skip_blank_lines=False).read()
+
+
+def _elegir(encabezado, columnas):
+    """Posiciones y nombres de las ``columnas`` pedidas; ante nombres repetidos, la primera."""
+    elegidas, nombres = [], []
+    for i, valor in enumerate(encabezado):
+        nombre = "" if valor is None else str(valor)
+        if nombre.strip() in columnas and nombre not in nombres:
+            elegidas.append(i)
+            nombres.append(nombre)
+    return elegidas, nombres
+
+
+def _leer_openpyxl(contenido, hojas, columnas):
+    from openpyxl.cell.cell import ERROR_CODES
+    errores = frozenset(ERROR_CODES)
+    wb = _abrir(contenido)
+    try:
+        frames = {}
+        for hoja in hojas:
+            ws = wb[hoja]
+            ws.reset_dimensions()
+            filas = ws.iter_rows(values_only=True)
+            elegidas, nombres = _elegir(next(filas, ()), columnas)
+            ancho = elegidas[-1] + 1 if elegidas else 1
+            frames[hoja] = _armar(nombres, [[_celda(fila[i], errores) if i < len(fila) else "" for i in elegidas]
+                                            for fila in ws.iter_rows(min_row=2, max_col=ancho, values_only=True)])
+        return frames
+    finally:
+        wb.close()
+
+
+def _desde_excel(numero, epoca):
+    # ``openpyxl.utils.datetime.from_excel``: redondeo al milisegundo, fracción
+    # pura -> hora, y el 29/02/1900 inexistente del calendario 1900
+    dia, fraccion = divmod(numero, 1)
+    resto = datetime.timedelta(milliseconds=round(fraccion * 86400 * 1000))
+    if 0 <= numero < 1 and resto.days == 0:
+        minutos, segundos = divmod(resto.seconds, 60)
+        return datetime.time(minutos // 60, minutos % 60, segundos, resto.microseconds)
+    if 0 < numero < 60 and epoca == EPOCA_1900:
+        dia += 1
+    return epoca + datetime.timedelta(days=dia) + resto
+
+
+def _valor_xml(atributos, cuerpo, compartidos, estilos_fecha, epoca):
+    # Mismo resultado que openpyxl (data_only) pasado por ``_celda``
+    tipo = _RE_TIPO.search(atributos)
+    tipo = tipo.group(1) if tipo else b"n"
+    if tipo == b"inlineStr":
+        return unescape(b"".join(_RE_TEXTO.findall(cuerpo or b"")).decode("utf-8"))
+    valor = _RE_VALOR.search(cuerpo) if cuerpo else None
+    if valor is None:
+        return ""
+    valor = valor.group(1)
+    if tipo == b"s":
+        return compartidos[int(valor)]
+    if tipo == b"str":
+        return unescape(valor.decode("utf-8"))
+    if tipo == b"e":
+        return np.nan
+    if tipo == b"b":
+        return valor == b"1"
+    numero = float(valor) if any(c in valor for c in b".eE") else int(valor)
+    estilo = _RE_ESTILO.search(atributos)
+    if estilo and estilo.group(1).decode("ascii") in estilos_fecha:
+        return _desde_excel(numero, epoca)
+    return _celda(numero)
+
+
+def _trozos(zin, ruta, tamano=TAMANO_TROZO):
+    """El ``sheetData`` de la hoja en trozos que terminan siempre en ``</row>``; None si no hay ``sheetData``."""
+    with zin.open(ruta) as f:
+        resto, inicio = b"", -1
+        while True:
+            leido = f.read(tamano)
+            resto += leido
+            if inicio < 0:
+                inicio = resto.find(b"<sheetData")
+                if inicio < 0:
+                    if not leido:
+                        yield None          # prefijos de espacio de nombres, etc.
+                        return
+                    continue
+                resto = resto[inicio:]
+            corte = resto.rfind(b"</row>") + len(b"</row>") if leido else len(resto)
+            if corte > len(b"</row>") - 1:
+                yield resto[:corte]
+                resto = resto[corte:]
+            if not leido:
+                return
+
+
+def _leer_xml(contenido, hojas, columnas):
+    """None si algún XML no tiene la forma esperada; entonces se lee con openpyxl."""
+    frames = {}
+    with zipfile.ZipFile(io.BytesIO(contenido)) as zin:
+        epoca = EPOCA_1904 if es_fecha1904(zin.read("xl/workbook.xml").decode("utf-8")) else EPOCA_1900
+        estilos_fecha = indices_estilos_fecha(zin)
+        compartidos = textos_compartidos(zin)
+        for hoja in hojas:
+            encabezado, posicion = {}, None
+            valores = []                            # por columna, desde la fila 2
+            for trozo in _trozos(zin, ruta_hoja(zin, hoja)):
+                if trozo is None:
+                    return None
+                leidas = 0
+                for m in _RE_CELDA_REF.finditer(trozo):
+                    leidas += 1
+                    if posicion is None:
+                        if m.group(2) == b"1":
+                            encabezado[m.group(1)] = _valor_xml(m.group(3), m.group(4), compartidos, estilos_fecha, epoca)
+                            continue
+                        letras = sorted(encabezado, key=lambda l: (len(l), l))
+                        elegidas, nombres = _elegir([encabezado[l] for l in letras], columnas)
+                        posicion = {letras[i]: j for j, i in enumerate(elegidas)}
+                        valores = [[] for _ in elegidas]
+                    j = posicion.get(m.group(1))
+                    if j is None:
+                        continue
+                    columna, indice = valores[j], int(m.group(2)) - 2
+                    if len(columna) < indice:
+                        columna.extend([""] * (indice - len(columna)))
+                    columna.append(_valor_xml(m.group(3), m.group(4), compartidos, estilos_fecha, epoca))
+                # Cada <c> tiene que haber pasado por la expresión; si no, hay celdas que no se leyeron
+                if leidas != sum(1 for _ in _RE_INICIO_CELDA.finditer(trozo)):
+                    return None
+            if posicion is None:                    # sólo encabezado (o nada)
+                letras = sorted(encabezado, key=lambda l: (len(l), l))
+                nombres = _elegir([encabezado[l] for l in letras], columnas)[1]
+            alto = max(map(len, valores), default=0)
+            for columna in valores:
+                columna.extend([""] * (alto - len(columna)))
+            frames[hoja] = _armar(nombres, [list(fila) for fila in zip(*valores)])
+    return frames
+
+
+def _leer_calamine(contenido, hojas, columnas):
+    crudos = pd.read_excel(io.BytesIO(contenido), sheet_name=list(hojas), engine="calamine",
+                           usecols=lambda c: str(c).strip() in columnas)
+    frames = {}
+    for hoja, df in crudos.items():
+        con_datos = np.flatnonzero(df.notna().any(axis=1).to_numpy())
+        frames[hoja] = df.iloc[:con_datos[-1] + 1 if len(con_datos) else 0]
+    return frames
+
+
+def leer_hojas(contenido, hojas, columnas, motor=None):
+    """
+    ``{hoja: DataFrame}`` con sólo las ``columnas`` pedidas (comparadas sin
+    espacios a los lados). ``motor`` None usa calamine si está instalado y
+    si no ``xml``.
+    """
+    motor = motor or MOTOR_RAPIDO or "openpyxl"
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de lectura desconocido: {motor}")
+    columnas = frozenset(columnas)
+    if motor == "calamine":
+        return _leer_calamine(contenido, hojas, columnas)
+    if motor == "xml":
+        frames = _leer_xml(contenido, hojas, columnas)
+        if frames is not None:
+            return frames
+    return _leer_openpyxl(contenido, hojas, columnas)
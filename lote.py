@@ -0,0 +1,302 @@
+"""
+Render por lotes de todas las líneas de tiempo, sin Streamlit.
+
+Uso:
+    python lote.py [--libro db_decreto10.xlsx | URL] [--salida graficos]
+                   [--rangos anual movil] [--desde 2025-01-01 --hasta 2025-12-31]
+                   [--hojas HOJA ...] [--formatos png svg pdf] [--dpi 150]
+                   [--procesos N] [--sin-hoy] [--forzar] [--portafolio]
+
+Cada hoja × rango × filtro de proceso (Todo y, si la hoja los tiene, Zonal y
+Nacional) se arma con las mismas funciones que la app (``vistas``,
+``calcular_disposicion``, ``renderizar_disposicion``) y se reparte en un pool
+de procesos; cada vista se dibuja una vez y se guarda en todos los formatos
+pedidos:
+
+    <salida>/<hoja>/<rango>_<filtro>.png|svg
+    <salida>/<hoja>.pdf          una página por vista
+    <salida>/manifiesto.json
+
+Con ``--portafolio`` se agrega la vista de todas las hojas juntas como la
+hoja ``[Portafolio]``. Las vistas con más hitos de los que caben se agrupan
+como en la app (``detalle.agrupar_por_detalle``).
+
+El manifiesto guarda la huella de entrada de cada archivo (filas de la vista,
+rango, opciones de dibujo, código de detalle.py/disposicion.py/grafico.py y, si se dibuja
+la línea de HOY, la fecha del día). Si la huella no cambió y el archivo existe
+no se vuelve a dibujar, aunque el rótulo "Generado" conserve la fecha en que
+se hizo; ``--forzar`` dibuja todo de nuevo.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import pandas as pd
+from matplotlib.backends.backend_pdf import PdfPages
+
+from descarga import DIRECTORIO_CACHE_DEFECTO, AlmacenContenido, descargar_condicional, transformar_url_onedrive
+from detalle import agrupar_por_detalle
+from disposicion import calcular_disposicion
+from grafico import renderizar_disposicion
+from hojas import PORTAFOLIO, AlmacenHojas
+from refresco import LibroVersionado
+from vistas import datos_grafico, filtros_disponibles, rango_fechas, seleccion_vista, titulo_hoja
+
+RANGOS = {  # nombre corto en la línea de comandos -> opción de la app
+    "anual": "Año Calendario Actual",
+    "movil": "Ventana Móvil (-12/+12 meses)",
+    "personalizado": "Personalizado",
+}
+FORMATOS_IMAGEN = ("png", "svg")
+MANIFIESTO = "manifiesto.json"
+ARCHIVOS_DIBUJO = ("detalle.py", "disposicion.py", "grafico.py")
+
+
+@dataclass
+class Vista:
+    hoja: str
+    rango: str
+    filtro: str
+    f_inicio: datetime
+    f_fin: datetime
+    tipo_rango: int
+    df_plot: pd.DataFrame
+    huella: str = ""
+    formatos: list = field(default_factory=list)   # imágenes a (re)escribir
+
+    @property
+    def nombre(self):
+        return f"{self.rango}_{self.filtro.lower()}"
+
+
+@dataclass
+class TrabajoHoja:
+    hoja: str
+    vistas: list
+    ruta_pdf: str | None       # None si el PDF de la hoja está al día
+    directorio: str
+    dpi: int
+    mostrar_hoy: bool
+
+
+# --- CARGA ---
+def cargar_libro(origen):
+    """Libro desde un archivo local o una URL (con el almacén condicional de la app)."""
+    if origen.startswith(("http://", "https://")):
+        from clientes import crear_sesion
+        resultado = descargar_condicional(transformar_url_onedrive(origen), AlmacenContenido(),
+                                          sesion=crear_sesion(), timeout=30)
+        return LibroVersionado.desde_contenido(resultado.contenido)
+    with open(origen, "rb") as f:
+        return LibroVersionado.desde_contenido(f.read())
+
+
+def huella_codigo():
+    h = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for nombre in ARCHIVOS_DIBUJO:
+        with open(os.path.join(base, nombre), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def huella_vista(vista, codigo, dpi, mostrar_hoy):
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(vista.df_plot, index=False).values.tobytes())
+    h.update(repr(list(vista.df_plot.columns)).encode())
+    hoy = datetime.now().strftime("%Y-%m-%d") if mostrar_hoy else ""
+    h.update(repr((vista.hoja, vista.f_inicio, vista.f_fin, vista.tipo_rango, vista.filtro,
+                   dpi, mostrar_hoy, hoy, codigo)).encode())
+    return h.hexdigest()
+
+
+def armar_vistas(frames, indice, rangos, desde=None, hasta=None):
+    """Vistas con datos de cada hoja; devuelve ``(vistas, omitidas)`` con el motivo de cada omisión."""
+    vistas, omitidas = [], []
+    for hoja, df in frames.items():
+        for rango in rangos:
+            f_inicio, f_fin, tipo_rango = rango_fechas(RANGOS[rango], inicio=desde, fin=hasta)
+            for filtro in filtros_disponibles(indice, hoja):
+                mascara = indice.mascara(df, hoja, seleccion_vista(indice, filtro))
+                df_plot = datos_grafico(df, f_inicio, f_fin, mascara)
+                if df_plot is None:
+                    omitidas.append((hoja, rango, filtro, "sin columna Fecha_Vigente"))
+                elif df_plot.empty:
+                    omitidas.append((hoja, rango, filtro, "sin hitos en el rango"))
+                else:
+                    vistas.append(Vista(hoja, rango, filtro, f_inicio, f_fin, tipo_rango, df_plot))
+    return vistas, omitidas
+
+
+# --- TRABAJO DE CADA PROCESO ---
+def _escribir_atomico(ruta, escribir):
+    temporal = ruta + ".tmp"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+
+def renderizar_hoja(trabajo):
+    """Dibuja las vistas de una hoja y devuelve las rutas escritas."""
+    os.makedirs(os.path.join(trabajo.directorio, trabajo.hoja), exist_ok=True)
+    escritos = []
+    temporal_pdf = trabajo.ruta_pdf + ".tmp" if trabajo.ruta_pdf else None
+    pdf = PdfPages(temporal_pdf) if temporal_pdf else None
+    try:
+        for vista in trabajo.vistas:
+            if not vista.formatos and pdf is None:
+                continue
+            df_plot = agrupar_por_detalle(vista.df_plot, vista.f_inicio, vista.f_fin)
+            disp = calcular_disposicion(df_plot, titulo_hoja(vista.hoja), vista.f_inicio, vista.f_fin)
+            fig = renderizar_disposicion(disp, trabajo.mostrar_hoy, vista.tipo_rango)
+            try:
+                for formato in vista.formatos:
+                    ruta = os.path.join(trabajo.directorio, trabajo.hoja, f"{vista.nombre}.{formato}")
+                    _escribir_atomico(ruta, lambda destino: fig.savefig(
+                        destino, format=formato, dpi=trabajo.dpi, bbox_inches='tight', pad_inches=0.2))
+                    escritos.append(ruta)
+                if pdf is not None:
+                    pdf.savefig(fig, bbox_inches='tight', pad_inches=0.2)
+            finally:
+                fig.clear()
+                fig.canvas = None
+    except BaseException:
+        if pdf is not None:
+            pdf.close()
+            os.remove(temporal_pdf)
+        raise
+    if pdf is not None:
+        pdf.close()
+        os.replace(temporal_pdf, trabajo.ruta_pdf)
+        escritos.append(trabajo.ruta_pdf)
+    return escritos
+
+
+# --- PLANIFICACIÓN ---
+def _leer_manifiesto(directorio):
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_manifiesto(directorio, manifiesto):
+    ruta = os.path.join(directorio, MANIFIESTO)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=1, ensure_ascii=False, sort_keys=True)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def planificar(vistas, directorio, formatos, dpi, mostrar_hoy, manifiesto, forzar=False):
+    """
+    Reparte lo que falta dibujar; devuelve ``(trabajos, huellas_nuevas, al_dia)``.
+
+    Una hoja cuyo PDF hay que rehacer es un solo trabajo; si no, cada vista
+    con imágenes pendientes va por separado para repartir mejor el pool.
+    """
+    codigo = huella_codigo()
+    por_hoja, huellas, al_dia = {}, {}, 0
+
+    def pendiente(ruta, huella):
+        nonlocal al_dia
+        relativa = os.path.relpath(ruta, directorio)
+        huellas[relativa] = huella
+        if not forzar and manifiesto.get(relativa) == huella and os.path.exists(ruta):
+            al_dia += 1
+            return False
+        return True
+
+    for vista in vistas:
+        vista.huella = huella_vista(vista, codigo, dpi, mostrar_hoy)
+        vista.formatos = [formato for formato in formatos if formato in FORMATOS_IMAGEN and pendiente(
+            os.path.join(directorio, vista.hoja, f"{vista.nombre}.{formato}"), vista.huella)]
+        por_hoja.setdefault(vista.hoja, []).append(vista)
+
+    trabajos = []
+    for hoja, vistas_hoja in por_hoja.items():
+        ruta_pdf = None
+        if "pdf" in formatos:
+            ruta = os.path.join(directorio, f"{hoja}.pdf")
+            huella_pdf = hashlib.sha256("".join(v.huella for v in vistas_hoja).encode()).hexdigest()
+            ruta_pdf = ruta if pendiente(ruta, huella_pdf) else None
+        if ruta_pdf:
+            # Las páginas del PDF se escriben en un solo proceso
+            trabajos.append(TrabajoHoja(hoja, vistas_hoja, ruta_pdf, directorio, dpi, mostrar_hoy))
+        else:
+            trabajos += [TrabajoHoja(hoja, [v], None, directorio, dpi, mostrar_hoy) for v in vistas_hoja if v.formatos]
+    return trabajos, huellas, al_dia
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--libro", default="db_decreto10.xlsx", help="ruta local o URL (OneDrive/SharePoint incluidas)")
+    parser.add_argument("--salida", default="graficos")
+    parser.add_argument("--hojas", nargs="+", help="por defecto, todas las visibles")
+    parser.add_argument("--rangos", nargs="+", choices=list(RANGOS), help="por defecto anual y movil (+ personalizado con --desde/--hasta)")
+    parser.add_argument("--desde", type=pd.Timestamp, help="inicio del rango personalizado (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=pd.Timestamp, help="fin del rango personalizado (AAAA-MM-DD)")
+    parser.add_argument("--formatos", nargs="+", choices=FORMATOS_IMAGEN + ("pdf",), default=["png", "pdf"])
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    parser.add_argument("--sin-hoy", action="store_true", help="no dibujar la línea de HOY")
+    parser.add_argument("--forzar", action="store_true", help="dibujar todo aunque la huella no haya cambiado")
+    parser.add_argument("--portafolio", action="store_true", help="agregar la vista de todas las hojas juntas")
+    args = parser.parse_args(argv)
+
+    rangos = args.rangos or ["anual", "movil"] + (["personalizado"] if args.desde is not None else [])
+    if "personalizado" in rangos and (args.desde is None or args.hasta is None):
+        parser.error("el rango personalizado necesita --desde y --hasta")
+
+    inicio = time.perf_counter()
+    libro = cargar_libro(args.libro)
+    almacen = AlmacenHojas(max_versiones=1, directorio=os.path.join(DIRECTORIO_CACHE_DEFECTO, "hojas"))
+    frames = almacen.hojas(libro)
+    if args.hojas:
+        faltantes = set(args.hojas) - set(frames)
+        if faltantes:
+            parser.error(f"hojas inexistentes: {', '.join(sorted(faltantes))}")
+        frames = {hoja: frames[hoja] for hoja in args.hojas}
+    if args.portafolio:
+        # ``hojas`` entrega el dict del caché (el mismo que indexa ``indice``): se agrega sobre una copia
+        frames = {**frames, PORTAFOLIO: almacen.portafolio(libro)}
+
+    vistas, omitidas = armar_vistas(frames, almacen.indice(libro), rangos, args.desde, args.hasta)
+    for hoja, rango, filtro, motivo in omitidas:
+        print(f"  omitida {hoja} / {rango} / {filtro}: {motivo}")
+
+    os.makedirs(args.salida, exist_ok=True)
+    manifiesto = _leer_manifiesto(args.salida)
+    trabajos, huellas, al_dia = planificar(vistas, args.salida, args.formatos, args.dpi, not args.sin_hoy,
+                                           manifiesto, args.forzar)
+    print(f"{len(vistas)} vistas en {len(frames)} hojas; {al_dia} archivos al día, {len(trabajos)} trabajos por dibujar")
+
+    errores = 0
+    if trabajos:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.procesos, len(trabajos)))) as pool:
+            futuros = {pool.submit(renderizar_hoja, trabajo): trabajo for trabajo in trabajos}
+            for futuro in as_completed(futuros):
+                hoja = futuros[futuro].hoja
+                try:
+                    escritos = futuro.result()
+                except Exception as e:
+                    errores += 1
+                    print(f"  ERROR {hoja}: {e}", file=sys.stderr)
+                    continue
+                for ruta in escritos:
+                    relativa = os.path.relpath(ruta, args.salida)
+                    manifiesto[relativa] = huellas[relativa]
+                _guardar_manifiesto(args.salida, manifiesto)
+                print(f"  {hoja}: {len(escritos)} archivos")
+
+    print(f"Listo en {time.perf_counter() - inicio:.1f} s ({errores} hojas con error)")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
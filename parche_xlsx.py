@@ -0,0 +1,351 @@
+"""
+Guardado por diferencias: sólo se tocan las celdas que cambiaron.
+
+``cambios_columna`` compara la hoja cargada con lo que devolvió el editor y
+entrega ``{fila_excel: valor}``. ``aplicar_cambios`` escribe esos valores
+parcheando directamente el XML de la hoja dentro del zip: el resto de las
+partes conservan su contenido (se vuelven a comprimir, así que los bytes
+del zip no son idénticos) y las fórmulas quedan intactas.
+
+Valores en caché: sólo se borra el ``<v>`` de las fórmulas de la fila
+editada. Las fórmulas de otras filas que dependen de la celda (p. ej. las
+fechas encadenadas a la fila anterior) conservan su valor anterior hasta que
+Excel recalcula, cosa que hace al abrir el libro (``fullCalcOnLoad``). Hasta
+entonces, quien lea los valores en caché sin recalcular (``lector``,
+``historico``, pandas) ve esos valores viejos. No se borran todos: la app
+mostraría vacías las columnas calculadas.
+
+Si el parche directo no es seguro (la celda destino tiene fórmula, no hay un
+estilo de fecha que reutilizar, el XML usa prefijos de espacio de nombres,
+etc.) se recurre a openpyxl, aplicando igualmente sólo las celdas cambiadas.
+openpyxl se importa recién entonces.
+"""
+import io
+import math
+import re
+import posixpath
+import xml.etree.ElementTree as ET
+import zipfile
+from html import unescape
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_MANUAL = ["Fecha_Real_Manual", "Fecha Real Manual", "Fecha_Real"]
+# numFmtId internos de Excel que son de fecha/hora (los de ``openpyxl.styles.numbers.BUILTIN_FORMATS``)
+FORMATOS_FECHA_INTERNOS = frozenset({14, 15, 16, 17, 18, 19, 20, 21, 22, 45, 46, 47})
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_RE_FILA = re.compile(r'<row\b([^>]*?)\s*(/?)>')
+_RE_CELDA = re.compile(r'<c\b([^>]*?)\s*(?:/>|>(.*?)</c>)', re.S)
+_RE_APERTURA_CELDA = re.compile(r'<c\b([^>]*?)/?>')
+_RE_TEXTO = re.compile(r'<t\b[^>]*>(.*?)</t>', re.S)
+_RE_VALOR = re.compile(r'<v\s*/>|<v>.*?</v>', re.S)
+# ``openpyxl.styles.numbers.is_date_format``: sin textos entre comillas ni [colores/locales]
+_RE_FORMATO_IGNORADO = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+_RE_FORMATO_FECHA = re.compile(r"(?<![_\\])[dmhysDMHYS]")
+# Elementos que el esquema pone después de calcPr dentro de <workbook>
+_TRAS_CALCPR = ("<oleSize", "<customWorkbookViews", "<pivotCaches", "<smartTagPr", "<smartTagTypes",
+                "<webPublishing", "<fileRecoveryPr", "<webPublishObjects", "<extLst", "</workbook>")
+
+
+class ParcheNoAplicable(Exception):
+    """El XML no admite un parche directo seguro; hay que pasar por openpyxl."""
+
+
+# --- DIFERENCIAS ---
+def cambios_columna(original, editado, columna):
+    """``{fila_excel: Timestamp | None}`` de las filas cuya ``columna`` cambió (fila 1 = encabezado)."""
+    antes = pd.to_datetime(original[columna], errors='coerce').reset_index(drop=True)
+    despues = pd.to_datetime(editado[columna], errors='coerce').reset_index(drop=True)
+    iguales = (antes == despues) | (antes.isna() & despues.isna())
+    return {int(i) + 2: (None if pd.isna(despues[i]) else despues[i])
+            for i in np.flatnonzero(~iguales.to_numpy())}
+
+
+# --- UTILIDADES DE CELDA ---
+def _atributo(atributos, nombre):
+    m = re.search(r'(?:^|\s)%s="([^"]*)"' % nombre, atributos)
+    return m.group(1) if m else None
+
+
+def _indice_columna(letras):
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - 64
+    return indice
+
+
+def _letras_columna(indice):
+    letras = ""
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _separar_ref(ref):
+    m = re.fullmatch(r'([A-Z]+)(\d+)', ref or "")
+    if not m:
+        raise ParcheNoAplicable(f"Referencia de celda no reconocida: {ref!r}")
+    return _indice_columna(m.group(1)), int(m.group(2))
+
+
+def _serial_excel(valor, fecha1904):
+    base = pd.Timestamp("1904-01-01") if fecha1904 else pd.Timestamp("1899-12-30")
+    dias = (pd.Timestamp(valor) - base) / pd.Timedelta(days=1)
+    return str(int(dias)) if dias == int(dias) else repr(dias)
+
+
+# --- LECTURA DEL PAQUETE (también la usa lector.py) ---
+def ruta_hoja(zin, hoja):
+    libro = ET.fromstring(zin.read("xl/workbook.xml"))
+    rid = None
+    for nodo in libro.iter(f"{{{NS_MAIN}}}sheet"):
+        if nodo.get("name") == hoja:
+            rid = nodo.get(f"{{{NS_REL}}}id")
+    if rid is None:
+        raise ValueError(f"La hoja '{hoja}' no existe.")
+    for rel in ET.fromstring(zin.read("xl/_rels/workbook.xml.rels")).iter(f"{{{NS_PKG}}}Relationship"):
+        if rel.get("Id") == rid:
+            destino = rel.get("Target")
+            if destino.startswith("/"):
+                return destino.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", destino))
+    raise ParcheNoAplicable(f"Sin relación para la hoja '{hoja}'.")
+
+
+def es_fecha1904(xml_libro):
+    m = re.search(r'<workbookPr\b[^>]*\bdate1904="(1|true)"', xml_libro)
+    return m is not None
+
+
+def es_formato_fecha(formato):
+    """Si el código de formato numérico muestra fecha u hora (primera sección)."""
+    return _RE_FORMATO_FECHA.search(_RE_FORMATO_IGNORADO.sub("", (formato or "").split(";")[0])) is not None
+
+
+def indices_estilos_fecha(zin):
+    """Índices de ``cellXfs`` cuyo formato numérico es de fecha."""
+    try:
+        raiz = ET.fromstring(zin.read("xl/styles.xml"))
+    except KeyError:
+        return set()
+    propios = {int(nodo.get("numFmtId")): nodo.get("formatCode", "")
+               for nodo in raiz.iter(f"{{{NS_MAIN}}}numFmt")}
+    xfs = raiz.find(f"{{{NS_MAIN}}}cellXfs")
+    if xfs is None:
+        return set()
+
+    def es_fecha(id_formato):
+        if id_formato in propios:
+            return es_formato_fecha(propios[id_formato])
+        return id_formato in FORMATOS_FECHA_INTERNOS
+
+    return {str(i) for i, xf in enumerate(xfs.findall(f"{{{NS_MAIN}}}xf"))
+            if es_fecha(int(xf.get("numFmtId", 0)))}
+
+
+def textos_compartidos(zin, hasta=math.inf):
+    """Textos de ``sharedStrings.xml`` hasta el índice ``hasta`` (todos por defecto)."""
+    textos = []
+    if hasta < 0 or "xl/sharedStrings.xml" not in zin.namelist():
+        return textos
+    with zin.open("xl/sharedStrings.xml") as f:
+        for _, nodo in ET.iterparse(f):
+            if nodo.tag == f"{{{NS_MAIN}}}si":
+                textos.append("".join(t.text or "" for t in nodo.iter(f"{{{NS_MAIN}}}t")))
+                nodo.clear()
+                if len(textos) > hasta:
+                    break
+    return textos
+
+
+def _texto_celda(atributos, cuerpo, compartidos):
+    tipo = _atributo(atributos, "t")
+    cuerpo = cuerpo or ""
+    if tipo == "inlineStr":
+        return unescape("".join(_RE_TEXTO.findall(cuerpo)))
+    valor = re.search(r'<v>(.*?)</v>', cuerpo, re.S)
+    if valor is None:
+        return None
+    if tipo == "s":
+        return compartidos[int(valor.group(1))]
+    return unescape(valor.group(1))
+
+
+def _columna_encabezado(zin, xml, filas, encabezados):
+    if 1 in filas:
+        celdas = list(_RE_CELDA.finditer(xml, *filas[1]))
+        indices = [int(v) for m in celdas if _atributo(m.group(1), "t") == "s"
+                   for v in re.findall(r'<v>(\d+)</v>', m.group(2) or "")]
+        compartidos = textos_compartidos(zin, max(indices, default=-1))
+        for m in celdas:
+            texto = _texto_celda(m.group(1), m.group(2), compartidos)
+            if texto and texto.strip() in encabezados:
+                return _separar_ref(_atributo(m.group(1), "r"))[0]
+    raise ValueError(f"No se encontró la columna '{encabezados[0]}'.")
+
+
+def _indexar_filas(xml):
+    """``{numero_fila: (inicio, fin)}`` con los límites de cada ``<row>`` en el texto."""
+    filas = {}
+    for m in _RE_FILA.finditer(xml):
+        numero = _atributo(m.group(1), "r")
+        if numero is None:
+            raise ParcheNoAplicable("Filas sin atributo r.")
+        fin = m.end() if m.group(2) else xml.index("</row>", m.end()) + len("</row>")
+        filas[int(numero)] = (m.start(), fin)
+    return filas
+
+
+# --- PARCHE ---
+def _celda_nueva(ref, estilo, serial):
+    s = f' s="{estilo}"' if estilo is not None else ""
+    return f'<c r="{ref}"{s}><v>{serial}</v></c>' if serial is not None else f'<c r="{ref}"{s}/>'
+
+
+def _sin_valores_en_formulas(texto_fila):
+    # Los cachés de las fórmulas de la fila ya no son válidos: se vacían para
+    # que nadie lea un valor viejo mientras Excel recalcula.
+    def limpiar(m):
+        atributos, cuerpo = m.group(1), m.group(2)
+        if not cuerpo or "<f" not in cuerpo:
+            return m.group(0)
+        atributos = re.sub(r'\s+t="[^"]*"', "", atributos)
+        return f"<c{atributos}>{_RE_VALOR.sub('', cuerpo)}</c>"
+    return _RE_CELDA.sub(limpiar, texto_fila)
+
+
+def _parchear_fila(texto_fila, numero, columna, valor, estilos_fecha, estilo_columna, fecha1904):
+    ref = f"{_letras_columna(columna)}{numero}"
+    apertura = _RE_FILA.match(texto_fila)
+    if apertura.group(2):                           # <row .../> sin celdas
+        texto_fila = texto_fila[:apertura.end()].rstrip("/> ") + "></row>"
+        apertura = _RE_FILA.match(texto_fila)
+    existente, insertar_en = None, texto_fila.rindex("</row>")
+    for m in _RE_CELDA.finditer(texto_fila, apertura.end()):
+        col = _separar_ref(_atributo(m.group(1), "r"))[0]
+        if col == columna:
+            existente = m
+            break
+        if col > columna:
+            insertar_en = m.start()
+            break
+
+    estilo = _atributo(existente.group(1), "s") if existente else None
+    if existente and existente.group(2) and "<f" in existente.group(2):
+        raise ParcheNoAplicable(f"La celda {ref} tiene fórmula.")
+    serial = None
+    if valor is not None:
+        serial = _serial_excel(valor, fecha1904)
+        if estilo not in estilos_fecha:
+            if estilo not in (None, "0") or estilo_columna is None:
+                raise ParcheNoAplicable(f"La celda {ref} no tiene formato de fecha.")
+            estilo = estilo_columna
+    nueva = _celda_nueva(ref, estilo, serial)
+    if existente:
+        texto_fila = texto_fila[:existente.start()] + nueva + texto_fila[existente.end():]
+    else:
+        texto_fila = texto_fila[:insertar_en] + nueva + texto_fila[insertar_en:]
+    return _sin_valores_en_formulas(texto_fila)
+
+
+def _estilo_fecha_columna(xml, filas, columna, estilos_fecha):
+    """Estilo de fecha ya usado en la columna, para celdas nuevas o sin formato."""
+    letras = _letras_columna(columna)
+    for m in _RE_APERTURA_CELDA.finditer(xml, filas[1][1] if 1 in filas else 0):
+        ref, estilo = _atributo(m.group(1), "r"), _atributo(m.group(1), "s")
+        if estilo in estilos_fecha and ref and ref.rstrip("0123456789") == letras:
+            return estilo
+    return None
+
+
+def _recalcular_al_abrir(xml_libro):
+    if re.search(r'<calcPr\b[^>]*\bfullCalcOnLoad=', xml_libro):
+        return re.sub(r'(<calcPr\b[^>]*\bfullCalcOnLoad=")[^"]*"', r'\g<1>1"', xml_libro, count=1)
+    if "<calcPr" in xml_libro:
+        return re.sub(r'<calcPr\b', '<calcPr fullCalcOnLoad="1"', xml_libro, count=1)
+    posicion = min(xml_libro.find(tag) for tag in _TRAS_CALCPR if tag in xml_libro)
+    return xml_libro[:posicion] + '<calcPr fullCalcOnLoad="1"/>' + xml_libro[posicion:]
+
+
+def parchear_xml(contenido, hoja, cambios, encabezados=COLUMNAS_MANUAL):
+    """Aplica ``cambios`` reescribiendo sólo el XML de ``hoja`` (y calcPr del libro)."""
+    with zipfile.ZipFile(io.BytesIO(contenido)) as zin:
+        ruta = ruta_hoja(zin, hoja)
+        xml = zin.read(ruta).decode("utf-8")
+        xml_libro = zin.read("xl/workbook.xml").decode("utf-8")
+        if re.search(r'<\w+:(sheetData|row|c)\b', xml) or re.search(r'<\w+:workbook\b', xml_libro):
+            raise ParcheNoAplicable("XML con prefijos de espacio de nombres.")
+        if "<sheetData>" not in xml and not re.search(r'<sheetData\b[^>]*[^/]>', xml):
+            raise ParcheNoAplicable("Hoja sin sheetData.")
+
+        filas = _indexar_filas(xml)
+        columna = _columna_encabezado(zin, xml, filas, encabezados)
+        estilos_fecha = indices_estilos_fecha(zin)
+        estilo_columna = _estilo_fecha_columna(xml, filas, columna, estilos_fecha)
+        fecha1904 = es_fecha1904(xml_libro)
+
+        # De abajo hacia arriba para que los desplazamientos sigan siendo válidos
+        partes, cursor = [], len(xml)
+        for numero in sorted(cambios, reverse=True):
+            valor = cambios[numero]
+            if numero in filas:
+                inicio, fin = filas[numero]
+                texto = _parchear_fila(xml[inicio:fin], numero, columna, valor,
+                                       estilos_fecha, estilo_columna, fecha1904)
+            else:
+                if valor is None:
+                    continue
+                siguientes = [filas[n][0] for n in filas if n > numero]
+                inicio = fin = min(siguientes) if siguientes else xml.index("</sheetData>")
+                texto = _parchear_fila(f'<row r="{numero}"></row>', numero, columna, valor,
+                                       estilos_fecha, estilo_columna, fecha1904)
+            if fin > cursor:
+                raise ParcheNoAplicable("Filas fuera de orden.")
+            partes.append(xml[fin:cursor])
+            partes.append(texto)
+            cursor = inicio
+        partes.append(xml[:cursor])
+        nuevo = "".join(reversed(partes))
+        if nuevo == xml:
+            return contenido
+
+        reemplazos = {ruta: nuevo.encode("utf-8"),
+                      "xl/workbook.xml": _recalcular_al_abrir(xml_libro).encode("utf-8")}
+        salida = io.BytesIO()
+        with zipfile.ZipFile(salida, "w") as zout:
+            for info in zin.infolist():
+                zout.writestr(info, reemplazos.get(info.filename) or zin.read(info.filename))
+        return salida.getvalue()
+
+
+def aplicar_con_openpyxl(contenido, hoja, cambios, encabezados=COLUMNAS_MANUAL):
+    """Respaldo: carga completa con openpyxl, pero escribiendo sólo las celdas cambiadas."""
+    import openpyxl
+    wb = openpyxl.load_workbook(io.BytesIO(contenido), data_only=False)
+    if hoja not in wb.sheetnames:
+        raise ValueError(f"La hoja '{hoja}' no existe.")
+    ws = wb[hoja]
+    encabezado = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
+    columna = next((i for i, nombre in enumerate(encabezado, 1)
+                    if nombre and str(nombre).strip() in encabezados), None)
+    if columna is None:
+        raise ValueError(f"No se encontró la columna '{encabezados[0]}'.")
+    for fila, valor in cambios.items():
+        ws.cell(row=fila, column=columna).value = None if valor is None else pd.Timestamp(valor).to_pydatetime()
+    salida = io.BytesIO()
+    wb.save(salida)
+    return salida.getvalue()
+
+
+def aplicar_cambios(contenido, hoja, cambios, encabezados=COLUMNAS_MANUAL):
+    """Devuelve ``(bytes, metodo)`` con ``metodo`` 'xml' (parche directo) u 'openpyxl'."""
+    try:
+        return parchear_xml(contenido, hoja, cambios, encabezados), "xml"
+    except ParcheNoAplicable:
+        return aplicar_con_openpyxl(contenido, hoja, cambios, encabezados), "openpyxl"
@@ -0,0 +1,192 @@
+"""
+Instrumentación por etapas.
+
+``tramo(nombre, **atributos)`` mide un bloque y entrega un dict donde el
+bloque puede anotar lo que sepa (estado de caché, filas, artistas...):
+
+    with tramo("hojas.read_excel") as t:
+        ...
+        t["filas"] = len(df)
+
+Siempre se acumula en ``REGISTRO`` (conteo, suma y máximo por tramo, y
+aciertos/fallos de caché), exportable en formato texto de Prometheus. Si
+además hay una ``Traza`` activa en el contexto (modo depuración del rerun),
+cada tramo queda registrado con su padre para verlo en el panel o exportarlo
+como JSON lines. Los hilos de trabajo heredan la traza si se lanzan con
+``contextvars.copy_context().run``.
+
+``Perfilador`` envuelve cProfile o pyinstrument (opcional) para capturar un
+rerun completo.
+"""
+import contextvars
+import io
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+_traza_actual = contextvars.ContextVar("traza_actual", default=None)
+_tramo_padre = contextvars.ContextVar("tramo_padre", default=None)
+
+
+class Traza:
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.creada_en = time.time()
+        self.tramos = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _agregar(self, registro):
+        with self._lock:
+            self.tramos.append(registro)
+
+    def ordenados(self):
+        with self._lock:
+            return sorted(self.tramos, key=lambda t: t["inicio_ms"])
+
+    def filas(self):
+        """Tramos en orden de inicio, con sangría por anidamiento, para mostrar en tabla."""
+        tramos = self.ordenados()
+        profundidad = {}
+        filas = []
+        for t in tramos:
+            profundidad[t["id"]] = profundidad.get(t["padre"], -1) + 1
+            detalle = {k: v for k, v in t.items()
+                       if k not in ("id", "padre", "tramo", "ms", "inicio_ms", "cache", "hilo")}
+            filas.append({"tramo": "· " * profundidad[t["id"]] + t["tramo"], "ms": t["ms"],
+                          "inicio_ms": t["inicio_ms"], "cache": t.get("cache", ""), "hilo": t["hilo"],
+                          "detalle": json.dumps(detalle, ensure_ascii=False, default=str) if detalle else ""})
+        return filas
+
+    def duracion_ms(self):
+        return round((time.perf_counter() - self.inicio) * 1000, 3)
+
+    def a_json_lines(self):
+        return "\n".join(json.dumps(t, ensure_ascii=False, default=str) for t in self.ordenados()) + "\n"
+
+
+class Registro:
+    """Agregado por proceso de todos los tramos medidos."""
+
+    def __init__(self):
+        self._tiempos = {}     # tramo -> [conteo, suma_s, max_s]
+        self._cache = {}       # (tramo, estado) -> conteo
+        self._lock = threading.Lock()
+
+    def observar(self, nombre, segundos, estado_cache=None):
+        with self._lock:
+            fila = self._tiempos.setdefault(nombre, [0, 0.0, 0.0])
+            fila[0] += 1
+            fila[1] += segundos
+            fila[2] = max(fila[2], segundos)
+            if estado_cache is not None:
+                clave = (nombre, estado_cache)
+                self._cache[clave] = self._cache.get(clave, 0) + 1
+
+    def resumen(self):
+        with self._lock:
+            return {nombre: {"conteo": n, "suma_s": round(suma, 6), "max_s": round(maximo, 6)}
+                    for nombre, (n, suma, maximo) in sorted(self._tiempos.items())}
+
+    def a_prometheus(self, prefijo="linea_tiempo"):
+        with self._lock:
+            tiempos, cache = dict(self._tiempos), dict(self._cache)
+        lineas = [f"# HELP {prefijo}_tramo_segundos Duración de cada etapa instrumentada.",
+                  f"# TYPE {prefijo}_tramo_segundos summary"]
+        for nombre, (n, suma, _) in sorted(tiempos.items()):
+            lineas.append(f'{prefijo}_tramo_segundos_count{{tramo="{nombre}"}} {n}')
+            lineas.append(f'{prefijo}_tramo_segundos_sum{{tramo="{nombre}"}} {suma:.6f}')
+        lineas += [f"# HELP {prefijo}_tramo_segundos_max Máxima duración observada por etapa.",
+                   f"# TYPE {prefijo}_tramo_segundos_max gauge"]
+        for nombre, (_, _, maximo) in sorted(tiempos.items()):
+            lineas.append(f'{prefijo}_tramo_segundos_max{{tramo="{nombre}"}} {maximo:.6f}')
+        lineas += [f"# HELP {prefijo}_cache_total Consultas de caché por etapa y resultado.",
+                   f"# TYPE {prefijo}_cache_total counter"]
+        for (nombre, estado), n in sorted(cache.items()):
+            lineas.append(f'{prefijo}_cache_total{{tramo="{nombre}",estado="{estado}"}} {n}')
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = Registro()
+
+
+@contextmanager
+def tramo(nombre, **atributos):
+    traza = _traza_actual.get()
+    registro = dict(atributos)
+    if traza is not None:
+        registro["id"] = next(traza._ids)
+        registro["padre"] = _tramo_padre.get()
+        marca = _tramo_padre.set(registro["id"])
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as e:
+        registro["error"] = type(e).__name__
+        raise
+    finally:
+        duracion = time.perf_counter() - inicio
+        REGISTRO.observar(nombre, duracion, registro.get("cache"))
+        if traza is not None:
+            _tramo_padre.reset(marca)
+            registro.update(tramo=nombre, hilo=threading.current_thread().name,
+                            inicio_ms=round((inicio - traza.inicio) * 1000, 3), ms=round(duracion * 1000, 3))
+            traza._agregar(registro)
+
+
+def activar_traza(activa=True):
+    """
+    Fija la traza del contexto actual (un rerun) y la devuelve; con ``activa``
+    falso la quita. Se llama al inicio de cada rerun, así un rerun cortado por
+    ``st.rerun``/``st.stop`` no deja una traza vieja colgada.
+    """
+    traza = Traza() if activa else None
+    _traza_actual.set(traza)
+    return traza
+
+
+def traza_actual():
+    return _traza_actual.get()
+
+
+class Perfilador:
+    """Perfil de un rerun completo con 'cprofile' o 'pyinstrument' (si está instalado)."""
+
+    MODOS = ("cprofile", "pyinstrument")
+
+    def __init__(self, modo):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de perfil desconocido: {modo}")
+        self.modo = modo
+        if modo == "cprofile":
+            import cProfile
+            self._perfil = cProfile.Profile()
+        else:
+            from pyinstrument import Profiler    # ImportError si no está instalado
+            self._perfil = Profiler()
+        self.activo = False
+
+    def iniciar(self):
+        if self.modo == "cprofile":
+            self._perfil.enable()
+        else:
+            self._perfil.start()
+        self.activo = True
+        return self
+
+    def detener(self, lineas=40):
+        """Detiene la captura y devuelve el informe en texto."""
+        if not self.activo:
+            return ""
+        self.activo = False
+        if self.modo == "cprofile":
+            import pstats
+            self._perfil.disable()
+            salida = io.StringIO()
+            pstats.Stats(self._perfil, stream=salida).sort_stats("cumulative").print_stats(lineas)
+            return salida.getvalue()
+        self._perfil.stop()
+        return self._perfil.output_text(unicode=True, color=False)
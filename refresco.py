@@ -0,0 +1,224 @@
+"""
+Refresco en segundo plano del libro (stale-while-revalidate).
+
+Un único ``RefrescadorLibro`` por proceso mantiene la última versión buena del
+libro. Mientras está fresca se sirve directamente; cuando vence su TTL se
+sigue sirviendo la copia anterior y la revalidación corre en un hilo aparte.
+Todas las sesiones que piden el libro en el mismo momento comparten una sola
+descarga en vuelo.
+
+Además del TTL, una versión puede marcarse obsoleta explícitamente con
+``invalidar`` (o ``invalidar_libros`` para todos los refrescadores del
+proceso), lo que permite usar un TTL largo y refrescar sólo cuando el dato
+cambia. Los oyentes registrados con ``al_actualizar`` se llaman cada vez que
+llega una versión nueva, p. ej. para precalentar cachés.
+"""
+import hashlib
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+
+from descarga import descargar_condicional
+from lector import nombres_hojas
+from perfil import tramo
+
+
+@dataclass
+class LibroVersionado:
+    sha: str
+    contenido: bytes
+    hojas: list
+    obtenido_en: float
+
+    @classmethod
+    def desde_contenido(cls, contenido):
+        """Versión construida a partir de bytes locales (mismo sha que tendría al descargarla)."""
+        return cls(hashlib.sha256(contenido).hexdigest(), contenido, nombres_hojas(contenido), time.time())
+
+
+@dataclass
+class MetricasRefresco:
+    aciertos: int = 0
+    servidas_obsoletas: int = 0
+    esperas: int = 0
+    refrescos: int = 0
+    errores: int = 0
+    ultima_latencia: float = 0.0
+    latencia_total: float = 0.0
+    ultimo_error: str = ""
+
+    @property
+    def latencia_media(self):
+        return self.latencia_total / self.refrescos if self.refrescos else 0.0
+
+
+_REFRESCADORES = weakref.WeakSet()
+
+
+def invalidar_libros(sha=None, vigilar=True):
+    """Invalida ``sha`` (o la versión vigente) en todos los refrescadores del proceso."""
+    return sum(refrescador.invalidar(sha, vigilar) for refrescador in list(_REFRESCADORES))
+
+
+class RefrescadorLibro:
+
+    def __init__(self, url, almacen, ttl=60, timeout=15, sesion=None):
+        self.url = url
+        self.almacen = almacen
+        self.ttl = ttl                 # None: la versión sólo vence al invalidarla
+        self.timeout = timeout
+        self.sesion = sesion
+        self.metricas = MetricasRefresco()
+        self._actual = None
+        self._invalidado = False
+        self._generacion = 0           # cuenta invalidaciones
+        self._oyentes = []
+        self._lock = threading.Lock()
+        self._en_vuelo = None          # threading.Event de la descarga en curso
+        _REFRESCADORES.add(self)
+
+    # --- DESCARGA (SINGLE-FLIGHT) ---
+    def _descargar(self, evento):
+        inicio = time.perf_counter()
+        generacion, aviso = self._generacion, None
+        try:
+            # Con copia en memoria se fuerza la petición condicional (edad_maxima=0);
+            # en frío se acepta la copia de disco validada dentro del TTL.
+            edad = 0 if self._actual is not None else (self.ttl or 0)
+            with tramo("libro.descarga") as t:
+                resultado = descargar_condicional(self.url, self.almacen, sesion=self.sesion,
+                                                  timeout=self.timeout, edad_maxima=edad)
+                t.update(origen=resultado.origen, bytes=len(resultado.contenido))
+            actual = self._actual
+            if actual is not None and actual.sha == resultado.sha:
+                nuevo = LibroVersionado(actual.sha, actual.contenido, actual.hojas, time.time())
+            else:
+                # Sólo la lista de hojas (workbook.xml): valida que sea un xlsx sin parsear datos
+                with tramo("libro.listar_hojas"):
+                    hojas = nombres_hojas(resultado.contenido)
+                nuevo = LibroVersionado(resultado.sha, resultado.contenido, hojas, time.time())
+                aviso = (nuevo, actual)
+            with self._lock:
+                self._actual = nuevo
+                # Una invalidación llegada durante la descarga sigue pendiente
+                if self._generacion == generacion:
+                    self._invalidado = False
+                self.metricas.refrescos += 1
+                self.metricas.ultima_latencia = time.perf_counter() - inicio
+                self.metricas.latencia_total += self.metricas.ultima_latencia
+        except Exception as e:
+            with self._lock:
+                self.metricas.errores += 1
+                self.metricas.ultimo_error = str(e)
+        finally:
+            with self._lock:
+                self._en_vuelo = None
+                if self._invalidado and self._generacion != generacion:
+                    self._lanzar()
+            evento.set()
+        # Los oyentes (precalentado) corren después de liberar a quienes esperan
+        if aviso is not None:
+            self._avisar(*aviso)
+
+    def _avisar(self, nuevo, anterior):
+        for oyente in list(self._oyentes):
+            try: oyente(nuevo, anterior)
+            except Exception: pass
+
+    def _vigente(self, actual):
+        if self._invalidado: return False
+        return self.ttl is None or time.time() - actual.obtenido_en < self.ttl
+
+    def _lanzar(self):
+        """Inicia una descarga si no hay otra en vuelo. Requiere ``self._lock``."""
+        if self._en_vuelo is None:
+            self._en_vuelo = threading.Event()
+            threading.Thread(target=self._descargar, args=(self._en_vuelo,), daemon=True).start()
+        return self._en_vuelo
+
+    # --- API PÚBLICA ---
+    def obtener(self):
+        """Devuelve el ``LibroVersionado`` vigente, o ``None`` si nunca se pudo cargar."""
+        with tramo("libro.obtener") as t:
+            with self._lock:
+                actual = self._actual
+                if actual is not None:
+                    if self._vigente(actual):
+                        self.metricas.aciertos += 1
+                        t["cache"] = "hit"
+                    else:
+                        self.metricas.servidas_obsoletas += 1
+                        t["cache"] = "obsoleta"
+                        self._lanzar()
+                    return actual
+                self.metricas.esperas += 1
+                t["cache"] = "miss"
+                evento = self._lanzar()
+            # Arranque en frío: todas las sesiones esperan la misma descarga
+            evento.wait(self.timeout + 5)
+            return self._actual
+
+    def forzar(self, esperar=False):
+        """Revalida ya mismo sin descartar la versión que se está sirviendo."""
+        with self._lock:
+            evento = self._lanzar()
+        if esperar:
+            evento.wait(self.timeout + 5)
+        return evento
+
+    def invalidar(self, sha=None, vigilar=True):
+        """
+        Marca obsoleta la versión ``sha`` (la vigente si es None) y lanza la
+        revalidación; con ``vigilar`` sigue revalidando hasta que el origen
+        refleje el cambio. Devuelve False si ``sha`` ya no es la versión servida.
+        """
+        with self._lock:
+            actual = self._actual
+            if actual is None or (sha is not None and actual.sha != sha):
+                return False
+            self._invalidado = True
+            self._generacion += 1
+            self._lanzar()
+        if vigilar:
+            self.vigilar_cambio(actual.sha)
+        return True
+
+    def vigilar_cambio(self, sha=None, intentos=8, intervalo=5.0):
+        """
+        Tras un guardado el origen tarda en reflejarlo: revalida con esperas
+        crecientes hasta que la versión deje de ser ``sha`` (la vigente si es None).
+        """
+        with self._lock:
+            sha = sha or (self._actual.sha if self._actual else None)
+
+        def vigilar():
+            for intento in range(intentos):
+                self.forzar(esperar=True)
+                actual = self._actual
+                if actual is not None and actual.sha != sha:
+                    return
+                time.sleep(intervalo * (intento + 1))
+
+        threading.Thread(target=vigilar, daemon=True).start()
+
+    def al_actualizar(self, oyente):
+        """Registra ``oyente(nuevo, anterior)``, llamado al llegar una versión distinta."""
+        self._oyentes.append(oyente)
+
+    def estado(self):
+        with self._lock:
+            actual = self._actual
+            return {
+                "sha": actual.sha if actual else None,
+                "edad_s": round(time.time() - actual.obtenido_en, 1) if actual else None,
+                "invalidado": self._invalidado,
+                "en_vuelo": self._en_vuelo is not None,
+                "aciertos": self.metricas.aciertos,
+                "servidas_obsoletas": self.metricas.servidas_obsoletas,
+                "esperas": self.metricas.esperas,
+                "refrescos": self.metricas.refrescos,
+                "errores": self.metricas.errores,
+                "ultima_latencia_s": round(self.metricas.ultima_latencia, 3),
+                "latencia_media_s": round(self.metricas.latencia_media, 3),
+            }
@@ -0,0 +1,43 @@
+"""
+Punto de entrada con rutas HTTP propias: ``streamlit run servidor.py``.
+
+Sirve ``app.py`` igual que antes y agrega:
+
+    POST /invalidar[?sha=<sha256>]
+        Cabecera ``Authorization: Bearer <INVALIDACION_TOKEN>``.
+        Marca obsoleta la versión del libro (la indicada o la vigente) y
+        vigila el origen hasta que aparezca la nueva; la siguiente visita ya
+        encuentra las hojas y la vista por defecto precalculadas.
+
+El token se lee de ``st.secrets["INVALIDACION_TOKEN"]`` o de la variable de
+entorno del mismo nombre; sin token la ruta responde 503.
+"""
+import hmac
+import os
+
+import streamlit as st
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from refresco import invalidar_libros
+
+
+def _token():
+    try:
+        return st.secrets.get("INVALIDACION_TOKEN") or os.environ.get("INVALIDACION_TOKEN")
+    except Exception:
+        return os.environ.get("INVALIDACION_TOKEN")
+
+
+async def invalidar(request):
+    esperado = _token()
+    if not esperado:
+        return JSONResponse({"error": "invalidación no configurada"}, status_code=503)
+    recibido = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(recibido.encode(), esperado.encode()):
+        return JSONResponse({"error": "no autorizado"}, status_code=401)
+    invalidados = invalidar_libros(request.query_params.get("sha"))
+    return JSONResponse({"invalidados": invalidados})
+
+
+app = st.App("app.py", routes=[Route("/invalidar", invalidar, methods=["POST"])])
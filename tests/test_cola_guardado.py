@@ -0,0 +1,124 @@
+"""ColaGuardado contra RepoLocal, el doble en memoria de la API de datos de Git."""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from github import GithubException
+
+from cola_guardado import ColaGuardado
+from lector import leer_hojas
+from repo_local import RepoLocal
+from sintetico import libro_sintetico
+
+RUTA = "db_decreto10.xlsx"
+HOJA, OTRA_HOJA = "Proceso_Sintetico_1", "Proceso_Sintetico_2"
+FECHA = datetime(2030, 1, 15)
+
+
+class RepoConConflictos(RepoLocal):
+    """RepoLocal cuya ref rechaza los primeros ``conflictos`` avances con ``estado``."""
+
+    def __init__(self, *args, conflictos=1, estado=409, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.conflictos, self.estado = conflictos, estado
+
+    def get_git_ref(self, nombre):
+        ref = super().get_git_ref(nombre)
+        editar = ref.edit
+
+        def edit(sha, force=False):
+            if self.conflictos:
+                self.conflictos -= 1
+                raise GithubException(self.estado, {"message": "conflicto"}, None)
+            editar(sha, force=force)
+
+        ref.edit = edit
+        return ref
+
+
+@pytest.fixture
+def libro():
+    return libro_sintetico(hojas=2, hitos=10)
+
+
+def fecha_manual(contenido, hoja, fila):
+    df = leer_hojas(contenido, [hoja], ["Fecha_Real_Manual"])[hoja]
+    return pd.Timestamp(df["Fecha_Real_Manual"].iloc[fila - 2])
+
+
+def commits(repo):
+    """Commits de la rama, sin contar el inicial."""
+    n, sha = 0, repo.head
+    while repo._objetos[sha][2] is not None:
+        n, sha = n + 1, repo._objetos[sha][2]
+    return n
+
+
+def test_dos_guardados_en_la_ventana_van_en_un_commit(libro):
+    repo = RepoLocal(RUTA, libro)
+    cola = ColaGuardado(lambda: repo, RUTA, ventana=0.2)
+
+    primero = cola.encolar(HOJA, {2: FECHA})
+    segundo = cola.encolar(OTRA_HOJA, {3: FECHA})
+    a, b = primero.result(timeout=10), segundo.result(timeout=10)
+
+    assert a.commit == b.commit == repo.head
+    assert a.ediciones_en_lote == 2
+    assert commits(repo) == 1
+    assert cola.estado()["lotes"] == 1
+    assert fecha_manual(repo.contenido(), HOJA, 2) == FECHA
+    assert fecha_manual(repo.contenido(), OTRA_HOJA, 3) == FECHA
+
+
+@pytest.mark.parametrize("estado", [409, 422])
+def test_conflicto_se_reintenta(libro, estado):
+    repo = RepoConConflictos(RUTA, libro, conflictos=1, estado=estado)
+    cola = ColaGuardado(lambda: repo, RUTA, ventana=0.01)
+
+    resultado = cola.encolar(HOJA, {2: FECHA}).result(timeout=10)
+
+    assert resultado.intentos == 2 and resultado.commit == repo.head
+    assert cola.estado()["conflictos"] == 1
+    assert fecha_manual(repo.contenido(), HOJA, 2) == FECHA
+
+
+def test_reintentos_agotados_fallan_todo_el_lote(libro):
+    repo = RepoConConflictos(RUTA, libro, conflictos=10)
+    cola = ColaGuardado(lambda: repo, RUTA, ventana=0.2, max_intentos=2)
+
+    futuros = [cola.encolar(HOJA, {2: FECHA}), cola.encolar(OTRA_HOJA, {2: FECHA})]
+
+    for futuro in futuros:
+        with pytest.raises(GithubException):
+            futuro.result(timeout=10)
+    assert commits(repo) == 0
+    assert cola.estado()["errores"] == 1
+
+
+def test_hoja_invalida_falla_sola(libro):
+    repo = RepoLocal(RUTA, libro)
+    cola = ColaGuardado(lambda: repo, RUTA, ventana=0.2)
+
+    valida = cola.encolar(HOJA, {2: FECHA})
+    invalida = cola.encolar("No existe", {2: FECHA})
+
+    with pytest.raises(ValueError):
+        invalida.result(timeout=10)
+    assert valida.result(timeout=10).commit == repo.head
+    assert fecha_manual(repo.contenido(), HOJA, 2) == FECHA
+
+
+def test_un_error_inesperado_no_detiene_el_hilo(libro):
+    repo = RepoLocal(RUTA, libro)
+    cola = ColaGuardado(lambda: repo, RUTA, ventana=0.01)
+    procesar = cola._procesar
+
+    def fallar_una_vez(lote):
+        cola._procesar = procesar
+        raise RuntimeError("fuera de los reintentos")
+
+    cola._procesar = fallar_una_vez
+    with pytest.raises(RuntimeError):
+        cola.encolar(HOJA, {2: FECHA}).result(timeout=10)
+
+    assert cola.encolar(HOJA, {2: FECHA}).result(timeout=10).commit == repo.head
@@ -0,0 +1,130 @@
+"""descargar_condicional y AlmacenContenido contra un servidor HTTP local."""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from descarga import AlmacenContenido, descargar_condicional
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 01 Oct 2025 10:00:00 GMT"
+
+
+class Servidor:
+    """Sirve ``contenido`` en /libro.xlsx y anota cada petición ``(método, cabeceras)``."""
+
+    def __init__(self):
+        self.contenido = b"libro-v1"
+        self.validadores = True
+        self.peticiones = []
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def _cabeceras(self):
+                self.send_header("Content-Length", str(len(servidor.contenido)))
+                if servidor.validadores:
+                    self.send_header("ETag", ETAG)
+                    self.send_header("Last-Modified", LAST_MODIFIED)
+                self.end_headers()
+
+            def do_HEAD(self):
+                servidor.peticiones.append(("HEAD", dict(self.headers)))
+                self.send_response(200)
+                self._cabeceras()
+
+            def do_GET(self):
+                servidor.peticiones.append(("GET", dict(self.headers)))
+                if servidor.validadores and self.headers.get("If-None-Match") == ETAG:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self._cabeceras()
+                self.wfile.write(servidor.contenido)
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self.url = f"http://127.0.0.1:{self.http.server_address[1]}/libro.xlsx"
+        self._hilo = threading.Thread(target=self.http.serve_forever, daemon=True)
+        self._hilo.start()
+
+    def metodos(self):
+        return [metodo for metodo, _ in self.peticiones]
+
+    def cerrar(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+@pytest.fixture
+def servidor():
+    servidor = Servidor()
+    yield servidor
+    servidor.cerrar()
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenContenido(str(tmp_path), max_objetos=2)
+
+
+def test_descarga_y_luego_304_con_validadores(servidor, almacen):
+    primera = descargar_condicional(servidor.url, almacen, timeout=5)
+    assert primera.origen == "red" and primera.contenido == b"libro-v1"
+
+    segunda = descargar_condicional(servidor.url, almacen, timeout=5)
+    assert segunda.origen == "no_modificado"
+    assert (segunda.contenido, segunda.sha) == (primera.contenido, primera.sha)
+    metodo, cabeceras = servidor.peticiones[-1]
+    assert metodo == "GET"
+    assert cabeceras["If-None-Match"] == ETAG
+    assert cabeceras["If-Modified-Since"] == LAST_MODIFIED
+
+
+def test_sonda_head_sin_validadores(servidor, almacen):
+    servidor.validadores = False
+    primera = descargar_condicional(servidor.url, almacen, timeout=5)
+
+    segunda = descargar_condicional(servidor.url, almacen, timeout=5)
+    assert segunda.origen == "sonda" and segunda.sha == primera.sha
+    assert servidor.metodos() == ["GET", "HEAD"]
+
+    # Otro tamaño: la sonda no alcanza y se descarga de nuevo
+    servidor.contenido = b"libro-v2 con otro largo"
+    tercera = descargar_condicional(servidor.url, almacen, timeout=5)
+    assert tercera.origen == "red" and tercera.contenido == servidor.contenido
+    assert servidor.metodos()[-2:] == ["HEAD", "GET"]
+
+
+def test_copia_en_disco_si_falla_la_red(servidor, almacen):
+    primera = descargar_condicional(servidor.url, almacen, timeout=5)
+    servidor.cerrar()
+
+    respaldo = descargar_condicional(servidor.url, almacen, timeout=5)
+    assert respaldo.origen == "disco"
+    assert (respaldo.contenido, respaldo.sha) == (primera.contenido, primera.sha)
+
+
+def test_sin_copia_previa_propaga_el_error(servidor, almacen):
+    servidor.cerrar()
+    with pytest.raises(requests.RequestException):
+        descargar_condicional(servidor.url, almacen, timeout=5)
+
+
+def test_poda_de_objetos_viejos(almacen):
+    # "a" es la más vieja pero la referencia una URL: se conserva
+    usada = almacen.guardar(b"a")
+    almacen.actualizar_metadatos("http://ejemplo/libro.xlsx", sha=usada)
+    os.utime(almacen.ruta_objeto(usada), (1000, 1000))
+    vieja = almacen.guardar(b"b")
+    os.utime(almacen.ruta_objeto(vieja), (1001, 1001))
+    recientes = [almacen.guardar(b"c"), almacen.guardar(b"d")]
+
+    assert not os.path.exists(almacen.ruta_objeto(vieja))
+    for sha in [usada, *recientes]:
+        assert os.path.exists(almacen.ruta_objeto(sha))
+    assert almacen.leer(usada) == b"a"
@@ -0,0 +1,85 @@
+"""
+La disposición de ``calcular_disposicion`` contra la de los graficadores originales.
+
+``datos/disposicion_original.json`` guarda, para cada caso de ``CASOS``, la
+posición y el texto de cada caja y de cada flecha de retraso tal como las
+dibujaban ``graficar_modo_arbol`` y ``graficar_modo_estandar`` de app.py antes
+de separar la disposición del dibujo (commit base). Sólo se regenera si el
+cambio de disposición es intencional.
+"""
+import json
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from disposicion import asignar_niveles_estandar, calcular_disposicion
+
+DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos", "disposicion_original.json")
+INICIO = pd.Timestamp("2025-01-01")
+F_INICIO, F_FIN = pd.Timestamp("2025-03-01"), pd.Timestamp("2026-10-31")
+AGENTES = ["CNE", "Coordinador", "Participantes", "Consultor", "Ministerio de Energía"]
+
+# (modo, hitos, semilla): el modo árbol repite fechas; el estándar no
+CASOS = [("arbol", 20, 1), ("arbol", 60, 2), ("arbol", 150, 3), ("arbol", 300, 4),
+         ("estandar", 15, 5), ("estandar", 40, 6), ("estandar", 120, 7), ("estandar", 250, 8)]
+
+
+def hoja(modo, hitos, semilla):
+    """
+    Hitos con fechas reales (vigente y, en ~70 %, teórica) filtrados a
+    ``F_INICIO``-``F_FIN`` como en ``vistas``: el índice queda salteado.
+    """
+    rng = random.Random(semilla)
+    if modo == "arbol":
+        dias = [rng.randrange(60, 60 + 2 * hitos) for _ in range(hitos)]
+    else:
+        dias = sorted(rng.sample(range(700), hitos)) if semilla % 2 else rng.sample(range(700), hitos)
+    vigentes = [INICIO + pd.Timedelta(days=d) for d in dias]
+    teoricas = [v + pd.Timedelta(days=rng.randrange(-90, 90)) if rng.random() > 0.3 else pd.NaT for v in vigentes]
+    df = pd.DataFrame({
+        "Fecha_Vigente": vigentes, "Fecha_teorica": pd.to_datetime(teoricas),
+        "Agente": [rng.choice(AGENTES) for _ in range(hitos)],
+        "Hito / Etapa": [f"Hito {i} de la etapa {rng.randrange(1, 9)} del proceso" for i in range(hitos)],
+    })
+    return df[(df["Fecha_Vigente"] >= F_INICIO) & (df["Fecha_Vigente"] <= F_FIN)].copy()
+
+
+def ns(fecha):
+    return pd.Timestamp(fecha).value
+
+
+with open(DATOS, encoding="utf-8") as f:
+    ORIGINAL = json.load(f)
+
+
+@pytest.mark.parametrize("modo, hitos, semilla", CASOS)
+def test_disposicion_igual_a_la_original(modo, hitos, semilla):
+    df_plot = hoja(modo, hitos, semilla)
+    esperado = ORIGINAL[f"{modo}_{hitos}_{semilla}"]
+
+    disposicion = calcular_disposicion(df_plot, "Prueba", F_INICIO, F_FIN)
+
+    assert disposicion.modo == modo
+    etiquetas = disposicion.etiquetas
+    assert [[ns(x), y, texto] for x, y, texto in zip(etiquetas["x"], etiquetas["y"], etiquetas["texto"])] \
+        == esperado["etiquetas"]
+    flechas = disposicion.flechas
+    assert [[ns(x0), ns(x1), y] for x0, x1, y in zip(flechas["x0"], flechas["x1"], flechas["y"])] \
+        == esperado["flechas"]
+
+
+def test_margen_de_dias_en_el_borde():
+    # Choque si |(fecha - ocupada).days| < 75, con .days truncando hacia abajo: contra d0,
+    # -75 y +75 días no chocan, +74 sí y -74.5 tampoco (.days = -75), pero choca con d0 - 75
+    d0 = pd.Timestamp("2025-06-01")
+    fechas = [d0, d0 - pd.Timedelta(days=75), d0 + pd.Timedelta(days=74), d0 - pd.Timedelta(days=74.5),
+              d0 + pd.Timedelta(days=75)]
+    df_plot = pd.DataFrame({"Fecha_Vigente": fechas, "Fecha_teorica": pd.NaT, "Agente": "CNE",
+                            "Hito / Etapa": "Hito"}, index=[0, 2, 4, 6, 8])
+
+    niveles, _ = asignar_niveles_estandar(df_plot)
+
+    # Niveles que asignaba graficar_modo_estandar a estas fechas
+    assert niveles.tolist() == [5.0, 5.0, 7.5, 7.5, 5.0]
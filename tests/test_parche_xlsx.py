@@ -0,0 +1,163 @@
+"""parchear_xml contra el respaldo con openpyxl, sobre el libro real y libros mínimos."""
+import io
+import os
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.styles.numbers import is_date_format
+
+from cola_guardado import ColaGuardado
+from conftest import RAIZ
+from hojas import hojas_visibles
+from lector import nombres_hojas
+from parche_xlsx import (COLUMNAS_MANUAL, NS_MAIN, ParcheNoAplicable, _recalcular_al_abrir,
+                         aplicar_cambios, aplicar_con_openpyxl, parchear_xml, ruta_hoja)
+from repo_local import RepoLocal
+from sintetico import libro_sintetico
+
+with open(os.path.join(RAIZ, "db_decreto10.xlsx"), "rb") as f:
+    LIBRO = f.read()
+HOJAS = hojas_visibles(nombres_hojas(LIBRO))
+FECHA = pd.Timestamp("2030-01-15")
+
+
+def hoja(contenido, nombre):
+    return openpyxl.load_workbook(io.BytesIO(contenido))[nombre]
+
+
+def columna_manual(ws):
+    return next(c.column for c in ws[1] if c.value and str(c.value).strip() in COLUMNAS_MANUAL)
+
+
+def valores(ws):
+    return [[c.value for c in fila] for fila in ws.iter_rows()]
+
+
+def caso(nombre_hoja, tipo):
+    """``cambios`` de un caso: fijar una fecha vacía, borrar una existente o agregar tras la última fila."""
+    ws = hoja(LIBRO, nombre_hoja)
+    columna = columna_manual(ws)
+    filas = range(2, ws.max_row + 1)
+    if tipo == "fijar":
+        return {next(f for f in filas if ws.cell(f, columna).value is None): FECHA}
+    if tipo == "borrar":
+        return {next(f for f in filas if ws.cell(f, columna).value is not None): None}
+    return {ws.max_row + 2: FECHA}
+
+
+def libro_minimo(valor, formato=None):
+    """Hoja con la columna manual en B: B2 = ``valor`` y B3 una fecha (el estilo de fecha de la columna)."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Hoja"
+    ws.append(["Hito", "Fecha_Real_Manual"])
+    ws.append(["Uno", valor])
+    ws.append(["Dos", FECHA.to_pydatetime()])
+    ws["B3"].number_format = "d-mmm-yy"
+    if formato:
+        ws["B2"].number_format = formato
+    salida = io.BytesIO()
+    wb.save(salida)
+    return salida.getvalue()
+
+
+def formulas_con_valor(contenido, nombre_hoja):
+    """``{fila: [tiene <v>, ...]}`` de las celdas con fórmula de la hoja."""
+    with zipfile.ZipFile(io.BytesIO(contenido)) as zin:
+        raiz = ET.fromstring(zin.read(ruta_hoja(zin, nombre_hoja)))
+    return {int(fila.get("r")): [c.find(f"{{{NS_MAIN}}}v") is not None for c in fila
+                                 if c.find(f"{{{NS_MAIN}}}f") is not None]
+            for fila in raiz.iter(f"{{{NS_MAIN}}}row")}
+
+
+@pytest.mark.parametrize("tipo", ["fijar", "borrar", "agregar"])
+@pytest.mark.parametrize("nombre_hoja", HOJAS)
+def test_coincide_con_openpyxl(nombre_hoja, tipo):
+    cambios = caso(nombre_hoja, tipo)
+
+    parcheado, metodo = aplicar_cambios(LIBRO, nombre_hoja, cambios)
+    referencia = aplicar_con_openpyxl(LIBRO, nombre_hoja, cambios)
+
+    assert metodo == "xml"
+    ws, ws_ref = hoja(parcheado, nombre_hoja), hoja(referencia, nombre_hoja)
+    assert valores(ws) == valores(ws_ref)
+    for fila, valor in cambios.items():
+        celda = ws.cell(fila, columna_manual(ws))
+        assert celda.value == (None if valor is None else valor.to_pydatetime())
+        if valor is not None:
+            assert is_date_format(celda.number_format)
+
+
+def test_celda_con_formula_usa_openpyxl():
+    contenido = libro_minimo("=TODAY()")
+
+    with pytest.raises(ParcheNoAplicable, match="fórmula"):
+        parchear_xml(contenido, "Hoja", {2: FECHA})
+    nuevo, metodo = aplicar_cambios(contenido, "Hoja", {2: FECHA})
+
+    assert metodo == "openpyxl"
+    assert hoja(nuevo, "Hoja")["B2"].value == FECHA.to_pydatetime()
+
+
+def test_estilo_que_no_es_fecha_usa_openpyxl():
+    contenido = libro_minimo(5, formato="0.00")
+
+    with pytest.raises(ParcheNoAplicable, match="formato de fecha"):
+        parchear_xml(contenido, "Hoja", {2: FECHA})
+    nuevo, metodo = aplicar_cambios(contenido, "Hoja", {2: FECHA})
+
+    assert metodo == "openpyxl"
+    assert hoja(nuevo, "Hoja")["B2"].value == FECHA.to_pydatetime()
+
+
+def test_solo_se_borran_los_valores_en_cache_de_la_fila_editada():
+    contenido = libro_sintetico(hojas=1, hitos=10, densidad_formulas=1.0)
+    nombre_hoja = "Proceso_Sintetico_1"
+    antes = formulas_con_valor(contenido, nombre_hoja)
+    assert all(all(fila) for fila in antes.values())
+
+    despues = formulas_con_valor(parchear_xml(contenido, nombre_hoja, {4: FECHA}), nombre_hoja)
+
+    assert despues[4] and not any(despues[4])
+    assert {f: v for f, v in despues.items() if f != 4} == {f: v for f, v in antes.items() if f != 4}
+
+
+@pytest.mark.parametrize("xml_libro, esperado", [
+    ('<workbook><sheets/><extLst/></workbook>', '<workbook><sheets/><calcPr fullCalcOnLoad="1"/><extLst/></workbook>'),
+    ('<workbook><sheets/></workbook>', '<workbook><sheets/><calcPr fullCalcOnLoad="1"/></workbook>'),
+    ('<workbook><calcPr calcId="191029"/></workbook>', '<workbook><calcPr fullCalcOnLoad="1" calcId="191029"/></workbook>'),
+    ('<workbook><calcPr fullCalcOnLoad="0"/></workbook>', '<workbook><calcPr fullCalcOnLoad="1"/></workbook>'),
+])
+def test_recalcular_al_abrir(xml_libro, esperado):
+    assert _recalcular_al_abrir(xml_libro) == esperado
+
+
+def test_las_demas_partes_conservan_su_contenido():
+    nombre_hoja = HOJAS[0]
+    nuevo = parchear_xml(LIBRO, nombre_hoja, caso(nombre_hoja, "fijar"))
+
+    with zipfile.ZipFile(io.BytesIO(LIBRO)) as original, zipfile.ZipFile(io.BytesIO(nuevo)) as parcheado:
+        tocadas = {ruta_hoja(original, nombre_hoja), "xl/workbook.xml"}
+        assert parcheado.namelist() == original.namelist()
+        for nombre in original.namelist():
+            if nombre not in tocadas:
+                assert parcheado.read(nombre) == original.read(nombre), nombre
+        assert re.search(r'<calcPr\b[^>]*\bfullCalcOnLoad="1"', parcheado.read("xl/workbook.xml").decode("utf-8"))
+
+
+def test_sin_cambios_devuelve_el_mismo_libro():
+    assert parchear_xml(LIBRO, HOJAS[0], {}) is LIBRO
+    assert aplicar_cambios(LIBRO, HOJAS[0], {}) == (LIBRO, "xml")
+
+
+def test_sin_cambios_no_hay_commit():
+    repo = RepoLocal("db_decreto10.xlsx", LIBRO)
+    cola = ColaGuardado(lambda: repo, "db_decreto10.xlsx", ventana=0.01)
+    inicial = repo.head
+
+    assert cola.encolar(HOJAS[0], {}).result(timeout=10).commit is None
+    assert repo.head == inicial
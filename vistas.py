@@ -0,0 +1,83 @@
+"""
+Qué se dibuja: rango de fechas, filtro de proceso y búsqueda, y filas de cada vista.
+
+Sin dependencias de Streamlit, para que la app y el render por lotes
+(``lote.py``) armen exactamente las mismas vistas.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from hojas import PORTAFOLIO
+
+# Opción de rango -> tipo_rango (lo usa el gráfico para el rótulo del periodo)
+OPCIONES_RANGO = {
+    "Año Calendario Actual": 1,
+    "Ventana Móvil (-12/+12 meses)": 2,
+    "Personalizado": 3,
+}
+
+# Filtro de proceso -> facetas del índice (indice.IndiceHitos); lo común va en ambos procesos
+FACETAS_PROCESO = {
+    "Todo": {},
+    "Zonal": {"Alcance": ("Zonal", "Común")},
+    "Nacional": {"Alcance": ("Nacional", "Común")},
+}
+FILTROS_PROCESO = tuple(FACETAS_PROCESO)
+ESTADOS = ("⚪ Pendiente", "🔴 Vencido", "🟢 Vigente")
+
+
+def titulo_hoja(hoja):
+    return "Portafolio de normativas" if hoja == PORTAFOLIO else hoja.replace('_', ' ')
+
+
+def rango_fechas(opcion, hoy=None, inicio=None, fin=None):
+    """``(f_inicio, f_fin, tipo_rango)`` de una opción de ``OPCIONES_RANGO``; 'Personalizado' usa ``inicio``/``fin``."""
+    hoy = hoy or datetime.now()
+    if opcion == "Año Calendario Actual":
+        return datetime(hoy.year, 1, 1), datetime(hoy.year, 12, 31), 1
+    if opcion == "Ventana Móvil (-12/+12 meses)":
+        # Anclada al día (no a la hora) para que el rango sea estable entre reruns
+        hoy_dia = datetime(hoy.year, hoy.month, hoy.day)
+        return hoy_dia - timedelta(days=365), hoy_dia + timedelta(days=365), 2
+    if opcion == "Personalizado":
+        if inicio is None or fin is None:
+            raise ValueError("El rango personalizado necesita fecha de inicio y de fin.")
+        return pd.to_datetime(inicio), pd.to_datetime(fin), 3
+    raise ValueError(f"Rango de fechas desconocido: {opcion}")
+
+
+def filtros_disponibles(indice, hoja):
+    """Filtros de proceso que tienen sentido para la hoja: Zonal/Nacional sólo si aparecen ambos."""
+    alcances = indice.conteos("Alcance", hoja)
+    if "Zonal" in alcances and "Nacional" in alcances:
+        return FILTROS_PROCESO
+    return ("Todo",)
+
+
+def seleccion_vista(indice, filtro_proceso="Todo", texto="", facetas=None):
+    """Ids del índice que cumplen filtro de proceso, búsqueda y facetas; None si no se restringe nada."""
+    return indice.seleccionar(texto, {**(facetas or {}), **FACETAS_PROCESO[filtro_proceso]})
+
+
+def datos_grafico(df, f_inicio, f_fin, mascara=None):
+    """
+    Filas a dibujar según ``mascara`` (ver ``IndiceHitos.mascara``) y rango, o
+    None si la hoja no tiene 'Fecha_Vigente'. No modifica ``df``.
+    """
+    if mascara is not None:
+        df = df[mascara]
+    if 'Fecha_Vigente' not in df.columns:
+        return None
+    df = df.dropna(subset=['Fecha_Vigente'])
+    df_plot = df[(df['Fecha_Vigente'] >= f_inicio) & (df['Fecha_Vigente'] <= f_fin)].copy()
+    if 'Fecha_teorica' not in df_plot.columns: df_plot['Fecha_teorica'] = pd.NaT
+    return df_plot
+
+
+def estado_hitos(fechas, hoy=None):
+    """Semáforo de cada hito: pendiente sin fecha, vencido antes de hoy, vigente en otro caso."""
+    hoy = pd.Timestamp.now().normalize() if hoy is None else hoy
+    fechas = pd.to_datetime(fechas)
+    return pd.Series(np.select([fechas.isna(), fechas < hoy], ESTADOS[:2], ESTADOS[2]), index=fechas.index)